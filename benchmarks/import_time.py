@@ -0,0 +1,84 @@
+"""
+Reports the time the web process spends importing modules at startup, parsed from the output of
+python -X importtime, and checks it against a startup-time budget
+"""
+import os
+import re
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imports done by a web worker before serving its first request
+STARTUP = (
+    'import django; django.setup(); '
+    'from django.urls import resolve; resolve("/")'
+)
+LINE = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times(code: str) -> list[tuple[str, int, int]]:
+    """
+    Runs code in a new interpreter and gets the import time of each module it imports
+
+    Parameters
+    ----------
+    code : str
+        Code to run
+
+    Returns
+    -------
+    list[tuple[str, int, int]]
+        Name, cumulative time in microseconds and nesting level of each module, where modules
+        imported by the code directly have level 1, in order of cumulative time
+    """
+    line: re.Match | None
+    times: list[tuple[str, int, int]] = []
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT,
+        env=os.environ | {'DJANGO_SETTINGS_MODULE': 'nicer_website.settings'},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    for text in result.stderr.splitlines():
+        line = LINE.match(text)
+
+        # Nested imports are indented by two more spaces per level
+        if line:
+            times.append((line.group(3), int(line.group(1)), len(line.group(2)) // 2 + 1))
+
+    return sorted(times, key=lambda module: module[1], reverse=True)
+
+
+def main(budget_ms: float = 500, top: int = 15):
+    """
+    Main function for reporting the startup import time
+
+    Parameters
+    ----------
+    budget_ms : float, default = 500
+        Maximum total import time in milliseconds, exits with an error if exceeded
+    top : int, default = 15
+        Number of slowest modules to report
+    """
+    total_ms: float
+    times: list[tuple[str, int, int]] = import_times(STARTUP)
+
+    total_ms = sum(cumulative for _, cumulative, level in times if level == 1) / 1e3
+    print(f'Startup imports: {total_ms:.0f} ms (budget {budget_ms:.0f} ms)')
+
+    for name, cumulative, _ in times[:top]:
+        print(f'\t{name}: {cumulative / 1e3:.1f} ms')
+
+    for module in ('pandas', 'astropy', 'plotly'):
+        if any(name.split('.')[0] == module for name, _, _ in times):
+            print(f'{module} is imported at startup')
+
+    if total_ms > budget_ms:
+        sys.exit(f'Startup imports exceed the budget by {total_ms - budget_ms:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Compares the database size and query latency of storing the parent path string in each item
+against referencing a directory table by ID, using a synthetic data tree
+"""
+import os
+import time
+import sqlite3
+import tempfile
+
+SCHEMAS = {
+    'path': [
+        'CREATE TABLE file_mgr_item (id integer PRIMARY KEY AUTOINCREMENT, name varchar(64), '
+        'type varchar(4), path varchar(100), UNIQUE (name, path, type))',
+        'CREATE INDEX path_idx ON file_mgr_item (path)',
+    ],
+    'directory': [
+        'CREATE TABLE file_mgr_directory (id integer PRIMARY KEY AUTOINCREMENT, '
+        'path varchar(255) UNIQUE)',
+        'CREATE TABLE file_mgr_item (id integer PRIMARY KEY AUTOINCREMENT, name varchar(64), '
+        'type varchar(4), directory_id bigint, UNIQUE (directory_id, type, name))',
+    ],
+}
+QUERIES = {
+    'path': {
+        'list directory': 'SELECT id, name, type, path FROM file_mgr_item '
+                          "WHERE path = ? AND type = 'file' ORDER BY name LIMIT 20",
+        'observation files': 'SELECT name FROM file_mgr_item '
+                             "WHERE path = ? AND type = 'file' AND name LIKE '%gold%' "
+                             'ORDER BY name',
+    },
+    'directory': {
+        'list directory': 'SELECT id, name, type, directory_id FROM file_mgr_item '
+                          "WHERE directory_id = ? AND type = 'file' ORDER BY name LIMIT 20",
+        'observation files': 'SELECT name FROM file_mgr_item '
+                             "WHERE directory_id = ? AND type = 'file' AND name LIKE '%gold%' "
+                             'ORDER BY name',
+    },
+}
+
+
+def tree(observations: int, gtis: int) -> list[tuple[str, str, str]]:
+    """
+    Generates a synthetic data tree similar to the pipeline output
+
+    Parameters
+    ----------
+    observations : int
+        Number of observations
+    gtis : int
+        Number of GTIs per observation
+
+    Returns
+    -------
+    list[tuple[str, str, str]]
+        Name, parent directory path and type of each item
+    """
+    obs_id: str
+    items: list[tuple[str, str, str]] = []
+
+    for i in range(observations):
+        obs_id = f'{1012010000 + i}'
+        items.append((obs_id, '/', 'dir'))
+        items.append(('jspipe', f'{obs_id}/', 'dir'))
+
+        for quality in ('goddard', 'gold', 'silver', 'radium', 'pyrite'):
+            for gti in range(gtis):
+                for suffix in ('.lc.gz', '.bg-lc.gz', '_BAND2.lc.gz', '.jsgrp', '.bg', '-bin.pds'):
+                    items.append((
+                        f'ni{obs_id}_0mpu7_{quality}_GTI{gti}{suffix}',
+                        f'{obs_id}/jspipe/',
+                        'file',
+                    ))
+
+    return items
+
+
+def build(schema: str, db_path: str, items: list[tuple[str, str, str]]):
+    """
+    Creates a database with the given schema and inserts the items
+
+    Parameters
+    ----------
+    schema : str
+        Schema name, path or directory
+    db_path : str
+        Path to the database file
+    items : list[tuple[str, str, str]]
+        Name, parent directory path and type of each item
+    """
+    with sqlite3.connect(db_path) as conn:
+        for statement in SCHEMAS[schema]:
+            conn.execute(statement)
+
+        if schema == 'path':
+            conn.executemany('INSERT INTO file_mgr_item (name, path, type) VALUES (?,?,?)', items)
+        else:
+            conn.executemany(
+                'INSERT OR IGNORE INTO file_mgr_directory (path) VALUES (?)',
+                [(path,) for _, path, _ in items],
+            )
+            ids = dict(conn.execute('SELECT path, id FROM file_mgr_directory'))
+            conn.executemany(
+                'INSERT INTO file_mgr_item (name, directory_id, type) VALUES (?,?,?)',
+                [(name, ids[path], item_type) for name, path, item_type in items],
+            )
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('VACUUM')
+
+
+def latency(schema: str, db_path: str, paths: list[str], repeats: int = 5) -> dict[str, float]:
+    """
+    Measures the mean latency of each query over the given directories
+
+    Parameters
+    ----------
+    schema : str
+        Schema name, path or directory
+    db_path : str
+        Path to the database file
+    paths : list[str]
+        Directory paths to query
+    repeats : int, default = 5
+        Number of times to query each directory
+
+    Returns
+    -------
+    dict[str, float]
+        Mean latency of each query in milliseconds
+    """
+    start: float
+    times: dict[str, float] = {}
+
+    with sqlite3.connect(db_path) as conn:
+        ids = dict(conn.execute('SELECT path, id FROM file_mgr_directory')) \
+            if schema == 'directory' else {path: path for path in paths}
+
+        for name, query in QUERIES[schema].items():
+            start = time.perf_counter()
+
+            for _ in range(repeats):
+                for path in paths:
+                    conn.execute(query, (ids[path],)).fetchall()
+
+            times[name] = (time.perf_counter() - start) * 1e3 / (repeats * len(paths))
+
+    return times
+
+
+def main(observations: int = 5000, gtis: int = 5):
+    """
+    Main function for comparing the path and directory schemas
+
+    Parameters
+    ----------
+    observations : int, default = 5000
+        Number of observations in the synthetic tree
+    gtis : int, default = 5
+        Number of GTIs per observation
+    """
+    db_path: str
+    items = tree(observations, gtis)
+    paths = [f'{1012010000 + i}/jspipe/' for i in range(0, observations, observations // 500)]
+
+    print(f'Items: {len(items)}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        for schema in SCHEMAS:
+            db_path = os.path.join(directory, f'{schema}.sqlite3')
+            build(schema, db_path, items)
+            print(f'{schema} schema: {os.path.getsize(db_path) / 1e6:.1f} MB')
+
+            for name, time_ms in latency(schema, db_path, paths).items():
+                print(f'\t{name}: {time_ms:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
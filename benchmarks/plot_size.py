@@ -0,0 +1,131 @@
+"""
+Compares the payload size and server build time of light curve plots with SVG and WebGL traces
+in the HTML and JSON outputs of data_plot, using synthetic GTIs, as a proxy for the client render
+time that does not need a browser
+"""
+import os
+import sys
+import json
+import time
+
+import numpy as np
+from numpy import ndarray
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from src.utils.plots import data_plot
+
+
+def light_curves(points: int, gtis: int) -> list[tuple[ndarray, ...]]:
+    """
+    Generates synthetic binned light curves similar to light_curve_data
+
+    Parameters
+    ----------
+    points : int
+        Total number of points across GTIs
+    gtis : int
+        Number of GTIs
+
+    Returns
+    -------
+    list[tuple[ndarray, ...]]
+        Time, count rate, background time, background, time error and uncertainty of each GTI
+    """
+    time_bins: ndarray
+    counts: ndarray
+    background: ndarray
+    rng = np.random.default_rng(0)
+    data: list[tuple[ndarray, ...]] = []
+
+    for gti in range(gtis):
+        time_bins = gti * 1e4 + np.arange(points // gtis, dtype=float)
+        counts = rng.poisson(50, time_bins.size) / 52
+        background = np.full(time_bins.size, 0.02)
+        data.append((
+            time_bins,
+            counts - background,
+            np.concatenate(([time_bins[0] - 0.5], time_bins, [time_bins[-1] + 0.5])),
+            np.concatenate(([0.02], background, [0.02])),
+            np.full(time_bins.size, 0.5),
+            np.sqrt(counts * 52) / 52,
+        ))
+
+    return data
+
+
+def build(data: list[tuple[ndarray, ...]], output: str, webgl: bool) -> tuple[int, float]:
+    """
+    Builds a plot and measures its payload size and build time
+
+    Parameters
+    ----------
+    data : list[tuple[ndarray, ...]]
+        Light curve data of each GTI
+    output : str
+        Output format, html or json
+    webgl : bool
+        If WebGL traces are used
+
+    Returns
+    -------
+    tuple[int, float]
+        Payload size in bytes and build time in milliseconds
+    """
+    payload: str | dict
+    start: float = time.perf_counter()
+
+    x_data, y_data, x_background, background, x_error, uncertainty = map(list, zip(*data))
+    payload = data_plot(
+        list(range(len(data))),
+        x_data,
+        y_data,
+        plot_type='lines+markers',
+        x_background_list=x_background,
+        background_list=background,
+        x_errors=x_error,
+        y_uncertainties=uncertainty,
+        output=output,
+        webgl=webgl,
+        title='Light Curve',
+    )
+
+    if output == 'json':
+        payload = json.dumps(payload)
+
+    return len(payload.encode()), (time.perf_counter() - start) * 1e3
+
+
+def main(sizes: tuple[int, ...] = (1000, 10000, 100000, 1000000), gtis: int = 4):
+    """
+    Main function for comparing the plot outputs
+
+    Parameters
+    ----------
+    sizes : tuple[int, ...], default = (1000, 10000, 100000, 1000000)
+        Total number of points across GTIs
+    gtis : int, default = 4
+        Number of GTIs
+    """
+    size: int
+    time_ms: float
+
+    # Excludes the import of the Plotly validators from the first measurement
+    build(light_curves(100, gtis), 'html', False)
+
+    for points in sizes:
+        data = light_curves(points, gtis)
+        print(f'Points: {points}')
+
+        for output in ('html', 'json'):
+            for webgl in (False, True):
+                size, time_ms = build(data, output, webgl)
+                print(
+                    f'\t{output} {"scattergl" if webgl else "scatter"}: '
+                    f'{size / 1e6:.2f} MB, {time_ms:.0f} ms'
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -3,9 +3,10 @@ Model registration for file_mgr
 """
 from django.contrib import admin
 
-from .models import Item
+from .models import Directory, Item
 
 
 # Register your models here.
 admin.site.register(Item)
+admin.site.register(Directory)
 # admin.site.register(File)
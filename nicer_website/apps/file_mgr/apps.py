@@ -2,6 +2,7 @@
 Declare file_mgr app
 """
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class DirectoryConfig(AppConfig):
@@ -10,3 +11,12 @@ class DirectoryConfig(AppConfig):
     """
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'nicer_website.apps.file_mgr'
+
+    def ready(self):
+        """
+        Enables WAL journaling on new database connections
+        """
+        # pylint: disable=import-outside-toplevel
+        from nicer_website.routers import set_pragmas
+
+        connection_created.connect(set_pragmas)
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.13 on 2026-10-19 01:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_mgr', '0026_remove_item_type_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE file_mgr_item_search USING fts5("
+                "name, path, type UNINDEXED, tokenize='trigram case_sensitive 1')",
+                "INSERT INTO file_mgr_item_search (rowid, name, path, type) "
+                "SELECT id, name, path, type FROM file_mgr_item",
+                "CREATE TRIGGER file_mgr_item_search_insert AFTER INSERT ON file_mgr_item BEGIN "
+                "INSERT INTO file_mgr_item_search (rowid, name, path, type) "
+                "VALUES (new.id, new.name, new.path, new.type); END",
+                "CREATE TRIGGER file_mgr_item_search_delete AFTER DELETE ON file_mgr_item BEGIN "
+                "DELETE FROM file_mgr_item_search WHERE rowid = old.id; END",
+                "CREATE TRIGGER file_mgr_item_search_update AFTER UPDATE ON file_mgr_item BEGIN "
+                "UPDATE file_mgr_item_search SET name = new.name, path = new.path, type = new.type "
+                "WHERE rowid = old.id; END",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER file_mgr_item_search_update',
+                'DROP TRIGGER file_mgr_item_search_delete',
+                'DROP TRIGGER file_mgr_item_search_insert',
+                'DROP TABLE file_mgr_item_search',
+            ],
+        ),
+    ]
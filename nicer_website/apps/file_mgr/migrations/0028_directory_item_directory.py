@@ -0,0 +1,97 @@
+# Generated by Django 4.1.13 on 2026-10-19 01:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SEARCH_TRIGGERS = [
+    "CREATE TRIGGER file_mgr_item_search_insert AFTER INSERT ON file_mgr_item BEGIN "
+    "INSERT INTO file_mgr_item_search (rowid, name, path, type) VALUES (new.id, new.name, "
+    "(SELECT path FROM file_mgr_directory WHERE id = new.directory_id), new.type); END",
+    "CREATE TRIGGER file_mgr_item_search_delete AFTER DELETE ON file_mgr_item BEGIN "
+    "DELETE FROM file_mgr_item_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER file_mgr_item_search_update AFTER UPDATE ON file_mgr_item BEGIN "
+    "UPDATE file_mgr_item_search SET name = new.name, "
+    "path = (SELECT path FROM file_mgr_directory WHERE id = new.directory_id), type = new.type "
+    "WHERE rowid = old.id; END",
+]
+
+PATH_SEARCH_TRIGGERS = [
+    "CREATE TRIGGER file_mgr_item_search_insert AFTER INSERT ON file_mgr_item BEGIN "
+    "INSERT INTO file_mgr_item_search (rowid, name, path, type) "
+    "VALUES (new.id, new.name, new.path, new.type); END",
+    "CREATE TRIGGER file_mgr_item_search_delete AFTER DELETE ON file_mgr_item BEGIN "
+    "DELETE FROM file_mgr_item_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER file_mgr_item_search_update AFTER UPDATE ON file_mgr_item BEGIN "
+    "UPDATE file_mgr_item_search SET name = new.name, path = new.path, type = new.type "
+    "WHERE rowid = old.id; END",
+]
+
+DROP_SEARCH_TRIGGERS = [
+    'DROP TRIGGER file_mgr_item_search_update',
+    'DROP TRIGGER file_mgr_item_search_delete',
+    'DROP TRIGGER file_mgr_item_search_insert',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_mgr', '0027_item_search'),
+    ]
+
+    operations = [
+        # Remaking the item table drops its triggers
+        migrations.RunSQL(sql=DROP_SEARCH_TRIGGERS, reverse_sql=PATH_SEARCH_TRIGGERS),
+        migrations.CreateModel(
+            name='Directory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='directory',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='file_mgr.directory'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='item',
+            name='unique_name_path_type',
+        ),
+        migrations.RemoveIndex(
+            model_name='item',
+            name='path_idx',
+        ),
+        # Create a directory for each distinct path and directory item, then link the items
+        migrations.RunSQL(
+            sql=[
+                "INSERT INTO file_mgr_directory (path) VALUES ('/')",
+                'INSERT OR IGNORE INTO file_mgr_directory (path) '
+                'SELECT DISTINCT path FROM file_mgr_item',
+                "INSERT OR IGNORE INTO file_mgr_directory (path) "
+                "SELECT CASE path WHEN '/' THEN '' ELSE path END || name || '/' "
+                "FROM file_mgr_item WHERE type = 'dir'",
+                'UPDATE file_mgr_item SET directory_id = '
+                '(SELECT id FROM file_mgr_directory WHERE path = file_mgr_item.path)',
+            ],
+            reverse_sql=[
+                'UPDATE file_mgr_item SET path = '
+                '(SELECT path FROM file_mgr_directory WHERE id = file_mgr_item.directory_id)',
+            ],
+        ),
+        migrations.RemoveField(
+            model_name='item',
+            name='path',
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='directory',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='file_mgr.directory'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(fields=('directory', 'type', 'name'), name='unique_directory_type_name'),
+        ),
+        migrations.RunSQL(sql=SEARCH_TRIGGERS, reverse_sql=DROP_SEARCH_TRIGGERS),
+    ]
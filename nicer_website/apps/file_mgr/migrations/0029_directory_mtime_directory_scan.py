@@ -0,0 +1,45 @@
+# Generated by Django 4.1.13 on 2026-10-19 02:09
+
+from django.db import migrations, models
+
+
+SEARCH_TRIGGERS = [
+    "CREATE TRIGGER file_mgr_item_search_insert AFTER INSERT ON file_mgr_item BEGIN "
+    "INSERT INTO file_mgr_item_search (rowid, name, path, type) VALUES (new.id, new.name, "
+    "(SELECT path FROM file_mgr_directory WHERE id = new.directory_id), new.type); END",
+    "CREATE TRIGGER file_mgr_item_search_delete AFTER DELETE ON file_mgr_item BEGIN "
+    "DELETE FROM file_mgr_item_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER file_mgr_item_search_update AFTER UPDATE ON file_mgr_item BEGIN "
+    "UPDATE file_mgr_item_search SET name = new.name, "
+    "path = (SELECT path FROM file_mgr_directory WHERE id = new.directory_id), type = new.type "
+    "WHERE rowid = old.id; END",
+]
+
+DROP_SEARCH_TRIGGERS = [
+    'DROP TRIGGER file_mgr_item_search_update',
+    'DROP TRIGGER file_mgr_item_search_delete',
+    'DROP TRIGGER file_mgr_item_search_insert',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_mgr', '0028_directory_item_directory'),
+    ]
+
+    operations = [
+        # Remaking the directory table fails while the search index triggers reference it
+        migrations.RunSQL(sql=DROP_SEARCH_TRIGGERS, reverse_sql=SEARCH_TRIGGERS),
+        migrations.AddField(
+            model_name='directory',
+            name='mtime',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='directory',
+            name='scan',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(sql=SEARCH_TRIGGERS, reverse_sql=DROP_SEARCH_TRIGGERS),
+    ]
@@ -1,35 +1,184 @@
 """
 Models for the file_mgr database
 """
-from django.db import models
+import time
+
+from django.db import connections, models, router
+
+# Seconds between checks of the ingest version by the caches of the file index
+VERSION_INTERVAL = 1
+
+
+def ingest_version() -> int:
+    """
+    Reads the ingest version from the header of the database the file index is read from, which
+    db_update and db_watch bump when they commit changes to the index
+
+    Returns
+    -------
+    int
+        Ingest version, 0 if the database was never updated by db_update
+    """
+    with connections[router.db_for_read(Directory)].cursor() as cursor:
+        cursor.execute('PRAGMA user_version')
+        return cursor.fetchone()[0]
+
+
+class Directory(models.Model):
+    """
+    Model for the file manager database to contain the path of each directory once, so that items
+    reference their parent directory by ID instead of repeating the path string
+
+    Paths are relative to the data directory with a trailing slash, except for the root directory,
+    which is /, and are cached by ID and path as directories are never renamed, only removed and
+    created again with a new ID, so the cache is cleared when db_update or db_watch bumps the ingest
+    version
+
+    The modification time in nanoseconds (mtime) and the last database update scan that found the
+    directory (scan) form the manifest used by db_update to skip unchanged directories and remove
+    directories that no longer exist
+    """
+    root = '/'
+    _ids: dict[str, int] = {}
+    _paths: dict[int, str] = {}
+    _version: int | None = None
+    _checked: float = 0
+
+    path = models.CharField(max_length=255, unique=True)
+    mtime = models.BigIntegerField(null=True)
+    scan = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.path)
+
+    @classmethod
+    def check_version(cls):
+        """
+        Clears the cached directory IDs and paths if the ingest version changed, reading the
+        version at most once every VERSION_INTERVAL seconds
+        """
+        version: int
+        now: float = time.monotonic()
+
+        if now - cls._checked < VERSION_INTERVAL:
+            return
+
+        version = ingest_version()
+        cls._checked = now
+
+        if version != cls._version:
+            cls.clear_cache()
+            cls._version = version
+
+    @classmethod
+    def get_id(cls, path: str) -> int | None:
+        """
+        Gets the ID of the directory with the given path
+
+        Parameters
+        ----------
+        path : str
+            Path of the directory
+
+        Returns
+        -------
+        int | None
+            ID of the directory, or None if the directory does not exist
+        """
+        directory_id: int | None
+
+        cls.check_version()
+
+        if path not in cls._ids:
+            directory_id = cls.objects.filter(path=path).values_list('id', flat=True).first()
+
+            if directory_id is None:
+                return None
+
+            cls._ids[path] = directory_id
+            cls._paths[directory_id] = path
+
+        return cls._ids[path]
+
+    @classmethod
+    def get_path(cls, directory_id: int) -> str:
+        """
+        Gets the path of the directory with the given ID
+
+        Parameters
+        ----------
+        directory_id : int
+            ID of the directory
+
+        Returns
+        -------
+        str
+            Path of the directory
+        """
+        path: str
+
+        cls.check_version()
+
+        if directory_id not in cls._paths:
+            path = cls.objects.values_list('path', flat=True).get(id=directory_id)
+            cls._ids[path] = directory_id
+            cls._paths[directory_id] = path
+
+        return cls._paths[directory_id]
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Clears the cached directory IDs and paths
+        """
+        cls._ids.clear()
+        cls._paths.clear()
 
 
 class Item(models.Model):
     """
-    Model for the file manager database to contain the files and directories with their paths
+    Model for the file manager database to contain the files and directories with their parent
+    directory
     """
     dir = 'dir'
     file = 'file'
     item_type = [(dir, 'Dir'), (file, 'File')]
 
     name = models.CharField(max_length=64)
-    path = models.CharField(max_length=100, default='/')
+    directory = models.ForeignKey(
+        Directory,
+        on_delete=models.CASCADE,
+        related_name='items',
+        db_index=False,
+    )
     type = models.CharField(max_length=4, choices=item_type, default=dir)
 
     class Meta:
         """
-        Metadata for the file manager model to prevent duplicate entries with the same name, path,
-        and type, as well as creating an index on the path column to increase indexing performance
+        Metadata for the file manager model to prevent duplicate entries with the same directory,
+        type, and name, which also serves as the index for listing a directory sorted by name
+
+        The search index triggers on this table are dropped if the table is remade and block
+        remaking the directory table, so migrations that alter either must recreate them
         """
         constraints = [
-            models.UniqueConstraint(fields=('name', 'path', 'type'), name='unique_name_path_type'),
-        ]
-
-        indexes = [
-            models.Index(fields=['path'], name='path_idx'),
+            models.UniqueConstraint(
+                fields=('directory', 'type', 'name'),
+                name='unique_directory_type_name',
+            ),
         ]
 
     def __str__(self):
         return str(self.name)
 
-# create index file_mgr_item_path_idx on file_mgr_item (path)
+    @property
+    def path(self) -> str:
+        """
+        Path of the parent directory
+
+        Returns
+        -------
+        str
+            Parent directory path
+        """
+        return Directory.get_path(self.directory_id)
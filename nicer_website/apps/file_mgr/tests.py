@@ -1,3 +1,643 @@
-from django.test import TestCase
+"""
+Tests for the file_mgr app
+"""
+import io
+import os
+import time
+import shutil
+import tempfile
+from contextlib import closing, redirect_stderr, redirect_stdout
+from threading import Thread
+from unittest import mock
 
-# Create your tests here.
+from django.db import OperationalError, connection, connections
+from django.urls import reverse
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from src import db_update, db_watch
+from .models import Directory, Item
+
+
+def make_tree(data_dir: str, files: dict[str, str]):
+    """
+    Writes files to a data directory, creating their parent directories
+
+    Parameters
+    ----------
+    data_dir : str
+        Path to the data directory
+    files : dict[str, str]
+        Contents of each file by path relative to the data directory
+    """
+    for path, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(data_dir, path)), exist_ok=True)
+
+        with open(os.path.join(data_dir, path), mode='w', encoding='utf-8') as file:
+            file.write(content)
+
+
+class IndexedTreeTestCase(TransactionTestCase):
+    """
+    Indexes a small data tree with db_update in a temporary data directory before each test
+    """
+    databases = '__all__'
+    files: dict[str, str] = {
+        '1234567890/jspipe/ni1234567890_gold_GTI0.lc.gz': '',
+        '1234567890/jspipe/ni1234567890_gold_GTI1.lc.gz': '',
+        '1234567890/jspipe/ni1234567890_silver_GTI0.jsgrp': '',
+        '1234567890/readme[1].txt': 'NICER observation 1234567890\n',
+        '2345678901/jspipe/ni2345678901_gold_GTI0.lc.gz': '',
+    }
+
+    def setUp(self):
+        self._data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data_dir = self._data_dir.name
+        self.addCleanup(self._data_dir.cleanup)
+        make_tree(self.data_dir, self.files)
+        Directory.clear_cache()
+        self.ingest()
+
+    def ingest(self, full: bool = False) -> tuple[int, int, int]:
+        """
+        Updates the file index from the data directory
+
+        Parameters
+        ----------
+        full : bool, default = False
+            If every directory should be listed
+
+        Returns
+        -------
+        tuple[int, int, int]
+            Number of items added, items removed and directories removed
+        """
+        with redirect_stdout(io.StringIO()):
+            return db_update.update(
+                connection.settings_dict['NAME'],
+                self.data_dir,
+                full=full,
+                workers=2,
+            )
+
+
+class ConcurrentIngestTests(TransactionTestCase):
+    """
+    Tests that the website can browse the database while db_update writes to it
+    """
+    databases = '__all__'
+
+    def test_file_request_during_ingest(self):
+        """
+        Requests the root directory listing while a large tree is ingested, which should neither
+        fail with database is locked nor see the database mid-batch
+        """
+        errors: list[Exception] = []
+        statuses: set[int] = set()
+        requests = 0
+
+        def ingest():
+            try:
+                with redirect_stdout(io.StringIO()):
+                    db_update.update(connection.settings_dict['NAME'], data_dir, workers=4)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                errors.append(error)
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            for i in range(200):
+                os.makedirs(os.path.join(data_dir, f'{1000000000 + i}', 'products'))
+
+                for j in range(150):
+                    open(
+                        os.path.join(data_dir, f'{1000000000 + i}', 'products', f'file{j}.lc.gz'),
+                        mode='w',
+                        encoding='utf-8',
+                    ).close()
+
+            thread = Thread(target=ingest)
+            thread.start()
+
+            while thread.is_alive() or not requests:
+                response = self.client.get(
+                    reverse('file_mgr:file_request'),
+                    {'start': 0, 'end': 20, 'path': 'Root'},
+                )
+                statuses.add(response.status_code)
+                requests += 1
+
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, {200})
+        self.assertEqual(Item.objects.count(), 200 * 152)
+
+
+class ReadOnlyConnectionTests(TransactionTestCase):
+    """
+    Tests that the file index is read through the read-only connection, which cannot write
+    """
+    databases = '__all__'
+
+    def test_read_only(self):
+        """
+        Reads data committed by the default connection through the read-only URI, which should
+        refuse writes
+        """
+        directory = Directory.objects.using('default').create(path='1234567890/')
+        self.assertTrue(connections['readonly'].settings_dict['NAME'].endswith('?mode=ro'))
+        self.assertEqual(Directory.objects.db, 'readonly')
+        self.assertEqual(Directory.objects.get(path='1234567890/').id, directory.id)
+
+        with self.assertRaisesMessage(OperationalError, 'readonly database'):
+            Directory.objects.using('readonly').create(path='2345678901/')
+
+        self.assertFalse(Directory.objects.filter(path='2345678901/').exists())
+
+
+class DirectoryCacheTests(TransactionTestCase):
+    """
+    Tests that the cached directory IDs follow directories removed and created again by ingest
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        Directory.clear_cache()
+
+    @mock.patch('nicer_website.apps.file_mgr.models.VERSION_INTERVAL', 0)
+    def test_cache_cleared_on_ingest_version(self):
+        """
+        Removes and creates a cached directory again, which should keep its old ID until the
+        ingest version is bumped
+        """
+        directory = Directory.objects.create(path='1234567890/')
+        self.assertEqual(Directory.get_id('1234567890/'), directory.id)
+
+        directory.delete()
+        directory = Directory.objects.create(path='1234567890/')
+        self.assertNotEqual(Directory.get_id('1234567890/'), directory.id)
+
+        db_update.version_bump(connection.connection)
+        self.assertEqual(Directory.get_id('1234567890/'), directory.id)
+        self.assertEqual(Directory.get_path(directory.id), '1234567890/')
+
+
+class SearchTests(IndexedTreeTestCase):
+    """
+    Tests the trigram search over item names
+    """
+    def search(self, **params: str) -> list[dict[str, str]]:
+        """
+        Searches the file index
+
+        Parameters
+        ----------
+        params : str
+            Query parameters of the search
+
+        Returns
+        -------
+        list[dict[str, str]]
+            Items found
+        """
+        response = self.client.get(reverse('file_mgr:search'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['items']
+
+    def test_substring(self):
+        """
+        Finds files containing the query anywhere in their name, case-sensitively
+        """
+        self.assertEqual(
+            sorted(item['name'] for item in self.search(q='gold_GTI0')),
+            ['ni1234567890_gold_GTI0.lc.gz', 'ni2345678901_gold_GTI0.lc.gz'],
+        )
+        self.assertEqual(self.search(q='GOLD_GTI0'), [])
+
+    def test_prefix(self):
+        """
+        Only finds names starting with the query in prefix mode
+        """
+        self.assertEqual([item['name'] for item in self.search(q='1234', mode='prefix')], [
+            '1234567890',
+        ])
+
+    def test_glob(self):
+        """
+        Matches glob patterns, and treats glob characters literally in the other modes
+        """
+        self.assertEqual(
+            sorted(item['name'] for item in self.search(q='ni*_GTI?.jsgrp', mode='glob')),
+            ['ni1234567890_silver_GTI0.jsgrp'],
+        )
+        self.assertEqual([item['name'] for item in self.search(q='readme[1]')], [
+            'readme[1].txt',
+        ])
+
+    def test_path(self):
+        """
+        Restricts the search to a directory and its subdirectories
+        """
+        self.assertEqual(
+            [item['path'] for item in self.search(q='gold_GTI0', path='2345678901')],
+            ['2345678901/jspipe/'],
+        )
+
+    def test_invalid(self):
+        """
+        Rejects unknown modes and queries too short for the trigram index
+        """
+        self.assertEqual(self.client.get(
+            reverse('file_mgr:search'),
+            {'q': 'gold', 'mode': 'regex'},
+        ).status_code, 400)
+        self.assertEqual(self.client.get(
+            reverse('file_mgr:search'),
+            {'q': 'g*o', 'mode': 'glob'},
+        ).status_code, 400)
+
+
+class DataTests(IndexedTreeTestCase):
+    """
+    Tests serving data files with conditional and range requests
+    """
+    path = '1234567890/readme[1].txt'
+    content = b'NICER observation 1234567890\n'
+
+    def setUp(self):
+        super().setUp()
+        data_dir = override_settings(DATA_DIR=self.data_dir)
+        data_dir.enable()
+        self.addCleanup(data_dir.disable)
+        self.url = reverse('file_mgr:data', args=[self.path])
+
+    def test_whole_file(self):
+        """
+        Serves the whole file with its validators
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_conditional(self):
+        """
+        Answers 304 when the client's copy is current
+        """
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_range(self):
+        """
+        Serves single byte ranges, including suffix ranges, and rejects unsatisfiable ranges
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=6-16')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[6:17])
+        self.assertEqual(response['Content-Range'], f'bytes 6-16/{len(self.content)}')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-11')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-11:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_stale_if_range(self):
+        """
+        Serves the whole file if the range is for a different version of the file
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_indexed(self):
+        """
+        Only serves files that are in the file index
+        """
+        make_tree(self.data_dir, {'1234567890/new.txt': ''})
+        self.assertEqual(
+            self.client.get(reverse('file_mgr:data', args=['1234567890/new.txt'])).status_code,
+            404,
+        )
+        self.assertEqual(
+            self.client.get(reverse('file_mgr:data', args=['../secret.txt'])).status_code,
+            404,
+        )
+
+    @override_settings(DATA_SENDFILE_HEADER='X-Accel-Redirect', DATA_SENDFILE_PREFIX='/data/')
+    def test_sendfile(self):
+        """
+        Delegates sending the file to the web server
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/data/1234567890/readme%5B1%5D.txt')
+        self.assertEqual(response.content, b'')
+
+
+class IncrementalUpdateTests(IndexedTreeTestCase):
+    """
+    Tests that db_update only lists directories modified since the last update
+    """
+    def age(self):
+        """
+        Sets the modification time of every directory to an hour ago, so that the next update
+        records it as unchanged
+        """
+        mtime = time.time() - 3600
+
+        for path, _, _ in os.walk(self.data_dir):
+            os.utime(path, (mtime, mtime))
+
+    def test_unchanged_directories_skipped(self):
+        """
+        Misses a removal that keeps the directory's modification time, until a full update
+        """
+        self.age()
+        self.ingest()
+        mtime = os.stat(os.path.join(self.data_dir, '1234567890')).st_mtime_ns
+        os.remove(os.path.join(self.data_dir, '1234567890/readme[1].txt'))
+        os.utime(os.path.join(self.data_dir, '1234567890'), ns=(mtime, mtime))
+
+        self.assertEqual(self.ingest(), (0, 0, 0))
+        self.assertTrue(Item.objects.filter(name='readme[1].txt').exists())
+        self.assertEqual(self.ingest(full=True), (0, 1, 0))
+        self.assertFalse(Item.objects.filter(name='readme[1].txt').exists())
+
+    def test_changes_found(self):
+        """
+        Adds new files and removes directories that no longer exist with their items
+        """
+        self.age()
+        self.ingest()
+        make_tree(self.data_dir, {'2345678901/jspipe/ni2345678901_gold_GTI1.lc.gz': ''})
+        shutil.rmtree(os.path.join(self.data_dir, '1234567890'))
+
+        added, removed, removed_dirs = self.ingest()
+        self.assertEqual(added, 1)
+        self.assertEqual(removed_dirs, 2)
+        self.assertEqual(removed, 6)
+        self.assertEqual(
+            sorted(Directory.objects.values_list('path', flat=True)),
+            ['/', '2345678901/', '2345678901/jspipe/'],
+        )
+        self.assertEqual(sorted(Item.objects.values_list('name', flat=True)), [
+            '2345678901',
+            'jspipe',
+            'ni2345678901_gold_GTI0.lc.gz',
+            'ni2345678901_gold_GTI1.lc.gz',
+        ])
+
+    def test_unreadable_directory(self):
+        """
+        Keeps the items and subdirectories of a directory that cannot be listed
+        """
+        scandir = os.scandir
+        unreadable = os.path.join(self.data_dir, '1234567890')
+        items = sorted(Item.objects.values_list('name', 'directory__path'))
+
+        def denied(path: str):
+            if os.path.normpath(path) == unreadable:
+                raise PermissionError(13, 'Permission denied', path)
+
+            return scandir(path)
+
+        with mock.patch('os.scandir', denied), redirect_stderr(io.StringIO()) as stderr:
+            self.assertEqual(self.ingest(full=True), (0, 0, 0))
+
+        self.assertIn(unreadable, stderr.getvalue())
+        self.assertEqual(sorted(Item.objects.values_list('name', 'directory__path')), items)
+
+
+class WalkTests(SimpleTestCase):
+    """
+    Tests the parallel directory walker of db_update
+    """
+    def test_walk(self):
+        """
+        Lists every directory once with the same entries as os.walk, without following symbolic
+        links or listing excluded files
+        """
+        with tempfile.TemporaryDirectory() as data_dir:
+            make_tree(data_dir, {
+                f'{obs_id}/{subdir}/file{i}{extension}': ''
+                for obs_id in range(1000000000, 1000000020)
+                for subdir in ('jspipe', 'auxil', 'xti/event_cl')
+                for i, extension in enumerate(('.lc.gz', '.jsgrp', '.arf'))
+            })
+            os.symlink(os.path.join(data_dir, '1000000000'), os.path.join(data_dir, 'link'))
+
+            walked = {
+                path: entries for path, _, entries in db_update.walk(data_dir, {}, workers=4)
+            }
+            expected = {}
+
+            for dir_path, dirs, files in os.walk(data_dir):
+                expected[db_update.ROOT if dir_path == data_dir else os.path.relpath(
+                    dir_path,
+                    data_dir,
+                ) + '/'] = {(name, 'dir') for name in dirs} | {
+                    (name, 'file') for name in files if not name.endswith('.arf')
+                }
+
+        self.assertEqual(walked, expected)
+        self.assertIn(('link', 'dir'), walked[db_update.ROOT])
+
+    def test_unchanged(self):
+        """
+        Takes the subdirectories of an unchanged directory from the manifest
+        """
+        with tempfile.TemporaryDirectory() as data_dir:
+            make_tree(data_dir, {'1000000000/jspipe/file.lc.gz': ''})
+            manifest = {
+                path: mtime for path, mtime, _ in db_update.walk(data_dir, {}, workers=2)
+            }
+            walked = dict(
+                (path, entries) for path, _, entries in db_update.walk(data_dir, manifest)
+            )
+
+        self.assertEqual(walked, dict.fromkeys(manifest))
+
+
+class BulkInsertTests(IndexedTreeTestCase):
+    """
+    Tests the batched inserts of db_update
+    """
+    def test_batches(self):
+        """
+        Keeps the search index in sync over several batches and restores its insert trigger
+        """
+        with closing(db_update.connect(connection.settings_dict['NAME'])) as conn:
+            conn.execute('BEGIN')
+            self.assertEqual(db_update.table_insert(conn, [
+                (f'file{i}.lc.gz', f'{1000000000 + i % 3}/jspipe/', 'file') for i in range(7)
+            ], batch_size=2, commit=True), 7)
+            conn.commit()
+
+            self.assertEqual(
+                conn.execute('SELECT COUNT(*) FROM file_mgr_item_search').fetchone()[0],
+                Item.objects.count(),
+            )
+            self.assertIsNotNone(conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                (db_update.SEARCH_TRIGGER,),
+            ).fetchone())
+
+        self.assertEqual(Directory.objects.filter(path__endswith='/jspipe/').count(), 5)
+
+    def test_concurrent_writer(self):
+        """
+        Does not index items added by another writer between batches a second time
+        """
+        def batches():
+            yield 'file0.lc.gz', '1234567890/jspipe/', 'file'
+            yield 'file1.lc.gz', '1234567890/jspipe/', 'file'
+
+            # The watcher adds an item through the insert trigger once the first batch committed
+            with closing(db_update.connect(connection.settings_dict['NAME'])) as watcher:
+                watcher.execute('BEGIN IMMEDIATE')
+                watcher.execute(
+                    'INSERT INTO file_mgr_item (name, directory_id, type) '
+                    "SELECT 'file2.lc.gz', id, 'file' FROM file_mgr_directory WHERE path = ?",
+                    ('1234567890/jspipe/',),
+                )
+                watcher.commit()
+
+            yield 'file3.lc.gz', '1234567890/jspipe/', 'file'
+
+        with closing(db_update.connect(connection.settings_dict['NAME'])) as conn:
+            conn.execute('BEGIN')
+            self.assertEqual(db_update.table_insert(conn, batches(), batch_size=2, commit=True), 3)
+            conn.commit()
+
+            self.assertEqual(
+                conn.execute('SELECT COUNT(*) FROM file_mgr_item_search').fetchone()[0],
+                Item.objects.count(),
+            )
+            self.assertEqual(conn.execute(
+                "SELECT COUNT(*) FROM file_mgr_item_search WHERE name MATCH '\"file2.lc.gz\"'",
+            ).fetchone()[0], 1)
+
+    def test_interrupted(self):
+        """
+        Reruns an update interrupted after its batches were committed without duplicating items
+        """
+        count = Item.objects.count()
+        make_tree(self.data_dir, {f'3456789012/jspipe/file{i}.lc.gz': '' for i in range(5)})
+
+        with mock.patch.object(db_update, 'manifest_update', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.ingest()
+
+        self.assertEqual(Item.objects.count(), count + 7)
+        self.ingest()
+        self.assertEqual(Item.objects.count(), count + 7)
+        self.assertEqual(
+            self.client.get(reverse('file_mgr:search'), {'q': '3456789012'}).json()['items'],
+            [{'name': '3456789012', 'path': '/', 'type': 'dir'}],
+        )
+
+
+class WatchTests(IndexedTreeTestCase):
+    """
+    Tests the inotify watcher's updates and its handling of directories removed while they are
+    being listed or watched
+    """
+    def apply(self, changed: set[str], created: set[str]) -> tuple[int, int, list[str]]:
+        """
+        Applies a batch of changed directories to the file index
+
+        Parameters
+        ----------
+        changed : set[str]
+            Database paths of the directories whose entries changed
+        created : set[str]
+            Database paths of the directories created
+
+        Returns
+        -------
+        tuple[int, int, list[str]]
+            Number of items added and removed, and database paths of the directories removed
+        """
+        with redirect_stdout(io.StringIO()):
+            return db_watch.apply(
+                connection.settings_dict['NAME'],
+                self.data_dir,
+                changed,
+                created,
+                workers=2,
+            )
+
+    def test_apply(self):
+        """
+        Adds created directories with their subdirectories and removes deleted directories
+        """
+        make_tree(self.data_dir, {'3456789012/jspipe/ni3456789012_gold_GTI0.lc.gz': ''})
+        shutil.rmtree(os.path.join(self.data_dir, '2345678901'))
+
+        added, removed, removed_dirs = self.apply({'/'}, {'3456789012/'})
+        self.assertEqual((added, removed, removed_dirs), (3, 3, ['2345678901/']))
+        self.assertTrue(Item.objects.filter(name='ni3456789012_gold_GTI0.lc.gz').exists())
+        self.assertFalse(Directory.objects.filter(path__startswith='2345678901/').exists())
+
+    def test_vanished_directory(self):
+        """
+        Treats directories removed before they are listed as removed instead of failing
+        """
+        self.assertIsNone(db_update.list_directory(self.data_dir, 'missing/', None))
+        self.assertEqual(list(db_update.walk(self.data_dir, {}, roots=['missing/'])), [])
+
+        with mock.patch.object(os.path, 'isdir', return_value=True):
+            shutil.rmtree(os.path.join(self.data_dir, '2345678901'))
+            self.assertEqual(self.apply({'/', '2345678901/jspipe/'}, {'2345678901/'})[2], [
+                '2345678901/',
+            ])
+
+    def test_inotify(self):
+        """
+        Reports entries created in watched directories, and ignores directories removed before
+        they are watched
+        """
+        inotify = db_watch.Inotify(self.data_dir)
+
+        with closing(inotify):
+            inotify.add('1234567890/')
+            inotify.add('missing/')
+            self.assertEqual(list(inotify.watches), ['1234567890/'])
+
+            os.mkdir(os.path.join(self.data_dir, '1234567890/new'))
+            self.assertEqual(inotify.read(1), [
+                (db_watch.IN_CREATE | db_watch.IN_ISDIR, '1234567890/', 'new'),
+            ])
+
+            shutil.rmtree(os.path.join(self.data_dir, '1234567890'))
+            inotify.add('1234567890/')
+            self.assertEqual(inotify.watches, {})
+
+    def test_coalesce(self):
+        """
+        Collects a burst of events into one batch and watches the new directories once applied
+        """
+        inotify = db_watch.Inotify(self.data_dir)
+        db_path = connection.settings_dict['NAME']
+
+        with closing(inotify):
+            db_watch.watch_indexed(inotify, db_path)
+            self.assertEqual(
+                sorted(inotify.watches),
+                sorted(Directory.objects.values_list('path', flat=True)),
+            )
+
+            make_tree(self.data_dir, {
+                '1234567890/new/jspipe/file.lc.gz': '',
+                '2345678901/jspipe/ni2345678901_gold_GTI1.lc.gz': '',
+            })
+            changed, created = db_watch.coalesce(inotify, 0.2)
+            self.assertEqual(changed, {'1234567890/', '2345678901/jspipe/'})
+            self.assertEqual(created, {'1234567890/new/'})
+            inotify.add('1234567890/new/')
+
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(db_watch.apply(db_path, self.data_dir, changed, created)[0], 4)
+
+            db_watch.watch_indexed(inotify, db_path, created)
+            self.assertIn('1234567890/new/jspipe/', inotify.watches)
@@ -9,5 +9,7 @@ app_name = 'file_mgr'  # pylint: disable=invalid-name
 urlpatterns = [
     path('dir/<path:path>', views.directory, name='directory'),
     path('file/<path:path>', views.file, name='file'),
+    path('data/<path:path>', views.data, name='data'),
     path('file_request', views.file_request, name='file_request'),
+    path('search', views.search, name='search'),
 ]
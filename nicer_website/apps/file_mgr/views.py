@@ -1,11 +1,182 @@
 """
 Main functions for backend functionality of the file manager page
 """
+import os
+import re
+import mimetypes
+from typing import BinaryIO
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connections, router
+from django.urls import reverse
 from django.shortcuts import render
 from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse
+
+from .models import Directory, Item
+
+SEARCH_MODES = ('prefix', 'substring', 'glob')
+
+
+class FileRange:
+    """
+    File-like object limited to a byte range of a file for partial content responses
+
+    Exposes the file descriptor so that WSGI servers with a sendfile capable wsgi.file_wrapper
+    can send the range without copying it through Python
+
+    Attributes
+    ----------
+    name : str
+        Name of the file, used to guess the content type
+    remaining : int
+        Number of bytes of the range left to read
+    """
+    def __init__(self, handle: BinaryIO, start: int, length: int):
+        """
+        Parameters
+        ----------
+        handle : BinaryIO
+            Open file to read the range from
+        start : int
+            First byte of the range
+        length : int
+            Number of bytes in the range
+        """
+        handle.seek(start)
+        self._file = handle
+        self.name = handle.name
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Reads up to size bytes without going past the end of the range
+
+        Parameters
+        ----------
+        size : int, default = -1
+            Maximum number of bytes to read, if negative, the rest of the range is read
+
+        Returns
+        -------
+        bytes
+            Bytes read from the range
+        """
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+
+        payload = self._file.read(size)
+        self.remaining -= len(payload)
+        return payload
+
+    def fileno(self) -> int:
+        """
+        File descriptor of the underlying file
+
+        Returns
+        -------
+        int
+            File descriptor
+        """
+        return self._file.fileno()
+
+    def close(self):
+        """
+        Closes the underlying file
+        """
+        self._file.close()
+
+
+def glob_escape(text: str) -> str:
+    """
+    Escapes the GLOB special characters so that the text is matched literally
+
+    Parameters
+    ----------
+    text : str
+        Text to escape
+
+    Returns
+    -------
+    str
+        Text with each special character wrapped in a character class
+    """
+    return re.sub(r'([*?\[])', r'[\1]', text)
+
+
+def directory_path(path: str) -> str:
+    """
+    Converts a path to the format of the directory paths in the database
+
+    Parameters
+    ----------
+    path : str
+        Path to the directory relative to the data directory
+
+    Returns
+    -------
+    str
+        Directory path with a trailing slash, or the root path
+    """
+    path = path.strip('/')
+    return f'{path}/' if path else Directory.root
+
+
+def byte_range(request: HttpRequest, size: int, etag: str, mtime: int) -> tuple[int, int] | None:
+    """
+    Gets the byte range requested by the Range header, only single ranges are supported and
+    multiple ranges, invalid headers or a stale If-Range header will return the whole file
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Http request containing the headers Range and If-Range
+    size : int
+        Size of the file in bytes
+    etag : str
+        ETag of the file
+    mtime : int
+        Last modified time of the file in seconds
+
+    Returns
+    -------
+    tuple[int, int] | None
+        Start and end (inclusive) bytes of the range, None if the whole file should be sent
+
+    Raises
+    ------
+    ValueError
+        If the range cannot be satisfied for the file size
+    """
+    start: int
+    end: int
+    if_range: str = request.headers.get('If-Range', '')
+    match: re.Match | None = re.fullmatch(
+        r'\s*bytes=(\d*)-(\d*)\s*',
+        request.headers.get('Range', ''),
+    )
+
+    if not match or not any(match.groups()):
+        return None
+
+    # Range only applies if the file is unchanged since the client's copy
+    if if_range and if_range != etag and parse_http_date_safe(if_range) != mtime:
+        return None
 
-from .models import Item
+    if not match.group(1):
+        start = max(size - int(match.group(2)), 0)
+        end = size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2) or size - 1), size - 1)
+
+    if start >= size or start > end:
+        raise ValueError(f'Range {start}-{end} is not satisfiable for size {size}')
+
+    return start, end
 
 
 def dir_file_fetcher(start: int, end: int, path: str) -> tuple[QuerySet, QuerySet]:
@@ -26,8 +197,15 @@ def dir_file_fetcher(start: int, end: int, path: str) -> tuple[QuerySet, QuerySe
     tuple[QuerySet, QuerySet]
         Directories and files
     """
-    dirs = Item.objects.filter(path=path, type=Item.item_type[0][0]).order_by('name')[start:end]
-    files = Item.objects.filter(path=path, type=Item.item_type[1][0]).order_by('name')[start:end]
+    directory_id = Directory.get_id(path)
+    dirs = Item.objects.filter(
+        directory_id=directory_id,
+        type=Item.item_type[0][0],
+    ).order_by('name')[start:end]
+    files = Item.objects.filter(
+        directory_id=directory_id,
+        type=Item.item_type[1][0],
+    ).order_by('name')[start:end]
     return dirs, files
 
 
@@ -47,9 +225,7 @@ def directory(request: HttpRequest, path: str) -> HttpResponse:
     HttpResponse
         Http response containing the directory page
     """
-    if path:
-        path = path.strip('/') + '/'
-
+    path = directory_path(path)
     sub_dirs, sub_files = dir_file_fetcher(0, 1, path)
     parent_path = '/'.join(path.split('/')[:-2]) + '/'
 
@@ -79,13 +255,14 @@ def file(request: HttpRequest, path: str) -> HttpResponse:
     HttpResponse
         Http response containing the file page
     """
-    parent_path = '/'.join(path.split('/')[:-1])
+    parent_path = directory_path('/'.join(path.split('/')[:-1]))
     file_name = path.split('/')[-1]
 
-    if not parent_path:
-        parent_path = Item._meta.get_field('path').get_default()  # pylint: disable=protected-access
-
-    file_object = Item.objects.filter(path=parent_path + '/').get(name=file_name)
+    file_object = Item.objects.get(
+        directory_id=Directory.get_id(parent_path),
+        name=file_name,
+        type=Item.item_type[1][0],
+    )
 
     return render(
         request,
@@ -95,6 +272,100 @@ def file(request: HttpRequest, path: str) -> HttpResponse:
         })
 
 
+def data(request: HttpRequest, path: str) -> HttpResponse:
+    """
+    Serves a data file that is in the file index
+
+    Supports conditional requests (ETag, Last-Modified) and single byte range requests,
+    and if DATA_SENDFILE_HEADER is set, delivery is delegated to the web server in front of
+    Django using X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd)
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Http request for the file
+    path : str
+        Path to the file relative to the data directory
+
+    Returns
+    -------
+    HttpResponse
+        Http response containing the file or part of the file
+    """
+    byte_start: int
+    byte_end: int
+    file_range: tuple[int, int] | None
+    etag: str
+    encoding: str | None
+    content_type: str | None
+    file_path: str
+    parent_path: str
+    file_name: str
+    response: HttpResponse | None
+    stat: os.stat_result
+
+    path = path.strip('/')
+    parent_path = directory_path('/'.join(path.split('/')[:-1]))
+    file_name = path.split('/')[-1]
+
+    # Only serve files that are in the index
+    if not Item.objects.filter(
+        directory_id=Directory.get_id(parent_path),
+        name=file_name,
+        type=Item.item_type[1][0],
+    ).exists():
+        raise Http404(f'{path} is not in the file index')
+
+    file_path = os.path.join(settings.DATA_DIR, path)
+
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError as error:
+        raise Http404(f'{path} no longer exists') from error
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+
+    if response is not None:
+        return response
+
+    # Let the fronting web server send the file
+    if settings.DATA_SENDFILE_HEADER:
+        content_type, encoding = mimetypes.guess_type(file_name)
+        response = HttpResponse(content_type='application/gzip' if encoding == 'gzip' else (
+            content_type or 'application/octet-stream'
+        ))
+        response[settings.DATA_SENDFILE_HEADER] = (
+            settings.DATA_SENDFILE_PREFIX + quote(path)
+            if settings.DATA_SENDFILE_HEADER == 'X-Accel-Redirect'
+            else os.path.join(os.path.abspath(settings.DATA_DIR), path)
+        )
+    else:
+        try:
+            file_range = byte_range(request, stat.st_size, etag, int(stat.st_mtime))
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+        if file_range is None:
+            response = FileResponse(open(file_path, 'rb'))  # pylint: disable=consider-using-with
+        else:
+            byte_start, byte_end = file_range
+            response = FileResponse(FileRange(
+                open(file_path, 'rb'),  # pylint: disable=consider-using-with
+                byte_start,
+                byte_end - byte_start + 1,
+            ), status=206)
+            response['Content-Length'] = byte_end - byte_start + 1
+            response['Content-Range'] = f'bytes {byte_start}-{byte_end}/{stat.st_size}'
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
+
+
 def file_request(request: HttpRequest) -> JsonResponse:
     """
     Fetches the directories and files for the current directory level
@@ -107,21 +378,93 @@ def file_request(request: HttpRequest) -> JsonResponse:
     Returns
     -------
     JsonResponse
-        Directories and files to display in the current directory level
+        Directories and files to display in the current directory level, with the thumbnail URL
+        (thumbnail) of the directories that are observations
     """
     start = int(request.GET.get('start'))
     end = int(request.GET.get('end'))
     path = request.GET.get('path')
 
     if path == 'Root':
-        path = Item._meta.get_field('path').get_default()  # pylint: disable=protected-access
+        path = Directory.root
 
     sub_dirs, sub_files = dir_file_fetcher(start, end, path)
 
-    sub_dirs = list(sub_dirs.values())
-    sub_files = list(sub_files.values())
+    # Add the directory path to each item
+    sub_dirs = [item | {'path': path} for item in sub_dirs.values('id', 'name', 'type')]
+    sub_files = [item | {'path': path} for item in sub_files.values('id', 'name', 'type')]
+
+    # Observations are the directories of the root containing a jspipe directory
+    if path == Directory.root:
+        observations = set(Directory.objects.filter(
+            path__in=[f'{item["name"]}/jspipe/' for item in sub_dirs],
+        ).values_list('path', flat=True))
+
+        for item in sub_dirs:
+            if f'{item["name"]}/jspipe/' in observations:
+                item['thumbnail'] = reverse('plots:thumbnail', args=[item['name']])
 
     return JsonResponse({
         "dirs": sub_dirs,
         "files": sub_files,
     })
+
+
+def search(request: HttpRequest) -> JsonResponse:
+    """
+    Searches the names of all files and directories using the trigram full text search index
+
+    Supports prefix, substring, and glob-style (*, ?, [...]) queries, which are case-sensitive
+    and require at least three literal characters so that the index can be used
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Http request containing the variables query (q), search mode (mode), optional
+        directory to search under (path), and start (start) and end (end) indices of the results
+
+    Returns
+    -------
+    JsonResponse
+        Items matching the query with their name, path and type (items)
+    """
+    start: int = int(request.GET.get('start', 0))
+    end: int = int(request.GET.get('end', 20))
+    query: str = request.GET.get('q', '')
+    mode: str = request.GET.get('mode', SEARCH_MODES[1])
+    path: str = request.GET.get('path', '')
+    pattern: str
+    sql: str = 'SELECT name, path, type FROM file_mgr_item_search WHERE name GLOB %s'
+    params: list[str | int]
+    items: list[dict[str, str]]
+
+    if mode not in SEARCH_MODES:
+        return JsonResponse({'error': f'Unknown search mode {mode}'}, status=400)
+
+    if len(re.sub(r'\[.*?]|[*?]', '', query)) < 3:
+        return JsonResponse({'error': 'Query must contain at least 3 characters'}, status=400)
+
+    if mode == SEARCH_MODES[0]:
+        pattern = glob_escape(query) + '*'
+    elif mode == SEARCH_MODES[1]:
+        pattern = f'*{glob_escape(query)}*'
+    else:
+        pattern = query
+
+    params = [pattern]
+
+    # Restrict the search to a directory and its subdirectories
+    if path and path != 'Root':
+        sql += ' AND path GLOB %s'
+        params.append(glob_escape(path.strip('/') + '/') + '*')
+
+    sql += ' ORDER BY rowid LIMIT %s OFFSET %s'
+    params.extend([max(end - start, 0), start])
+
+    with connections[router.db_for_read(Item)].cursor() as cursor:
+        cursor.execute(sql, params)
+        items = [
+            dict(zip(('name', 'path', 'type'), row)) for row in cursor.fetchall()
+        ]
+
+    return JsonResponse({'items': items})
@@ -3,4 +3,8 @@ Model registration for plots
 """
 from django.contrib import admin
 
+from .models import Observation
+
+
 # Register your models here.
+admin.site.register(Observation)
@@ -0,0 +1,180 @@
+"""
+Admission of plot requests by the plot limiter, with their cost estimated from the sizes of the
+products they read
+"""
+import os
+from typing import Any, Callable, Iterator
+from functools import wraps
+
+import numpy as np
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, JsonResponse, QueryDict
+
+from nicer_website.limiter import Overloaded, client_id, limiter
+from nicer_website.apps.plots.manifest import Manifest, get_manifest
+from nicer_website.apps.plots.products import PLOTS, parse_gtis
+
+
+def plot_cost(query: QueryDict, file_types: list[str], gtis: int) -> float:
+    """
+    Estimates the cost of a plot request as the megabytes of products it reads, from the mean size
+    of the observation's products of each type, as the file index does not store sizes
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters containing the observation ID (obs_id) and quality (quality)
+    file_types : list[str]
+        File types of the products plotted
+    gtis : int
+        Number of GTIs plotted
+
+    Returns
+    -------
+    float
+        Estimated cost in megabytes
+    """
+    manifest: Manifest = get_manifest(query.get('obs_id', ''))
+    dir_path: str = f'{settings.DATA_DIR}/{manifest.dir_path}'
+    sizes: dict[str, list[int]] = {file_type: [] for file_type in file_types}
+
+    for name in manifest.files(query.get('quality', '')):
+        for file_type, file_sizes in sizes.items():
+            if file_type in name:
+                try:
+                    file_sizes.append(os.stat(f'{dir_path}{name}').st_size)
+                except OSError:
+                    continue
+
+    return gtis * sum(np.mean(file_sizes) for file_sizes in sizes.values() if file_sizes) / 1e6
+
+
+def plot_gti_cost(query: QueryDict) -> float:
+    """
+    Estimates the cost of a plot_gti request from the GTIs and plot type
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters of the request
+
+    Returns
+    -------
+    float
+        Estimated cost in megabytes
+    """
+    plot_type: dict[str, Any] | None = PLOTS.get(query.get('plot_type', ''))
+
+    if plot_type is None:
+        return 0
+
+    return plot_cost(
+        query,
+        [plot_type['file_type']],
+        max(len(parse_gtis(query.get('gti-search', ''))), 1),
+    )
+
+
+def plot_data_cost(query: QueryDict) -> float:
+    """
+    Estimates the cost of a plot_data request from the plot types, each of which plots one GTI
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters of the request
+
+    Returns
+    -------
+    float
+        Estimated cost in megabytes
+    """
+    return plot_cost(
+        query,
+        [plot_type['file_type'] for plot_type in PLOTS.values()
+         if plot_type['file_type'] in query.values()],
+        1,
+    )
+
+
+def admitted(cost: Callable[[QueryDict], float]) -> Callable:
+    """
+    Limits an expensive view with the plot limiter, answering with 429 or 503 and Retry-After if
+    the request is not admitted
+
+    Parameters
+    ----------
+    cost : Callable[[QueryDict], float]
+        Function estimating the cost of a request from its query parameters
+
+    Returns
+    -------
+    Callable
+        Decorator for the view
+    """
+    def decorator(view: Callable[[HttpRequest], HttpResponse]) -> Callable:
+        @wraps(view)
+        def limited_view(request: HttpRequest) -> HttpResponse:
+            query: QueryDict = request.GET if request.method == 'GET' else request.POST
+
+            try:
+                with limiter.admit(cost(query), client_id(request)):
+                    return view(request)
+            except Overloaded as error:
+                return overloaded(error)
+
+        return limited_view
+
+    return decorator
+
+
+def overloaded(error: Overloaded) -> JsonResponse:
+    """
+    Answers a request refused by the plot limiter
+
+    Parameters
+    ----------
+    error : Overloaded
+        Refusal by the limiter
+
+    Returns
+    -------
+    JsonResponse
+        429 or 503 response with the error and Retry-After
+    """
+    response: JsonResponse = JsonResponse({'error': str(error)}, status=error.status)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def admitted_stream(cost: float, client: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Holds admission by the plot limiter while a streamed response is generated, as a streaming
+    view returns before its content is computed
+
+    The stream first yields an empty chunk once admitted, which the view takes before answering,
+    so that refusals can still be answered with an error, and the admission is released when the
+    response is closed
+
+    Parameters
+    ----------
+    cost : float
+        Estimated cost of the request
+    client : str
+        Client address
+    chunks : Iterator[bytes]
+        Content of the response
+
+    Yields
+    ------
+    bytes
+        Empty chunk once admitted, then the content of the response
+
+    Raises
+    ------
+    Overloaded
+        If the request is not admitted
+    """
+    with limiter.admit(cost, client):
+        yield b''
+        yield from chunks
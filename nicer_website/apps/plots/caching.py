@@ -0,0 +1,209 @@
+"""
+HTTP caching of the GET plot views, which are redirected to a canonical query and validated by the
+modification times of the products, with concurrent identical renders shared by single flight
+"""
+import os
+import re
+import hashlib
+from typing import Callable
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.shortcuts import redirect
+from django.http import HttpRequest, HttpResponse, QueryDict
+from django.utils.http import http_date
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from nicer_website.prefetch import prefetcher
+from nicer_website.apps.plots.manifest import Manifest, get_manifest
+from src.utils import single_flight
+
+
+def canonical_query(query: QueryDict, parameters: tuple[str, ...]) -> list[tuple[str, str]]:
+    """
+    Gets the canonical form of a plot query, so that equivalent queries share one URL in caches
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters of the request
+    parameters : tuple[str, ...]
+        Parameters used by the view in canonical order
+
+    Returns
+    -------
+    list[tuple[str, str]]
+        Used parameters with values in canonical order, excluding unknown and empty parameters
+    """
+    value: str
+    canonical: list[tuple[str, str]] = []
+
+    for parameter in parameters:
+        value = query.get(parameter, '').strip()
+
+        if parameter in ('displayed', 'gti-search'):
+            value = re.sub(r'[^\d,-]', '', value)
+
+        if value:
+            canonical.append((parameter, value))
+
+    return canonical
+
+
+def canonical_redirect(request: HttpRequest, parameters: tuple[str, ...]) -> HttpResponse | None:
+    """
+    Redirects a GET request to the canonical form of its query
+
+    Parameters
+    ----------
+    request : HttpRequest
+        GET request to a plot view
+    parameters : tuple[str, ...]
+        Parameters used by the view in canonical order
+
+    Returns
+    -------
+    HttpResponse | None
+        Permanent redirect to the canonical query, or None if the query is canonical
+    """
+    canonical: list[tuple[str, str]] = canonical_query(request.GET, parameters)
+
+    if parse_qsl(request.META.get('QUERY_STRING', ''), keep_blank_values=True) != canonical:
+        return redirect(f'{request.path}?{urlencode(canonical)}', permanent=True)
+
+    return None
+
+
+def plot_validators(query: QueryDict) -> tuple[str, int]:
+    """
+    Gets the strong ETag and last modified time of a plot from the modification times and sizes of
+    the observation's files for the pipeline quality, the query and the quantization, without
+    reading the files
+
+    Parameters
+    ----------
+    query : QueryDict
+        Canonical query parameters of the request
+
+    Returns
+    -------
+    tuple[str, int]
+        Quoted ETag and last modification time in seconds since the epoch
+    """
+    manifest: Manifest = get_manifest(query.get('obs_id', ''))
+    last_modified: int = 0
+    digest = hashlib.sha256(f'{query.urlencode()}\0{settings.PLOT_SIGNIFICANT_DIGITS}'.encode())
+    status: os.stat_result
+
+    for name in manifest.files(query.get('quality', '')):
+        try:
+            status = os.stat(f'{settings.DATA_DIR}/{manifest.dir_path}{name}')
+        except OSError:
+            digest.update(f'\0{name}\0'.encode())
+            continue
+
+        digest.update(f'\0{name}\0{status.st_mtime_ns}\0{status.st_size}'.encode())
+        last_modified = max(last_modified, int(status.st_mtime))
+
+    return f'"{digest.hexdigest()[:32]}"', last_modified
+
+
+def render_view(
+        view: Callable[[HttpRequest], HttpResponse],
+        request: HttpRequest) -> tuple[bytes, int, dict[str, str]]:
+    """
+    Renders a view to the parts of the response that can be shared between processes
+
+    Parameters
+    ----------
+    view : Callable[[HttpRequest], HttpResponse]
+        View to render
+    request : HttpRequest
+        Request for the view
+
+    Returns
+    -------
+    tuple[bytes, int, dict[str, str]]
+        Content, status code and headers of the response
+    """
+    response: HttpResponse = view(request)
+    return response.content, response.status_code, dict(response.headers)
+
+
+def flight_key(view: Callable[[HttpRequest], HttpResponse], etag: str) -> str:
+    """
+    Gets the key shared by renders of a view with the same ETag, by single flight and prefetch
+
+    Parameters
+    ----------
+    view : Callable[[HttpRequest], HttpResponse]
+        View to render
+    etag : str
+        ETag of the response
+
+    Returns
+    -------
+    str
+        Key of the render
+    """
+    return f'{view.__module__}.{view.__name__}{etag}'
+
+
+def cacheable(parameters: tuple[str, ...]) -> Callable:
+    """
+    Allows GET requests to a plot view to be cached by browsers and proxies
+
+    GET requests are redirected to their canonical query, and answered with 304 Not Modified if
+    the ETag or modification time matches, before any data files are read, otherwise the plot is
+    returned with the ETag and Last-Modified headers, rendered once for concurrent requests with
+    the same ETag unless it was prefetched, while errors, such as refusals by the limiter, are not
+    cacheable
+
+    Parameters
+    ----------
+    parameters : tuple[str, ...]
+        Parameters used by the view in canonical order
+
+    Returns
+    -------
+    Callable
+        Decorator for the view
+    """
+    def decorator(view: Callable[[HttpRequest], HttpResponse]) -> Callable:
+        @wraps(view)
+        def cached_view(request: HttpRequest) -> HttpResponse:
+            etag: str
+            last_modified: int
+            content: bytes
+            status: int
+            headers: dict[str, str]
+            response: HttpResponse | None
+
+            if request.method != 'GET':
+                return view(request)
+
+            response = canonical_redirect(request, parameters)
+
+            if response is not None:
+                return response
+
+            etag, last_modified = plot_validators(request.GET)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+            if response is None:
+                content, status, headers = prefetcher.take(flight_key(view, etag)) or \
+                    single_flight.run(flight_key(view, etag), lambda: render_view(view, request))
+                response = HttpResponse(content, status=status, headers=headers)
+
+            if response.status_code not in (200, 304):
+                return response
+
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, public=True, max_age=settings.PLOT_CACHE_MAX_AGE)
+            return response
+
+        return cached_view
+
+    return decorator
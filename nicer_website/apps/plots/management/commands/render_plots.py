@@ -0,0 +1,301 @@
+"""
+Renders the default plots of every observation in the file index to static files, for releases
+and other material that cannot use the interactive plot page
+"""
+import os
+import json
+import time
+import tempfile
+from typing import Any
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+from django.core.management.base import BaseCommand, CommandParser
+
+from nicer_website.apps.file_mgr.models import Item
+from nicer_website.apps.plots.manifest import Manifest
+from nicer_website.apps.plots.products import PLOTS, encode_plot
+
+QUALITIES = ('goddard', 'gold', 'silver', 'radium', 'pyrite')
+OBSERVATION_DIR = '/jspipe/'
+HTML_PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="https://cdn.plot.ly/plotly-2.35.2.min.js"></script>
+<script id="MathJax-script" src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-svg.js"></script>
+</head>
+<body>
+{plot}
+</body>
+</html>
+'''
+
+
+def render_product(task: tuple[str, str, int, str, str]) -> tuple[str, float, int, str | None]:
+    """
+    Renders a plot of a product with the processing function of the plot views and writes it
+    atomically, so that an interrupted render leaves no partial file
+
+    Parameters
+    ----------
+    task : tuple[str, str, int, str, str]
+        Plot type, path to the product, GTI number, output format (html or json) and path of the
+        output file
+
+    Returns
+    -------
+    tuple[str, float, int, str | None]
+        Plot type, seconds taken, size of the output in bytes and the error if the plot failed
+    """
+    plot_type, data_path, gti, output, path = task
+    plot: str | dict[str, Any]
+    content: str
+    temp_path: str
+    start: float = time.perf_counter()
+
+    try:
+        plot = import_string(PLOTS[plot_type]['function'])(
+            PLOTS[plot_type]['min_value'],
+            [data_path],
+            [gti],
+            output=output,
+        )
+    except (OSError, ValueError, IndexError, KeyError) as error:
+        return plot_type, time.perf_counter() - start, 0, str(error) or type(error).__name__
+
+    # Plots that fail return an error message instead of a figure
+    if isinstance(plot, str) and (output == 'json' or 'plotly-graph-div' not in plot):
+        return plot_type, time.perf_counter() - start, 0, plot
+
+    if output == 'json':
+        content = json.dumps(encode_plot(plot_type, plot))
+    else:
+        content = HTML_PAGE.format(title=os.path.basename(data_path), plot=plot)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(
+            mode='w',
+            encoding='utf-8',
+            dir=os.path.dirname(path),
+            prefix='.',
+            delete=False) as file:
+        temp_path = file.name
+        file.write(content)
+
+    os.replace(temp_path, path)
+    return plot_type, time.perf_counter() - start, len(content.encode()), None
+
+
+class Command(BaseCommand):
+    """
+    Management command rendering the default spectrum, light curve and PDS of each observation and
+    pipeline quality, which are the first GTI's products as shown by the interactive plot page
+    """
+    help = (
+        'Renders the default plots of every observation in the file index to '
+        '<output>/<obs_id>/<quality>/<plot type>.<format>, skipping plots newer than their product'
+    )
+
+    def add_arguments(self, parser: CommandParser):
+        """
+        Adds the arguments of the command
+
+        Parameters
+        ----------
+        parser : CommandParser
+            Parser of the command arguments
+        """
+        parser.add_argument('output', help='Directory to write the plots to')
+        parser.add_argument(
+            '--format',
+            choices=('html', 'json'),
+            default='html',
+            help='Standalone HTML pages or JSON figures as returned by the plot views',
+        )
+        parser.add_argument(
+            '--quality',
+            nargs='+',
+            default=QUALITIES,
+            help='Pipeline qualities to render',
+        )
+        parser.add_argument('--obs-id', nargs='+', help='Only render these observations')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of processes rendering plots',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render plots again even if they are newer than their product',
+        )
+
+    def observations(self, obs_ids: list[str] | None) -> dict[str, Manifest]:
+        """
+        Gets the manifest of every observation from the file index with one query
+
+        Parameters
+        ----------
+        obs_ids : list[str] | None
+            Observations to get, or None for every observation
+
+        Returns
+        -------
+        dict[str, Manifest]
+            Manifest of each observation by observation ID
+        """
+        names: dict[str, list[str]] = defaultdict(list)
+        files = Item.objects.filter(
+            directory__path__regex=fr'^[^/]+{OBSERVATION_DIR}$',
+            type=Item.item_type[1][0],
+        )
+
+        if obs_ids:
+            files = files.filter(directory__path__in=[
+                f'{obs_id}{OBSERVATION_DIR}' for obs_id in obs_ids
+            ])
+
+        for path, name in files.order_by('directory__path', 'name').values_list(
+                'directory__path',
+                'name',
+        ).iterator():
+            names[path[:-len(OBSERVATION_DIR)]].append(name)
+
+        return {obs_id: Manifest(obs_id, obs_names) for obs_id, obs_names in names.items()}
+
+    def tasks(
+            self,
+            manifests: dict[str, Manifest],
+            data_dir: str,
+            options: dict[str, Any]) -> tuple[list[tuple[str, str, int, str, str]], int]:
+        """
+        Lists the plots to render, skipping plots that are newer than their product unless forced
+
+        Parameters
+        ----------
+        manifests : dict[str, Manifest]
+            Manifest of each observation
+        data_dir : str
+            Path to the data directory
+        options : dict[str, Any]
+            Command options
+
+        Returns
+        -------
+        tuple[list[tuple[str, str, int, str, str]], int]
+            Arguments of render_product for each plot, and the number of plots skipped
+        """
+        gti: int
+        path: str
+        data_path: str
+        products: dict[int, str]
+        skipped: int = 0
+        tasks: list[tuple[str, str, int, str, str]] = []
+
+        for obs_id, manifest in manifests.items():
+            for quality in options['quality']:
+                for plot_type, plot in PLOTS.items():
+                    products = manifest.products(quality, plot['file_type'])
+
+                    if not products:
+                        continue
+
+                    gti = next(iter(products))
+                    data_path = os.path.join(data_dir, manifest.dir_path, products[gti])
+                    path = os.path.join(
+                        options['output'],
+                        obs_id,
+                        quality,
+                        f'{plot_type}.{options["format"]}',
+                    )
+
+                    try:
+                        if not options['force'] and \
+                                os.path.getmtime(path) >= os.path.getmtime(data_path):
+                            skipped += 1
+                            continue
+                    except OSError:
+                        pass
+
+                    tasks.append((plot_type, data_path, gti, options['format'], path))
+
+        return tasks, skipped
+
+    def handle(self, *args: Any, **options: Any):
+        """
+        Renders the plots in a process pool and reports the throughput of each plot type
+
+        Parameters
+        ----------
+        options : dict[str, Any]
+            Command options
+        """
+        plot_type: str
+        seconds: float
+        size: int
+        error: str | None
+        done: int = 0
+        start: float = time.perf_counter()
+        manifests: dict[str, Manifest] = self.observations(options['obs_id'])
+        tasks, skipped = self.tasks(manifests, settings.DATA_DIR, options)
+        totals: dict[str, list[float]] = {plot_type: [0, 0, 0, 0] for plot_type in PLOTS}
+
+        self.stdout.write(
+            f'{len(manifests)} observations, {len(tasks)} plots to render, '
+            f'{skipped} up to date'
+        )
+
+        # Forked workers must not share the database connections
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for plot_type, seconds, size, error in executor.map(
+                    render_product,
+                    tasks,
+                    chunksize=4):
+                done += 1
+                totals[plot_type][0 if error is None else 1] += 1
+                totals[plot_type][2] += seconds
+                totals[plot_type][3] += size
+
+                if error is not None:
+                    self.stderr.write(f'{tasks[done - 1][1]}: {error}')
+
+                if not done % 100:
+                    self.stdout.write(
+                        f'{done}/{len(tasks)} plots, '
+                        f'{done / (time.perf_counter() - start):.1f} plots/s'
+                    )
+
+        self.report(totals)
+        self.stdout.write(f'{done} plots in {time.perf_counter() - start:.1f} s')
+
+    def report(self, totals: dict[str, list[float]]):
+        """
+        Reports the plots rendered and failed, throughput and output size of each plot type
+
+        Parameters
+        ----------
+        totals : dict[str, list[float]]
+            Plots rendered and failed, seconds taken and bytes written for each plot type
+        """
+        plot_type: str
+        rendered: float
+        failed: float
+        seconds: float
+        size: float
+
+        for plot_type, (rendered, failed, seconds, size) in totals.items():
+            if rendered or failed:
+                self.stdout.write(
+                    f'{plot_type}: {rendered:.0f} rendered, {failed:.0f} failed, '
+                    f'{(rendered + failed) / seconds:.1f} products/s per worker, '
+                    f'{size / 1e6:.1f} MB'
+                )
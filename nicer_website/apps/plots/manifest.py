@@ -0,0 +1,149 @@
+"""
+Per-observation manifests of the product files, cached in process memory so that the plot views
+resolve files without querying the file index on every request
+
+Each manifest is built with one query and cached until the ingest version, which db_update bumps
+in the database header when it commits an update, changes. The version is read at most once every
+VERSION_INTERVAL seconds, so plots may use the previous files for that long after an update
+"""
+import re
+import time
+from threading import Lock
+
+from nicer_website.apps.file_mgr.models import VERSION_INTERVAL, Item, ingest_version
+
+MAX_MANIFESTS = 4096
+
+_lock: Lock = Lock()
+_manifests: dict[str, 'Manifest'] = {}
+_version: int | None = None
+_checked: float = 0
+
+
+class Manifest:
+    """
+    Product files of an observation, with the products of each pipeline quality and file type
+    grouped by GTI on first use
+
+    Qualities and file types are matched as substrings of the file names like the file index
+    queries they replace, and band light curves are excluded from the products
+    """
+    def __init__(self, obs_id: str, names: list[str]):
+        self.obs_id = obs_id
+        self.dir_path: str = f'{obs_id}/jspipe/'
+        self.names = names
+        self._products: dict[tuple[str, str], dict[int, str]] = {}
+
+    def files(self, quality: str) -> list[str]:
+        """
+        Gets the files of a pipeline quality
+
+        Parameters
+        ----------
+        quality : str
+            Pipeline quality
+
+        Returns
+        -------
+        list[str]
+            File names containing the quality in name order
+        """
+        return [name for name in self.names if quality in name]
+
+    def products(self, quality: str, file_type: str) -> dict[int, str]:
+        """
+        Gets the products of a pipeline quality and file type by GTI
+
+        Parameters
+        ----------
+        quality : str
+            Pipeline quality
+        file_type : str
+            File type, such as .lc.gz
+
+        Returns
+        -------
+        dict[int, str]
+            File name of each GTI's product, in name order, where the first product is the
+            default product of the observation and the number of products is its maximum GTI
+        """
+        gti: re.Match | None
+        products: dict[int, str]
+        key: tuple[str, str] = (quality, file_type)
+
+        if key not in self._products:
+            products = {}
+
+            for name in self.files(quality):
+                gti = re.search(r'GTI(\d+)', name)
+
+                if file_type in name and gti and not re.search(r'_BAND\d+', name):
+                    products.setdefault(int(gti.group(1)), name)
+
+            self._products[key] = products
+
+        return self._products[key]
+
+
+def check_version():
+    """
+    Clears the cached manifests if the ingest version changed, reading the version at most once
+    every VERSION_INTERVAL seconds
+    """
+    global _version, _checked  # pylint: disable=global-statement
+    version: int
+    now: float = time.monotonic()
+
+    if now - _checked < VERSION_INTERVAL:
+        return
+
+    version = ingest_version()
+
+    with _lock:
+        _checked = now
+
+        if version != _version:
+            _manifests.clear()
+            _version = version
+
+
+def get_manifest(obs_id: str) -> Manifest:
+    """
+    Gets the manifest of an observation, building it from the file index if not cached
+
+    Parameters
+    ----------
+    obs_id : str
+        Observation ID
+
+    Returns
+    -------
+    Manifest
+        Manifest of the observation, without files if it is not in the file index
+    """
+    manifest: Manifest | None
+    version: int | None
+
+    check_version()
+
+    with _lock:
+        manifest = _manifests.get(obs_id)
+        version = _version
+
+    if manifest is not None:
+        return manifest
+
+    manifest = Manifest(obs_id, list(Item.objects.filter(
+        directory__path=f'{obs_id}/jspipe/',
+        type=Item.item_type[1][0],
+    ).order_by('name').values_list('name', flat=True)))
+
+    with _lock:
+        # Manifests built before the version changed may be missing the update
+        if version == _version:
+            if len(_manifests) >= MAX_MANIFESTS:
+                del _manifests[next(iter(_manifests))]
+
+            _manifests[obs_id] = manifest
+
+    return manifest
@@ -0,0 +1,57 @@
+# Generated by Django 4.1.13 on 2026-10-19 02:19
+
+from django.db import migrations, models
+
+
+RTREE_INSERT = (
+    'INSERT INTO plots_observation_rtree SELECT new.id, new.x, new.x, new.y, new.y, new.z, new.z '
+    'WHERE new.x IS NOT NULL'
+)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Observation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('obs_id', models.CharField(max_length=16, unique=True)),
+                ('object', models.CharField(blank=True, max_length=64)),
+                ('object_key', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('ra', models.FloatField(null=True)),
+                ('dec', models.FloatField(null=True)),
+                ('x', models.FloatField(null=True)),
+                ('y', models.FloatField(null=True)),
+                ('z', models.FloatField(null=True)),
+                ('date_obs', models.CharField(blank=True, max_length=32)),
+                ('exposure', models.FloatField(null=True)),
+                ('detectors', models.PositiveSmallIntegerField(null=True)),
+                ('mtime', models.BigIntegerField(null=True)),
+            ],
+        ),
+        migrations.RunSQL(
+            sql=[
+                'CREATE VIRTUAL TABLE plots_observation_rtree USING rtree('
+                'id, min_x, max_x, min_y, max_y, min_z, max_z)',
+                'CREATE TRIGGER plots_observation_rtree_insert AFTER INSERT ON plots_observation '
+                f'BEGIN {RTREE_INSERT}; END',
+                'CREATE TRIGGER plots_observation_rtree_delete AFTER DELETE ON plots_observation '
+                'BEGIN DELETE FROM plots_observation_rtree WHERE id = old.id; END',
+                'CREATE TRIGGER plots_observation_rtree_update AFTER UPDATE ON plots_observation '
+                'BEGIN DELETE FROM plots_observation_rtree WHERE id = old.id; '
+                f'{RTREE_INSERT}; END',
+            ],
+            reverse_sql=[
+                'DROP TRIGGER plots_observation_rtree_update',
+                'DROP TRIGGER plots_observation_rtree_delete',
+                'DROP TRIGGER plots_observation_rtree_insert',
+                'DROP TABLE plots_observation_rtree',
+            ],
+        ),
+    ]
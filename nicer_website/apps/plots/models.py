@@ -3,4 +3,28 @@ Models for the plots database
 """
 from django.db import models
 
-# Create your models here.
+
+class Observation(models.Model):
+    """
+    Model for the observation catalog containing the header values of each observation's
+    products, filled by db_update, with the object name normalised by object_key for lookups
+
+    The position is also stored as a unit vector (x, y, z), which is copied by triggers into the
+    R*Tree plots_observation_rtree for cone searches, so migrations that remake this table must
+    recreate the triggers
+    """
+    obs_id = models.CharField(max_length=16, unique=True)
+    object = models.CharField(max_length=64, blank=True)
+    object_key = models.CharField(max_length=64, blank=True, db_index=True)
+    ra = models.FloatField(null=True)
+    dec = models.FloatField(null=True)
+    x = models.FloatField(null=True)
+    y = models.FloatField(null=True)
+    z = models.FloatField(null=True)
+    date_obs = models.CharField(max_length=32, blank=True)
+    exposure = models.FloatField(null=True)
+    detectors = models.PositiveSmallIntegerField(null=True)
+    mtime = models.BigIntegerField(null=True)
+
+    def __str__(self):
+        return str(self.obs_id)
@@ -0,0 +1,287 @@
+"""
+Plot types with the import paths of their processing functions, and the selection of the products
+of the GTIs of a plot
+"""
+import re
+import logging as log
+from typing import Any, Callable, Iterator
+
+import numpy as np
+from numpy import ndarray
+from django.conf import settings
+from django.http import Http404, QueryDict
+from django.utils.module_loading import import_string
+
+from nicer_website.apps.plots.manifest import Manifest, get_manifest
+
+# Columns of the exported binned data of the spectrum and light curve
+EXPORT_COLUMNS: tuple[str, ...] = ('x', 'y', 'x_error', 'uncertainty', 'background')
+
+# Global variable
+# Processing functions are import paths, so that pandas, astropy and Plotly are only imported when
+# a plot is first requested rather than when the web process starts
+PLOTS: dict[str, dict[str, Any]] = {
+    'spectrum': {
+        'exists': False,
+        'min_value': None,
+        'file_type': '.jsgrp',
+        'function': 'src.utils.spectrum_preprocessing.spectrum_plot',
+        'cumulative': 'src.utils.spectrum_preprocessing.spectrum_cumulative',
+        'export': 'src.utils.spectrum_preprocessing.spectrum_export',
+        'columns': EXPORT_COLUMNS,
+    },
+    'light_curve': {
+        'exists': False,
+        'min_value': 100,
+        'file_type': '.lc.gz',
+        'function': 'src.utils.light_curve_preprocessing.light_curve_plot',
+        'cumulative': 'src.utils.light_curve_preprocessing.light_curve_cumulative',
+        'export': 'src.utils.light_curve_preprocessing.light_curve_export',
+        'columns': EXPORT_COLUMNS,
+    },
+    'power_density_spectrum': {
+        'exists': False,
+        'min_value': None,
+        'file_type': '-bin.pds',
+        'function': 'src.utils.power_density_processing.get_pds_data_and_plot',
+        'cumulative': None,
+        'export': 'src.utils.power_density_processing.pds_export',
+        'columns': ('x', 'y', 'uncertainty'),
+    }
+}
+
+QUANTIZE_FIGURE = 'src.utils.plots.quantize_figure'
+
+
+def warm_up():
+    """
+    Imports the processing functions of every plot, which is otherwise done on the first request of
+    each plot, so that production workers can preload them after forking instead of during boot
+    """
+    import_string(QUANTIZE_FIGURE)
+
+    for plot in PLOTS.values():
+        for key in ('function', 'cumulative', 'export'):
+            if plot[key]:
+                import_string(plot[key])
+
+
+def encode_plot(plot_type: str, figure: dict[str, Any] | str) -> dict[str, Any]:
+    """
+    Prepares a JSON figure for the response, quantizing its y values and errors to
+    PLOT_SIGNIFICANT_DIGITS so that the response compresses well
+
+    Parameters
+    ----------
+    plot_type : str
+        Plot type
+    figure : dict[str, Any] | str
+        Figure with typed arrays, or an error message if the plot failed
+
+    Returns
+    -------
+    dict[str, Any]
+        Plot type (type) and figure (figure)
+    """
+    if isinstance(figure, dict) and settings.PLOT_SIGNIFICANT_DIGITS:
+        figure = import_string(QUANTIZE_FIGURE)(figure, settings.PLOT_SIGNIFICANT_DIGITS)
+
+    return {'type': plot_type, 'figure': figure}
+
+
+def plot_webgl(query: QueryDict) -> bool | None:
+    """
+    Gets if a plot should use WebGL from the webgl parameter
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters of the request
+
+    Returns
+    -------
+    bool | None
+        If WebGL is requested, or None to choose by the number of points
+    """
+    webgl: str = query.get('webgl', '').lower()
+
+    if webgl in ('true', '1'):
+        return True
+
+    if webgl in ('false', '0'):
+        return False
+
+    return None
+
+
+def parse_gtis(gti_query: str) -> list[int]:
+    """
+    Parses a GTI query of comma separated GTI numbers and ranges, such as 0,2-4
+
+    Parameters
+    ----------
+    gti_query : str
+        GTI query
+
+    Returns
+    -------
+    list[int]
+        GTI numbers in the order of the query
+    """
+    gti: str
+    gti_range: list[int]
+    gti_list: list[int] = []
+
+    # Remove characters that are not numbers or dashes, and separate by commas
+    for gti in re.sub(r'[^\d,-]', '', gti_query).split(','):
+        # Convert dashes to a list of integers in the range of the two numbers
+        if re.search(r'\d+-\d+', gti):
+            gti_range = list(map(int, gti.split('-')))
+            gti_range[-1] += 1
+            gti_list.extend(range(*gti_range))
+        elif gti.isdigit():
+            gti_list.append(int(gti))
+
+    return gti_list
+
+
+def plot_query_error(query: QueryDict) -> str | None:
+    """
+    Checks the minimum value and plot type of a plot_gti query
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters of the request
+
+    Returns
+    -------
+    str | None
+        Error if the minimum value is not an integer or the plot type is unknown, otherwise None
+    """
+    plot_type: str = query.get('plot_type', '')
+
+    try:
+        int(query['min_value'])
+    except (KeyError, ValueError):
+        return 'Invalid minimum value'
+
+    if plot_type not in PLOTS:
+        return f'Unknown plot type {plot_type}'
+
+    return None
+
+
+def gti_summaries(manifest: Manifest, quality: str) -> list[dict[str, str]]:
+    """
+    Reads the summary of each GTI of an observation from its BGDATA.summary file
+
+    Parameters
+    ----------
+    manifest : Manifest
+        Manifest of the observation
+    quality : str
+        Pipeline quality
+
+    Returns
+    -------
+    list[dict[str, str]]
+        Values of each GTI's summary by name, with the GTI name (GTI), sorted by GTI number
+    """
+    gti: int
+    info: ndarray
+    dir_path: str = f'{settings.DATA_DIR}/{manifest.dir_path}'
+    products: dict[int, str] = manifest.products(quality, 'BGDATA.summary')
+    summaries: list[dict[str, str]] = []
+
+    for gti in sorted(products):
+        info = np.loadtxt(dir_path + products[gti], dtype=str, unpack=True)
+        summaries.append(dict(zip(*np.char.replace(info, "'", ''))) | {'GTI': f'GTI{gti}'})
+
+    return summaries
+
+
+def gti_products(query: QueryDict) -> tuple[list[str], list[int]]:
+    """
+    Gets the products of the selected GTIs of a plot_gti query, or of the first GTI if none of
+    the selected GTIs have a product
+
+    Parameters
+    ----------
+    query : QueryDict
+        Query parameters containing the GTI query (gti-search), observation ID (obs_id), pipeline
+        quality (quality) and plot type (plot_type)
+
+    Returns
+    -------
+    tuple[list[str], list[int]]
+        Path to the product and GTI number of each GTI
+
+    Raises
+    ------
+    Http404
+        If the observation has no products of the plot type
+    """
+    gti: int
+    plot_type: str = query['plot_type']
+    manifest: Manifest = get_manifest(query['obs_id'])
+    dir_path: str = f'{settings.DATA_DIR}/{manifest.dir_path}'
+    file_names: list[str] = []
+    file_gtis: list[int] = []
+    products: dict[int, str] = manifest.products(query['quality'], PLOTS[plot_type]['file_type'])
+
+    if not products:
+        raise Http404(f'No {plot_type} products in {manifest.dir_path}')
+
+    # Get the product of each GTI
+    for gti in parse_gtis(query.get('gti-search', '')):
+        if gti in products:
+            file_names.append(dir_path + products[gti])
+            file_gtis.append(gti)
+
+    # If not GTI found, use the first available GTI
+    if not file_names:
+        gti = next(iter(products))
+        file_names.append(dir_path + products[gti])
+        file_gtis.append(gti)
+
+    return file_names, file_gtis
+
+
+def export_columns(
+        plot_type: str,
+        min_value: int,
+        file_names: list[str],
+        file_gtis: list[int]) -> Iterator[tuple[int, dict[str, ndarray]]]:
+    """
+    Computes the binned columns of each GTI only when the export reaches it, skipping GTIs that
+    cannot be read, as the response has already started
+
+    Parameters
+    ----------
+    plot_type : str
+        Plot type
+    min_value : int
+        Minimum value used for binning
+    file_names : list[str]
+        Path to the product of each GTI
+    file_gtis : list[int]
+        GTI numbers
+
+    Yields
+    ------
+    tuple[int, dict[str, ndarray]]
+        GTI number and columns of each GTI
+    """
+    columns: dict[str, ndarray]
+    logger: log.Logger = log.getLogger(__name__)
+    function: Callable[[int, str], dict[str, ndarray]] = import_string(PLOTS[plot_type]['export'])
+
+    for data_path, gti in zip(file_names, file_gtis):
+        try:
+            columns = function(min_value, data_path)
+        except (OSError, ValueError, IndexError, KeyError) as error:
+            logger.warning('Skipped GTI %d of %s export: %s', gti, data_path, error)
+            continue
+
+        yield gti, columns
@@ -0,0 +1,1567 @@
+"""
+Tests for the plots app
+"""
+import io
+import os
+import sys
+import gc
+import gzip
+import json
+import hashlib
+import time
+import fcntl
+import base64
+import sqlite3
+import tempfile
+import subprocess
+import multiprocessing
+from contextlib import closing, redirect_stdout
+from urllib.parse import urlencode
+from typing import Any
+from threading import Event, Thread
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+from astropy.io import fits
+from django.db import connection
+from django.urls import reverse
+from django.core.management import call_command
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from src import db_update
+from src.utils import columns, shared_cache, single_flight, thumbnails
+from src.utils.light_curve_preprocessing import (
+    light_curve_cumulative,
+    light_curve_data,
+    light_curve_export,
+)
+from src.utils.plots import data_plot
+from src.utils.spectrum_preprocessing import spectrum_cumulative, spectrum_grouped
+from src.utils.utils import min_bin, quantize
+from src.utils.catalog import object_key, observation_header, unit_vector
+from src.utils.thumbnails import default_products
+from nicer_website.thumbnails import Thumbnailer
+from nicer_website.prefetch import Prefetcher
+from nicer_website.apps.file_mgr.models import Directory
+from . import caching, products, views
+from .management.commands import render_plots
+from .manifest import get_manifest
+from .models import Observation
+
+
+def write_spectrum(dir_path: str, name: str, header: dict[str, str | float], channels: int = 20):
+    """
+    Writes a grouped spectrum and its background as FITS tables of counts per channel, in groups
+    of two channels
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the jspipe directory
+    name : str
+        File name of the spectrum without its extension
+    header : dict[str, str | float]
+        Header values of the spectrum table, which should include RESPFILE and EXPOSURE
+    channels : int, default = 20
+        Number of channels
+    """
+    channel: np.ndarray = np.arange(30, 30 + channels)
+    table: fits.BinTableHDU
+
+    os.makedirs(dir_path, exist_ok=True)
+    table = fits.BinTableHDU.from_columns([
+        fits.Column(name='CHANNEL', format='J', array=channel),
+        fits.Column(name='COUNTS', format='J', array=np.full(channels, 10)),
+        fits.Column(name='GROUPING', format='I', array=np.tile([1, -1], channels // 2)),
+    ])
+    table.header.update(header)
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(os.path.join(dir_path, f'{name}.jsgrp'))
+
+    table = fits.BinTableHDU.from_columns([
+        fits.Column(name='CHANNEL', format='J', array=channel),
+        fits.Column(name='COUNTS', format='J', array=np.full(channels, 2)),
+    ])
+    table.header['EXPOSURE'] = header.get('EXPOSURE', 100.)
+    fits.HDUList([fits.PrimaryHDU(), table]).writeto(os.path.join(dir_path, f'{name}.bg'))
+
+
+def write_light_curve(dir_path: str, name: str, counts: list[float], background: float = 2.):
+    """
+    Writes a light curve of one second bins from 52 detectors and its constant background as
+    gzipped ASCII tables
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the jspipe directory
+    name : str
+        File name of the light curve without its extension
+    counts : list[float]
+        Count rate of each bin
+    background : float, default = 2.
+        Background count rate
+    """
+    os.makedirs(dir_path, exist_ok=True)
+
+    with gzip.open(os.path.join(dir_path, f'{name}.lc.gz'), mode='wt') as file:
+        for time, rate in enumerate(counts):
+            file.write(f'{time:.1f} 0 {rate:.1f} 52\n')
+
+    with gzip.open(os.path.join(dir_path, f'{name}.bg-lc.gz'), mode='wt') as file:
+        for time in range(len(counts)):
+            file.write(f'{time:.1f} 0 {background:.1f} 52\n')
+
+
+class ColumnStoreTests(SimpleTestCase):
+    """
+    Tests converting products to the column store and rebuilding stale entries
+    """
+    def setUp(self):
+        self._data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self._store_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._data_dir.cleanup)
+        self.addCleanup(self._store_dir.cleanup)
+        self.dir_path = os.path.join(self._data_dir.name, '1234567890', 'jspipe')
+        patcher = mock.patch.object(columns, 'directories', return_value=(
+            os.path.realpath(self._data_dir.name),
+            os.path.realpath(self._store_dir.name),
+            None,
+        ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_light_curve(self):
+        """
+        Converts a light curve on first load, memory-maps it afterwards and rebuilds it once the
+        light curve changes
+        """
+        data_path = os.path.join(self.dir_path, 'ni_gold_GTI0.lc.gz')
+        write_light_curve(self.dir_path, 'ni_gold_GTI0', [30, 27, 36])
+
+        data, header = columns.load(data_path)
+        self.assertEqual(header, {})
+        np.testing.assert_array_equal(data['COUNTS'], [30, 27, 36])
+        self.assertTrue(os.path.isfile(os.path.join(columns.entry_path(data_path), columns.META)))
+
+        data, _ = columns.load(data_path)
+        self.assertIsInstance(data['TIME'], np.memmap)
+        np.testing.assert_array_equal(data['TIME'], [0, 1, 2])
+        np.testing.assert_array_equal(data['DETECTORS'], [52, 52, 52])
+
+        # Entries of modified products are rebuilt
+        write_light_curve(self.dir_path, 'ni_gold_GTI0', [5, 6, 7, 8])
+        data, _ = columns.load(data_path)
+        np.testing.assert_array_equal(data['COUNTS'], [5, 6, 7, 8])
+        data, _ = columns.load(data_path)
+        self.assertIsInstance(data['COUNTS'], np.memmap)
+        np.testing.assert_array_equal(data['COUNTS'], [5, 6, 7, 8])
+
+    def test_fits_table(self):
+        """
+        Converts the FITS tables of a directory to little-endian columns with their header values
+        """
+        data_path = os.path.join(self.dir_path, 'ni_gold_GTI0.jsgrp')
+        write_spectrum(self.dir_path, 'ni_gold_GTI0', {
+            'EXPOSURE': 250.,
+            'RESPFILE': 'nixtiref20170601_d52.rmf',
+        })
+
+        self.assertEqual(columns.convert_directory(self.dir_path), 2)
+        data, header = columns.load(data_path)
+        self.assertIsInstance(data['CHANNEL'], np.memmap)
+        self.assertEqual(data['COUNTS'].dtype, np.dtype('<i4'))
+        np.testing.assert_array_equal(data['CHANNEL'], np.arange(30, 50))
+        np.testing.assert_array_equal(data['GROUPING'][:4], [1, -1, 1, -1])
+        self.assertEqual((header['EXPOSURE'], header['RESPFILE']),
+                         (250., 'nixtiref20170601_d52.rmf'))
+
+    def test_outside_data_dir(self):
+        """
+        Reads products outside the data directory without storing them
+        """
+        with tempfile.TemporaryDirectory() as dir_path:
+            write_light_curve(dir_path, 'ni_gold_GTI0', [1, 2])
+            self.assertIsNone(columns.entry_path(os.path.join(dir_path, 'ni_gold_GTI0.lc.gz')))
+            data, _ = columns.load(os.path.join(dir_path, 'ni_gold_GTI0.lc.gz'))
+            self.assertNotIsInstance(data['COUNTS'], np.memmap)
+
+
+class SharedCacheTests(SimpleTestCase):
+    """
+    Tests keeping the column store in a bounded shared memory cache
+    """
+    def setUp(self):
+        self._data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self._cache_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._data_dir.cleanup)
+        self.addCleanup(self._cache_dir.cleanup)
+        self.cache_dir = os.path.realpath(self._cache_dir.name)
+        self.dir_path = os.path.join(self._data_dir.name, '1234567890', 'jspipe')
+
+        for gti in range(3):
+            write_light_curve(self.dir_path, f'ni_gold_GTI{gti}', list(range(100)))
+
+        # Fits two light curves of three 100 row columns with their headers and metadata
+        patcher = mock.patch.object(columns, 'directories', return_value=(
+            os.path.realpath(self._data_dir.name),
+            self.cache_dir,
+            6000,
+        ))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, gti: int) -> dict[str, np.ndarray]:
+        """
+        Loads the columns of a light curve
+
+        Parameters
+        ----------
+        gti : int
+            GTI of the light curve
+
+        Returns
+        -------
+        dict[str, ndarray]
+            Columns of the light curve
+        """
+        return columns.load(os.path.join(self.dir_path, f'ni_gold_GTI{gti}.lc.gz'))[0]
+
+    def cached(self) -> list[int]:
+        """
+        Gets the GTIs of the light curves in the cache
+
+        Returns
+        -------
+        list[int]
+            GTIs in the cache
+        """
+        return [gti for gti in range(3) if os.path.isdir(columns.entry_path(
+            os.path.join(self.dir_path, f'ni_gold_GTI{gti}.lc.gz'),
+        ))]
+
+    def test_evict_unmapped(self):
+        """
+        Evicts the least recently used entry that is not mapped once the cache is full
+        """
+        self.load(0)
+        pinned = self.load(0)
+        self.load(1)
+        gc.collect()
+        self.assertEqual(self.cached(), [0, 1])
+
+        # The first light curve is used least recently but still mapped
+        self.load(2)
+        self.assertEqual(self.cached(), [0, 2])
+        self.assertIsInstance(pinned['COUNTS'], np.memmap)
+        np.testing.assert_array_equal(pinned['COUNTS'], np.arange(100))
+
+        del pinned
+        gc.collect()
+        self.load(1)
+        self.assertEqual(self.cached(), [1, 2])
+
+    def test_dead_process(self):
+        """
+        Ignores the references of processes that no longer exist
+        """
+        self.load(0)
+        self.load(1)
+        gc.collect()
+
+        with subprocess.Popen(['true']) as process:
+            process.wait()
+
+        with closing(sqlite3.connect(os.path.join(self.cache_dir, shared_cache.INDEX))) as conn, \
+                conn:
+            conn.executemany('INSERT INTO refs VALUES (?, ?)', [
+                (columns.entry_path(os.path.join(self.dir_path, f'ni_gold_GTI{gti}.lc.gz')),
+                 process.pid)
+                for gti in range(2)
+            ])
+
+        self.load(2)
+        self.assertEqual(self.cached(), [1, 2])
+
+
+def slow_count(path: str) -> int:
+    """
+    Appends a line to a file slowly, to count how many times a shared computation ran
+
+    Parameters
+    ----------
+    path : str
+        Path to the file
+
+    Returns
+    -------
+    int
+        Process ID of the computation
+    """
+    with open(path, mode='a', encoding='utf-8') as file:
+        file.write('ran\n')
+
+    time.sleep(0.5)
+    return os.getpid()
+
+
+def count_flight(path: str, results: multiprocessing.Queue):
+    """
+    Runs slow_count with single flight in a new process, putting the result on a queue
+
+    Parameters
+    ----------
+    path : str
+        Path to the file counting computations
+    results : Queue
+        Queue of results
+    """
+    results.put(single_flight.run('count', lambda: slow_count(path)))
+
+
+def decode(data: dict[str, str]) -> np.ndarray:
+    """
+    Decodes an array in Plotly's typed array format
+
+    Parameters
+    ----------
+    data : dict[str, str]
+        Data type (dtype) and base64 encoded bytes (bdata)
+
+    Returns
+    -------
+    ndarray
+        Decoded array
+    """
+    return np.frombuffer(base64.b64decode(data['bdata']), dtype=f'<{data["dtype"]}')
+
+
+class CumulativeTests(SimpleTestCase):
+    """
+    Tests the prefix sums sent to the browser for rebinning
+    """
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._dir.cleanup)
+        self.dir_path = self._dir.name
+
+    def test_light_curve(self):
+        """
+        Bins the prefix sums like the browser, which should match the light curve binned on the
+        server for any minimum value
+        """
+        counts = [30, 27, 36, 31, 34, 5, 80, 2, 3, 41]
+        write_light_curve(self.dir_path, 'ni_gold_GTI0', counts)
+        data_path = os.path.join(self.dir_path, 'ni_gold_GTI0.lc.gz')
+        payload = light_curve_cumulative(data_path)
+        sums = {name: decode(payload[name]) for name in ('weights', 'counts', 'background', 'x')}
+        self.assertEqual(payload['kind'], 'light_curve')
+        np.testing.assert_array_equal(sums['counts'], np.concatenate(([0], np.cumsum(counts))))
+
+        for min_value in (1, 50, 100, 200):
+            edges = min_bin(min_value, np.array(counts, dtype=float))
+            width = np.diff(sums['weights'][edges])
+            x_bin, y_bin, _, _, _, uncertainty = light_curve_data(min_value, data_path)
+
+            np.testing.assert_allclose(x_bin, np.diff(sums['x'][edges]) / width)
+            np.testing.assert_allclose(y_bin, (
+                np.diff(sums['counts'][edges]) * payload['scales']['y']
+                - np.diff(sums['background'][edges]) * payload['scales']['yBackground']
+            ) / width)
+            np.testing.assert_allclose(uncertainty, np.sqrt(np.maximum(
+                np.diff(sums['counts'][edges]), 1,
+            )) / width * payload['scales']['uncertainty'])
+
+    def test_spectrum(self):
+        """
+        Sums the counts and background of each spectrum group weighted by the group widths
+        """
+        write_spectrum(self.dir_path, 'ni_gold_GTI0', {
+            'EXPOSURE': 250.,
+            'RESPFILE': 'nixtiref20170601_d50.rmf',
+        })
+        data_path = os.path.join(self.dir_path, 'ni_gold_GTI0.jsgrp')
+        payload = spectrum_cumulative(data_path)
+        x_bin, y_bin, bg_bin, x_width = spectrum_grouped(data_path)[:4]
+
+        self.assertEqual(payload['kind'], 'spectrum')
+        np.testing.assert_array_equal(decode(payload['weights']),
+                                      np.concatenate(([0], np.cumsum(x_width))))
+        np.testing.assert_allclose(np.diff(decode(payload['counts'])), y_bin * x_width)
+        np.testing.assert_allclose(np.diff(decode(payload['background'])), bg_bin * x_width)
+        np.testing.assert_allclose(np.diff(decode(payload['x'])) / x_width, x_bin)
+        self.assertEqual(decode(payload['counts'])[-1], 200)
+        self.assertAlmostEqual(payload['scales']['y'], 1 / (250 * 50 * 0.01))
+
+
+class CatalogTests(SimpleTestCase):
+    """
+    Tests the extraction of catalog values from product headers
+    """
+    def test_object_key(self):
+        """
+        Normalises object names to upper case letters, digits and signs
+        """
+        self.assertEqual(object_key('Crab Nebula'), 'CRABNEBULA')
+        self.assertEqual(object_key('PSR J0437-4715'), 'PSRJ0437-4715')
+        self.assertEqual(object_key('4U 1820+30'), '4U1820+30')
+
+    def test_unit_vector(self):
+        """
+        Converts sky positions to unit vectors
+        """
+        np.testing.assert_allclose(unit_vector(0, 0), (1, 0, 0), atol=1e-12)
+        np.testing.assert_allclose(unit_vector(90, 0), (0, 1, 0), atol=1e-12)
+        np.testing.assert_allclose(unit_vector(123, 90), (0, 0, 1), atol=1e-12)
+        self.assertAlmostEqual(float(np.linalg.norm(unit_vector(83.6, 22.0))), 1)
+
+    def test_observation_header(self):
+        """
+        Reads the catalog values and detector count from a spectrum, or nothing without products
+        """
+        with tempfile.TemporaryDirectory() as data_dir:
+            self.assertIsNone(observation_header(data_dir, '1234567890'))
+            write_spectrum(os.path.join(data_dir, '1234567890', 'jspipe'), 'ni_gold_GTI0', {
+                'OBJECT': 'Crab',
+                'RA_OBJ': 83.63,
+                'DEC_OBJ': 22.01,
+                'DATE-OBS': '2020-01-01T00:00:00',
+                'EXPOSURE': 250.,
+                'RESPFILE': 'nixtiref20170601_d52.rmf',
+            })
+            self.assertEqual(observation_header(data_dir, '1234567890'), {
+                'OBJECT': 'Crab',
+                'RA_OBJ': 83.63,
+                'DEC_OBJ': 22.01,
+                'DATE-OBS': '2020-01-01T00:00:00',
+                'EXPOSURE': 250.,
+                'RESPFILE': 'nixtiref20170601_d52.rmf',
+                'DETECTORS': 52,
+            })
+
+
+class ObservationSearchTests(TransactionTestCase):
+    """
+    Tests searching the observation catalog by object name and cone
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        for obs_id, name, ra, dec in (
+                ('1000000001', 'Crab', 83.63, 22.01),
+                ('1000000002', 'Crab Pulsar', 83.64, 22.02),
+                ('1000000003', 'Cas A', 350.85, 58.82),
+                ('1000000004', 'Crab', 84.63, 22.01),
+        ):
+            Observation.objects.create(
+                obs_id=obs_id,
+                object=name,
+                object_key=object_key(name),
+                ra=ra,
+                dec=dec,
+                **dict(zip('xyz', unit_vector(ra, dec))),
+            )
+
+    def search(self, **query) -> list[dict]:
+        """
+        Searches the observation catalog
+
+        Parameters
+        ----------
+        **query
+            Query variables
+
+        Returns
+        -------
+        list[dict]
+            Matching observations
+        """
+        response = self.client.get(reverse('plots:observation_search'), query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['observations']
+
+    def test_object_prefix(self):
+        """
+        Finds objects whose normalised name starts with the query, sorted by name
+        """
+        self.assertEqual([observation['obs_id'] for observation in self.search(object='crab')],
+                         ['1000000001', '1000000004', '1000000002'])
+        self.assertEqual([observation['obs_id'] for observation in self.search(object='cas a')],
+                         ['1000000003'])
+        self.assertEqual(self.search(object='Vela'), [])
+
+    def test_cone(self):
+        """
+        Finds observations within the radius, sorted by separation, and narrows them by name
+        """
+        observations = self.search(ra=83.63, dec=22.01, radius=0.5)
+        self.assertEqual([observation['obs_id'] for observation in observations],
+                         ['1000000001', '1000000002'])
+        self.assertAlmostEqual(observations[0]['separation'], 0, places=4)
+        self.assertLess(observations[1]['separation'], 0.02)
+        self.assertEqual(len(self.search(ra=83.63, dec=22.01, radius=1.5)), 3)
+        self.assertEqual([observation['obs_id'] for observation in
+                          self.search(object='Crab P', ra=83.63, dec=22.01, radius=1.5)],
+                         ['1000000002'])
+
+    def test_count(self):
+        """
+        Limits the number of results
+        """
+        self.assertEqual(len(self.search(object='crab', count=2)), 2)
+
+    def test_invalid(self):
+        """
+        Rejects queries without a name or position, or with invalid values
+        """
+        for query in ({}, {'ra': 83.63}, {'ra': 'x', 'dec': 0}, {'object': 'crab', 'count': 'x'},
+                      {'ra': 0, 'dec': 0, 'radius': 0}, {'ra': 0, 'dec': 0, 'radius': 91}):
+            response = self.client.get(reverse('plots:observation_search'), query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn('error', response.json())
+
+
+class CatalogUpdateTests(TransactionTestCase):
+    """
+    Tests filling the observation catalog while indexing a data directory
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        self._data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data_dir = self._data_dir.name
+        self.addCleanup(self._data_dir.cleanup)
+        Directory.clear_cache()
+
+    def ingest(self):
+        """
+        Updates the file index and observation catalog from the data directory
+        """
+        with redirect_stdout(io.StringIO()):
+            db_update.update(connection.settings_dict['NAME'], self.data_dir, workers=2)
+
+    def test_catalog_update(self):
+        """
+        Fills the catalog from the products of each observation while indexing, and removes
+        observations that no longer exist
+        """
+        dir_path = os.path.join(self.data_dir, '1234567890', 'jspipe')
+        write_spectrum(dir_path, 'ni1234567890_0mpu7_gold_GTI0', {
+            'OBJECT': 'PSR J0437-4715',
+            'RA_OBJ': 69.32,
+            'DEC_OBJ': -47.25,
+            'DATE-OBS': '2020-01-01T00:00:00',
+            'EXPOSURE': 250.,
+            'RESPFILE': 'nixtiref20170601_d50.rmf',
+        })
+        os.makedirs(os.path.join(self.data_dir, '2345678901', 'jspipe'))
+        self.ingest()
+
+        observation = Observation.objects.get(obs_id='1234567890')
+        self.assertEqual(observation.object_key, 'PSRJ0437-4715')
+        self.assertEqual((observation.ra, observation.dec), (69.32, -47.25))
+        np.testing.assert_allclose(
+            (observation.x, observation.y, observation.z),
+            unit_vector(69.32, -47.25),
+        )
+        self.assertEqual((observation.exposure, observation.detectors), (250., 50))
+        # Observations without readable products are still listed
+        self.assertEqual(Observation.objects.get(obs_id='2345678901').object, '')
+
+        os.rename(dir_path, os.path.join(self.data_dir, '3456789012'))
+        self.ingest()
+        self.assertFalse(Observation.objects.filter(obs_id='1234567890').exists())
+
+
+class ObservationTestCase(TransactionTestCase):
+    """
+    Indexes an observation with gold light curves and spectra of three GTIs and silver light
+    curves of one GTI in a temporary data directory before each test
+    """
+    databases = '__all__'
+    obs_id = '1234567890'
+    header = {
+        'OBJECT': 'Crab',
+        'RA_OBJ': 83.63,
+        'DEC_OBJ': 22.01,
+        'DATE-OBS': '2020-01-01T00:00:00',
+        'EXPOSURE': 250.,
+        'RESPFILE': 'nixtiref20170601_d52.rmf',
+    }
+
+    def setUp(self):
+        self._data_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.data_dir = self._data_dir.name
+        self.addCleanup(self._data_dir.cleanup)
+        self.dir_path = os.path.join(self.data_dir, self.obs_id, 'jspipe')
+
+        for gti in range(3):
+            write_light_curve(
+                self.dir_path,
+                f'ni{self.obs_id}_0mpu7_gold_GTI{gti}',
+                [30 + gti, 27, 36, 31, 34, 29, 33, 28, 35, 30],
+            )
+            write_spectrum(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI{gti}', self.header)
+
+        write_light_curve(self.dir_path, f'ni{self.obs_id}_0mpu7_silver_GTI0', [40] * 10)
+
+        data_dir = override_settings(DATA_DIR=self.data_dir)
+        data_dir.enable()
+        self.addCleanup(data_dir.disable)
+        # Manifests are rebuilt for the data of each test
+        patcher = mock.patch('nicer_website.apps.plots.manifest.VERSION_INTERVAL', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Directory.clear_cache()
+        self.ingest()
+
+    def ingest(self):
+        """
+        Updates the file index and observation catalog from the data directory
+        """
+        with redirect_stdout(io.StringIO()):
+            db_update.update(connection.settings_dict['NAME'], self.data_dir, workers=2)
+
+    def query(self, **query: str | int) -> dict[str, str | int]:
+        """
+        Gets a plot_gti query of the observation's gold light curves
+
+        Parameters
+        ----------
+        **query : str | int
+            Variables replacing the defaults
+
+        Returns
+        -------
+        dict[str, str | int]
+            Query variables
+        """
+        return {
+            'gti-search': '0-2',
+            'min_value': 50,
+            'obs_id': self.obs_id,
+            'plot_type': 'light_curve',
+            'quality': 'gold',
+        } | query
+
+
+class PlotCacheTests(ObservationTestCase):
+    """
+    Tests the validators and canonical URLs of the GET plot views
+    """
+    def test_canonical_redirect(self):
+        """
+        Redirects equivalent queries to one URL with the parameters in canonical order, without
+        unknown or empty parameters
+        """
+        response = self.client.get(
+            reverse('plots:plot_gti'),
+            self.query(quality='gold ', unknown=1, webgl='') | {'gti-search': '0 - 2'},
+        )
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response['Location'], reverse('plots:plot_gti') + '?' + urlencode(
+            sorted(self.query().items()),
+        ))
+        self.assertEqual(self.client.get(response['Location']).status_code, 200)
+
+    def test_not_modified(self):
+        """
+        Answers requests with a matching ETag or modification time without reading any product
+        """
+        url = reverse('plots:plot_gti') + '?' + urlencode(sorted(self.query().items()))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('"'))
+
+        with mock.patch.object(columns, 'load', side_effect=AssertionError('Product read')):
+            self.assertEqual(self.client.get(
+                url,
+                HTTP_IF_NONE_MATCH=response['ETag'],
+            ).status_code, 304)
+            self.assertEqual(self.client.get(
+                url,
+                HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+            ).status_code, 304)
+
+        # Other queries and qualities have other ETags
+        for query in (self.query(min_value=60), self.query(quality='silver')):
+            self.assertNotEqual(self.client.get(
+                reverse('plots:plot_gti') + '?' + urlencode(sorted(query.items())),
+            )['ETag'], response['ETag'])
+
+    def test_modified(self):
+        """
+        Changes the ETag when a product of the quality changes
+        """
+        url = reverse('plots:plot_gti') + '?' + urlencode(sorted(self.query().items()))
+        etag = self.client.get(url)['ETag']
+        data_path = os.path.join(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI1.lc.gz')
+        os.utime(data_path, ns=(0, os.stat(data_path).st_mtime_ns + 10 ** 9))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post(self):
+        """
+        Plots POST requests without validators
+        """
+        response = self.client.post(reverse('plots:plot_gti'), self.query())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['plotDivs']), 1)
+        self.assertNotIn('ETag', response)
+
+
+class PlotPayloadTests(ObservationTestCase):
+    """
+    Tests the JSON figures with typed arrays and the HTML plots
+    """
+    def test_data_plot(self):
+        """
+        Encodes x values as float64 and y values, errors and background as float32
+        """
+        x_data = np.array([0.5, 1.5, 2.5]) + 1e8
+        figure = data_plot(
+            [3],
+            [x_data],
+            [np.array([1., 2., 3.])],
+            x_errors=[np.full(3, 0.5)],
+            y_uncertainties=[np.array([0.1, 0.2, 0.3])],
+            background_list=[np.array([0.5, 0.5, 0.5])],
+            output='json',
+        )
+        trace, background = figure['data']
+
+        self.assertEqual((trace['name'], background['name']), ('GTI3', 'GTI3 BG'))
+        self.assertEqual((trace['x']['dtype'], trace['y']['dtype']), ('f8', 'f4'))
+        np.testing.assert_array_equal(decode(trace['x']), x_data)
+        np.testing.assert_array_equal(decode(trace['y']), [1, 2, 3])
+        np.testing.assert_array_equal(decode(trace['error_x']['array']), [0.5, 0.5, 0.5])
+        np.testing.assert_allclose(decode(trace['error_y']['array']), [0.1, 0.2, 0.3], rtol=1e-7)
+        np.testing.assert_array_equal(decode(background['y']), [0.5, 0.5, 0.5])
+        self.assertEqual(figure['config'], {'displaylogo': False})
+
+    def test_json(self):
+        """
+        Returns the figure of the selected GTIs with the plot type, matching the binned data
+        """
+        response = self.client.post(reverse('plots:plot_gti'), self.query(format='json'))
+        plot = response.json()['plots'][0]
+        x_bin, y_bin = light_curve_data(50, os.path.join(
+            self.dir_path,
+            f'ni{self.obs_id}_0mpu7_gold_GTI1.lc.gz',
+        ))[:2]
+
+        self.assertEqual(plot['type'], 'light_curve')
+        self.assertEqual([trace['name'] for trace in plot['figure']['data']],
+                         ['GTI0', 'GTI0 BG', 'GTI1', 'GTI1 BG', 'GTI2', 'GTI2 BG'])
+        np.testing.assert_array_equal(decode(plot['figure']['data'][2]['x']), x_bin)
+        np.testing.assert_allclose(decode(plot['figure']['data'][2]['y']), y_bin, rtol=1e-3)
+
+    def test_html(self):
+        """
+        Returns the plot as an HTML div by default
+        """
+        response = self.client.post(reverse('plots:plot_gti'), self.query())
+        div = response.json()['plotDivs'][0]
+        self.assertTrue(div.startswith('<div'))
+        self.assertIn('GTI2 BG', div)
+
+
+class WebGLTests(ObservationTestCase):
+    """
+    Tests choosing between SVG and WebGL traces
+    """
+    def test_threshold(self):
+        """
+        Uses WebGL above the total number of points across GTIs unless a trace type is requested
+        """
+        x_data = [np.arange(60.), np.arange(50.)]
+        y_data = [np.ones(60), np.ones(50)]
+
+        for webgl, webgl_points, trace_type in (
+                (None, 110, 'scatter'),
+                (None, 109, 'scattergl'),
+                (False, 10, 'scatter'),
+                (True, 1000, 'scattergl'),
+        ):
+            figure = data_plot(
+                [0, 1],
+                x_data,
+                y_data,
+                background_list=y_data,
+                output='json',
+                webgl=webgl,
+                webgl_points=webgl_points,
+            )
+            self.assertEqual({trace['type'] for trace in figure['data']}, {trace_type})
+            self.assertEqual([trace['legendgroup'] for trace in figure['data']],
+                             ['0', '0', '1', '1'])
+
+    def test_query(self):
+        """
+        Uses the trace type requested by the webgl variable
+        """
+        for webgl, trace_type in (('true', 'scattergl'), ('0', 'scatter'), ('', 'scatter')):
+            response = self.client.post(
+                reverse('plots:plot_gti'),
+                self.query(format='json', webgl=webgl),
+            )
+            self.assertEqual(
+                {trace['type'] for trace in response.json()['plots'][0]['figure']['data']},
+                {trace_type},
+            )
+
+
+class QuantizeTests(ObservationTestCase):
+    """
+    Tests rounding JSON plots to significant digits
+    """
+    def test_quantize(self):
+        """
+        Keeps the significant digits and data type, and leaves non-finite values unchanged
+        """
+        for dtype in (np.float32, np.float64):
+            data = np.array([1 / 3, 123456.789, -2.5e-7, np.inf, np.nan], dtype=dtype)
+            quantized = quantize(data, 4)
+            self.assertEqual(quantized.dtype, dtype)
+            np.testing.assert_allclose(quantized[:3], data[:3], rtol=1e-4)
+            self.assertFalse(np.array_equal(quantized[:3], data[:3]))
+            self.assertEqual(quantized[3], np.inf)
+            self.assertTrue(np.isnan(quantized[4]))
+
+        self.assertIs(quantize(data, 20), data)
+
+    def test_significant_digits(self):
+        """
+        Quantizes the y values of JSON plots unless disabled, keeping x values exact
+        """
+        plots = {}
+
+        for digits in (0, 2):
+            with override_settings(PLOT_SIGNIFICANT_DIGITS=digits):
+                plots[digits] = self.client.post(
+                    reverse('plots:plot_gti'),
+                    self.query(format='json', min_value=1),
+                ).json()['plots'][0]['figure']['data'][0]
+
+        np.testing.assert_array_equal(decode(plots[2]['x']), decode(plots[0]['x']))
+        np.testing.assert_allclose(decode(plots[2]['y']), decode(plots[0]['y']), rtol=1e-2)
+        self.assertFalse(np.array_equal(decode(plots[2]['y']), decode(plots[0]['y'])))
+
+
+class DisplayedTests(ObservationTestCase):
+    """
+    Tests returning only the traces of GTIs that are not already displayed
+    """
+    def plot(self, gtis: str, displayed: str) -> dict:
+        """
+        Plots the gold light curves of the selected GTIs in the json format
+
+        Parameters
+        ----------
+        gtis : str
+            GTI query
+        displayed : str
+            Comma separated GTIs already displayed
+
+        Returns
+        -------
+        dict
+            Json response
+        """
+        response = self.client.post(reverse('plots:plot_gti'), self.query(**{
+            'format': 'json',
+            'gti-search': gtis,
+            'displayed': displayed,
+            'cumulative': 1,
+        }))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_added(self):
+        """
+        Returns the traces and prefix sums of the GTIs added to the selection
+        """
+        response = self.plot('0-2', '0')
+        self.assertEqual([trace['name'] for trace in response['plots'][0]['figure']['data']],
+                         ['GTI1', 'GTI1 BG', 'GTI2', 'GTI2 BG'])
+        self.assertEqual([data['gti'] for data in response['cumulative']], [1, 2])
+        self.assertEqual(response['removed'], [])
+
+    def test_removed(self):
+        """
+        Returns the displayed GTIs that are no longer selected, and no traces if nothing is added
+        """
+        response = self.plot('1', '0,1,2')
+        self.assertEqual(response['plots'][0]['figure']['data'], [])
+        self.assertEqual(response['cumulative'], [])
+        self.assertEqual(response['removed'], [0, 2])
+
+    def test_without_displayed(self):
+        """
+        Returns every selected GTI without the removed GTIs if none are displayed
+        """
+        response = self.client.post(reverse('plots:plot_gti'), self.query(format='json')).json()
+        self.assertEqual(len(response['plots'][0]['figure']['data']), 6)
+        self.assertNotIn('removed', response)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """
+    Tests sharing one computation between concurrent identical calls
+    """
+    def setUp(self):
+        self._lock_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._lock_dir.cleanup)
+        self.lock_dir = self._lock_dir.name
+        patcher = mock.patch.object(single_flight, 'LOCK_DIR', self.lock_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_threads(self):
+        """
+        Runs the computation once for calls from threads that overlap
+        """
+        started = Event()
+        release = Event()
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return len(calls)
+
+        threads = [Thread(target=lambda: results.append(single_flight.run('key', compute)))
+                   for _ in range(4)]
+        threads[0].start()
+        started.wait(5)
+
+        for thread in threads[1:]:
+            thread.start()
+
+        time.sleep(0.1)
+        release.set()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [1, 1, 1, 1])
+        self.assertEqual(single_flight.run('key', compute), 2)
+
+    def test_processes(self):
+        """
+        Runs the computation once for calls from processes that overlap, sharing its result
+        """
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        count_path = os.path.join(self.lock_dir, 'count.txt')
+        processes = [context.Process(target=count_flight, args=(count_path, results))
+                     for _ in range(3)]
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join(10)
+
+        with open(count_path, mode='r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), 'ran\n')
+
+        self.assertEqual(len({results.get(timeout=1) for _ in processes}), 1)
+        # Only the shared result is left until it expires
+        self.assertEqual([name for name in os.listdir(self.lock_dir) if name != 'count.txt'], [
+            f'{hashlib.sha256(b"count").hexdigest()}.pickle',
+        ])
+
+    def test_uncontended(self):
+        """
+        Removes the lock file and writes no result when no other process is waiting
+        """
+        self.assertEqual(single_flight.run('key', lambda: 1), 1)
+        self.assertEqual(os.listdir(self.lock_dir), [])
+
+    def test_nested(self):
+        """
+        Runs calls made during a locked computation without locking
+        """
+        key = hashlib.sha256(b'inner').hexdigest()
+
+        def inner():
+            return os.path.exists(os.path.join(self.lock_dir, f'{key}.lock'))
+
+        self.assertFalse(single_flight.run('outer', lambda: single_flight.run('inner', inner)))
+        self.assertTrue(single_flight.run('inner', inner))
+
+    def test_not_private(self):
+        """
+        Neither locks nor reads results in a lock directory that other users can write to or own
+        """
+        for mode, owner in ((0o777, os.getuid()), (0o700, os.getuid() + 1)):
+            with self.subTest(mode=oct(mode), owner=owner):
+                os.chmod(self.lock_dir, mode)
+                os.chown(self.lock_dir, owner, -1)
+
+                with mock.patch.object(single_flight, 'acquire') as acquire:
+                    self.assertEqual(single_flight.run('key', lambda: 1), 1)
+
+                acquire.assert_not_called()
+
+    def test_base_exception(self):
+        """
+        Raises an exception that does not inherit from Exception in the callers waiting for it
+        """
+        started = Event()
+        release = Event()
+        errors = []
+
+        def interrupted():
+            started.set()
+            release.wait(5)
+            raise KeyboardInterrupt
+
+        def call():
+            try:
+                single_flight.run('key', interrupted)
+            except KeyboardInterrupt as error:
+                errors.append(error)
+
+        threads = [Thread(target=call) for _ in range(3)]
+        threads[0].start()
+        started.wait(5)
+
+        for thread in threads[1:]:
+            thread.start()
+
+        time.sleep(0.1)
+        release.set()
+
+        for thread in threads:
+            thread.join(5)
+
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(len(errors), 3)
+
+    @mock.patch.object(single_flight, 'LOCK_TIMEOUT', 0.2)
+    def test_timeout(self):
+        """
+        Runs the computation after waiting LOCK_TIMEOUT for a lock held by another process
+        """
+        key = hashlib.sha256(b'key').hexdigest()
+
+        with open(os.path.join(self.lock_dir, f'{key}.lock'), mode='a+b') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            start = time.monotonic()
+            self.assertEqual(single_flight.run('key', lambda: 1), 1)
+            self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+
+class PlotValidationTests(ObservationTestCase):
+    """
+    Tests rejecting invalid plot queries
+    """
+    def test_invalid(self):
+        """
+        Answers invalid minimum values and plot types with 400 and the error
+        """
+        for query in (self.query(min_value='x'), self.query(plot_type='image')):
+            for response in (
+                    self.client.post(reverse('plots:plot_gti'), query),
+                    self.client.get(reverse('plots:plot_gti'), query, follow=True),
+            ):
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+                self.assertNotIn('ETag', response)
+
+        query = self.query()
+        del query['min_value']
+        self.assertEqual(self.client.post(reverse('plots:plot_gti'), query).status_code, 400)
+
+
+class LazyImportTests(SimpleTestCase):
+    """
+    Tests that the plot processing libraries are only imported when first used
+    """
+    def test_startup(self):
+        """
+        Resolves every URL in a new web process without importing pandas, astropy or Plotly
+        """
+        result = subprocess.run(
+            [sys.executable, '-c', (
+                'import sys, django; django.setup(); '
+                'from django.urls import resolve; resolve("/"); resolve("/plots/plot_gti"); '
+                'print(sorted({name.split(".")[0] for name in sys.modules} '
+                '& {"pandas", "astropy", "plotly"}))'
+            )],
+            env=os.environ | {'DJANGO_SETTINGS_MODULE': 'nicer_website.settings'},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_warm_up(self):
+        """
+        Imports the processing function of every plot by its import path
+        """
+        products.warm_up()
+
+        for plot in products.PLOTS.values():
+            for key in ('function', 'cumulative', 'export'):
+                if plot[key]:
+                    module, name = plot[key].rsplit('.', 1)
+                    self.assertTrue(callable(getattr(sys.modules[module], name)))
+
+
+class ManifestTests(ObservationTestCase):
+    """
+    Tests the cached manifests of the observations' products
+    """
+    def test_products(self):
+        """
+        Groups the products of a quality and file type by GTI, without band light curves
+        """
+        with open(os.path.join(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI0_BAND2.lc.gz'),
+                  mode='w', encoding='utf-8'):
+            pass
+
+        self.ingest()
+        manifest = get_manifest(self.obs_id)
+
+        self.assertEqual(manifest.dir_path, f'{self.obs_id}/jspipe/')
+        self.assertEqual(manifest.products('gold', '.lc.gz'), {
+            gti: f'ni{self.obs_id}_0mpu7_gold_GTI{gti}.lc.gz' for gti in range(3)
+        })
+        self.assertEqual(list(manifest.products('silver', '.jsgrp')), [])
+        self.assertEqual(len(manifest.files('silver')), 2)
+        self.assertEqual(get_manifest('2345678901').names, [])
+
+    def test_cache(self):
+        """
+        Reuses manifests until the ingest version changes
+        """
+        manifest = get_manifest(self.obs_id)
+        self.assertIs(get_manifest(self.obs_id), manifest)
+
+        os.remove(os.path.join(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI2.lc.gz'))
+        self.ingest()
+        self.assertIsNot(get_manifest(self.obs_id), manifest)
+        self.assertEqual(list(get_manifest(self.obs_id).products('gold', '.lc.gz')), [0, 1])
+
+
+class PrefetchTests(ObservationTestCase):
+    """
+    Tests prefetching the plots of an observation for each client
+    """
+    def setUp(self):
+        super().setUp()
+        self.prefetcher = Prefetcher(2, 60)
+
+        for module in (views, caching):
+            patcher = mock.patch.object(module, 'prefetcher', self.prefetcher)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.query = {'light-curve': '.lc.gz', 'obs_id': self.obs_id, 'quality': 'gold'}
+
+    def prefetch(self, client: str, **query: str) -> bool:
+        """
+        Prefetches the plots of a query for a client behind the reverse proxy
+
+        Parameters
+        ----------
+        client : str
+            Client address set by the proxy
+        **query : str
+            Variables replacing the default query
+
+        Returns
+        -------
+        bool
+            If the plots are being prefetched
+        """
+        with override_settings(PLOT_CLIENT_HEADER='HTTP_X_REAL_IP'):
+            response = self.client.get(
+                reverse('plots:prefetch_plots'),
+                self.query | query,
+                REMOTE_ADDR='10.0.0.1',
+                HTTP_X_REAL_IP=client,
+            )
+
+        self.assertEqual(response.status_code, 200)
+        return response.json()['prefetching']
+
+    def test_prefetch(self):
+        """
+        Serves the prefetched plots to the request they anticipate, keeping the prefetches of
+        clients behind the same proxy apart
+        """
+        release = Event()
+        render_view = views.render_view
+
+        def held_render(*args):
+            release.wait(5)
+            return render_view(*args)
+
+        # Both prefetches are still running when the second client prefetches
+        with mock.patch.object(views, 'render_view', held_render):
+            self.assertTrue(self.prefetch('192.0.2.7'))
+            self.assertTrue(self.prefetch('192.0.2.8', quality='silver'))
+            release.set()
+
+            while self.prefetcher._pending:  # pylint: disable=protected-access
+                time.sleep(0.01)
+
+        with mock.patch.object(caching, 'render_view', side_effect=AssertionError('Rendered')):
+            for quality in ('gold', 'silver'):
+                response = self.client.get(
+                    reverse('plots:plot_data'),
+                    self.query | {'quality': quality},
+                    follow=True,
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['quality'], quality)
+                self.assertEqual(len(response.json()['plotDivs']), 1)
+
+    def test_no_products(self):
+        """
+        Does not prefetch observations without products
+        """
+        self.assertFalse(self.prefetch('192.0.2.7', obs_id='2345678901'))
+
+
+class ThumbnailTests(ObservationTestCase):
+    """
+    Tests rendering observation thumbnails and serving them from the content-addressed cache
+    """
+    def setUp(self):
+        super().setUp()
+        self._thumbnail_dir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._thumbnail_dir.cleanup)
+        # Renders in a thread of the test process, where the cache directory is patched
+        self.thumbnailer = Thumbnailer(1, 1)
+        self.thumbnailer._executor = ThreadPoolExecutor(1)  # pylint: disable=protected-access
+        self.addCleanup(self.thumbnailer._executor.shutdown)  # pylint: disable=protected-access
+
+        for patcher in (
+            mock.patch.object(thumbnails, 'config', return_value=(self._thumbnail_dir.name, False)),
+            mock.patch.object(views, 'thumbnailer', self.thumbnailer),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, **headers: str):
+        """
+        Requests the thumbnail of the observation
+
+        Parameters
+        ----------
+        **headers : str
+            Request headers
+
+        Returns
+        -------
+        HttpResponse
+            Thumbnail response
+        """
+        return self.client.get(reverse('plots:thumbnail', args=[self.obs_id]), **headers)
+
+    def test_default_products(self):
+        """
+        Shows the first product of each type of the quality, without energy bands
+        """
+        self.assertEqual(
+            default_products([
+                f'ni{self.obs_id}_0mpu7_gold_GTI1.lc.gz',
+                f'ni{self.obs_id}_0mpu7_gold_BAND1_GTI0.lc.gz',
+                f'ni{self.obs_id}_0mpu7_gold_GTI0.lc.gz',
+                f'ni{self.obs_id}_0mpu7_silver_GTI0.jsgrp',
+                f'ni{self.obs_id}_0mpu7_gold_GTI2.jsgrp',
+            ]),
+            {
+                '.lc.gz': f'ni{self.obs_id}_0mpu7_gold_GTI0.lc.gz',
+                '.jsgrp': f'ni{self.obs_id}_0mpu7_gold_GTI2.jsgrp',
+            },
+        )
+
+    def test_cache(self):
+        """
+        Renders a thumbnail once, then serves it from the cache and answers conditional requests
+        """
+        response = self.get()
+        content = b''.join(response.streaming_content)
+        etag = response.headers['ETag']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'image/png')
+        self.assertTrue(content.startswith(b'\x89PNG'))
+
+        with mock.patch('nicer_website.thumbnails.render', side_effect=AssertionError('Rendered')):
+            response = self.get()
+            self.assertEqual(b''.join(response.streaming_content), content)
+            self.assertEqual(response.headers['ETag'], etag)
+            self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_invalidated(self):
+        """
+        Renders the thumbnail again when one of its products changes
+        """
+        etag = self.get().headers['ETag']
+        name = f'ni{self.obs_id}_0mpu7_gold_GTI0.bg-lc.gz'
+        status = os.stat(os.path.join(self.dir_path, name))
+        os.utime(
+            os.path.join(self.dir_path, name),
+            ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9),
+        )
+
+        with mock.patch('nicer_website.thumbnails.render', wraps=thumbnails.render) as render:
+            response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        render.assert_called_once()
+
+    def test_refused(self):
+        """
+        Answers 503 with Retry-After when the render queue is full, and 404 without products
+        """
+        self.thumbnailer.queue_size = 0
+        response = self.get()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+        self.assertFalse(os.listdir(self._thumbnail_dir.name))
+        self.assertEqual(
+            self.client.get(reverse('plots:thumbnail', args=['2345678901'])).status_code,
+            404,
+        )
+
+
+class RenderPlotsTests(ObservationTestCase):
+    """
+    Tests rendering the default plots to static files with the render_plots command
+    """
+    def setUp(self):
+        super().setUp()
+        self._output = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(self._output.cleanup)
+        self.output = self._output.name
+
+    def render(self, **options: Any) -> str:
+        """
+        Renders the gold and silver JSON plots of the observation
+
+        Parameters
+        ----------
+        **options : Any
+            Options replacing the defaults
+
+        Returns
+        -------
+        str
+            Output of the command
+        """
+        stdout: io.StringIO = io.StringIO()
+        call_command(
+            'render_plots',
+            self.output,
+            **{'format': 'json', 'quality': ['gold', 'silver'], 'workers': 1} | options,
+            stdout=stdout,
+            stderr=io.StringIO(),
+        )
+        return stdout.getvalue()
+
+    def test_render(self):
+        """
+        Writes the plot of the first GTI of each product type and quality as returned by the views
+        """
+        self.assertIn('3 plots to render, 0 up to date', self.render())
+
+        for quality, plot_type in (
+                ('gold', 'light_curve'),
+                ('gold', 'spectrum'),
+                ('silver', 'light_curve')):
+            with open(
+                    os.path.join(self.output, self.obs_id, quality, f'{plot_type}.json'),
+                    encoding='utf-8') as file:
+                self.assertEqual(json.load(file)['type'], plot_type)
+
+    def test_resume(self):
+        """
+        Renders only the plots missing after an interrupted run or older than their product, and
+        every plot when forced
+        """
+        self.render()
+        os.remove(os.path.join(self.output, self.obs_id, 'silver', 'light_curve.json'))
+        path = os.path.join(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI0.jsgrp')
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        # Renders in threads of the test process to record the rendered products
+        with mock.patch.object(render_plots, 'ProcessPoolExecutor', ThreadPoolExecutor), \
+                mock.patch.object(
+                    render_plots,
+                    'render_product',
+                    wraps=render_plots.render_product) as render_product:
+            self.assertIn('2 plots to render, 1 up to date', self.render())
+
+        self.assertEqual(
+            sorted(os.path.relpath(task[0][1], self.dir_path)
+                   for task, _ in render_product.call_args_list),
+            [f'ni{self.obs_id}_0mpu7_gold_GTI0.jsgrp', f'ni{self.obs_id}_0mpu7_silver_GTI0.lc.gz'],
+        )
+        self.assertIn('3 plots to render, 0 up to date', self.render(force=True))
+
+
+class ExportTests(ObservationTestCase):
+    """
+    Tests exporting the binned data of the selected GTIs as CSV, NPZ and FITS files
+    """
+    def export(self, **query: str | int):
+        """
+        Exports the observation's gold light curves, following the redirect to the canonical query
+
+        Parameters
+        ----------
+        **query : str | int
+            Variables replacing the defaults
+
+        Returns
+        -------
+        HttpResponse
+            Export response
+        """
+        return self.client.get(reverse('plots:export_gti'), self.query(**query), follow=True)
+
+    def expected(self, gti: int) -> dict[str, np.ndarray]:
+        """
+        Gets the exported columns of a GTI
+
+        Parameters
+        ----------
+        gti : int
+            GTI number
+
+        Returns
+        -------
+        dict[str, np.ndarray]
+            Columns of the GTI
+        """
+        return light_curve_export(
+            50,
+            os.path.join(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI{gti}.lc.gz'),
+        )
+
+    def test_csv(self):
+        """
+        Writes the rows of each GTI after the header
+        """
+        response = self.export(export='csv')
+        rows = np.loadtxt(
+            io.BytesIO(b''.join(response.streaming_content)),
+            delimiter=',',
+            skiprows=1,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/csv')
+        self.assertIn(
+            f'{self.obs_id}_gold_light_curve.csv',
+            response.headers['Content-Disposition'],
+        )
+
+        for gti in range(3):
+            np.testing.assert_allclose(
+                rows[rows[:, 0] == gti, 1:],
+                np.column_stack(tuple(self.expected(gti).values())),
+                rtol=1e-8,
+            )
+
+    def test_npz(self):
+        """
+        Writes an array for each column of each GTI
+        """
+        response = self.export(export='npz')
+
+        with np.load(io.BytesIO(b''.join(response.streaming_content))) as arrays:
+            self.assertEqual(len(arrays.files), 15)
+
+            for gti in range(3):
+                for name, column in self.expected(gti).items():
+                    np.testing.assert_array_equal(arrays[f'GTI{gti}_{name}'], column)
+
+    def test_fits(self):
+        """
+        Writes a binary table for each GTI
+        """
+        response = self.export(export='fits')
+
+        with fits.open(io.BytesIO(b''.join(response.streaming_content))) as hdus:
+            self.assertEqual([hdu.name for hdu in hdus[1:]], ['GTI0', 'GTI1', 'GTI2'])
+
+            for gti in range(3):
+                self.assertEqual(hdus[gti + 1].header['GTI'], gti)
+
+                for name, column in self.expected(gti).items():
+                    np.testing.assert_array_equal(hdus[gti + 1].data[name.upper()], column)
+
+    def test_canonical(self):
+        """
+        Redirects equivalent queries to one canonical query with one ETag, and answers conditional
+        requests without exporting
+        """
+        response = self.client.get(
+            reverse('plots:export_gti'),
+            {'webgl': 'true', 'format': 'json', 'export': 'csv'} | self.query(),
+        )
+        canonical = self.export(export='csv')
+
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response.headers['Location'], canonical.redirect_chain[-1][0])
+        self.assertEqual(
+            self.export(**{'export': 'csv', 'gti-search': ' 0-2 '}).headers['ETag'],
+            canonical.headers['ETag'],
+        )
+        self.assertNotEqual(self.export(export='npz').headers['ETag'], canonical.headers['ETag'])
+
+        with mock.patch.object(views, 'export_columns', side_effect=AssertionError('Exported')):
+            self.assertEqual(
+                self.client.get(
+                    response.headers['Location'],
+                    HTTP_IF_NONE_MATCH=canonical.headers['ETag'],
+                ).status_code,
+                304,
+            )
+
+    def test_invalid(self):
+        """
+        Answers 400 for an unknown file format, an invalid minimum value or plot type
+        """
+        for query in (
+                {'export': 'xls'},
+                {'min_value': 'many'},
+                {'min_value': ''},
+                {'plot_type': 'histogram'}):
+            with self.subTest(**query):
+                response = self.export(**query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_empty(self):
+        """
+        Writes the CSV header when no GTI can be exported
+        """
+        for gti in range(3):
+            with open(
+                    os.path.join(self.dir_path, f'ni{self.obs_id}_0mpu7_gold_GTI{gti}.lc.gz'),
+                    mode='wb') as file:
+                file.write(b'Not a light curve')
+
+        with self.assertLogs('nicer_website.apps.plots.products', 'WARNING'):
+            response = self.export(export='csv')
+            content = b''.join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, b'gti,x,y,x_error,uncertainty,background\n')
@@ -10,6 +10,10 @@ app_name = 'plots'  # pylint: disable=invalid-name
 urlpatterns = [
     path('interactive_plot/', views.interactive_plot, name='plots'),
     path('fetch_observations', views.fetch_observations, name='fetch_observations'),
+    path('observation_search', views.observation_search, name='observation_search'),
     path('plot_data', views.plot_data, name='plot_data'),
     path('plot_gti', views.plot_gti, name='plot_gti'),
+    path('export_gti', views.export_gti, name='export_gti'),
+    path('prefetch_plots', views.prefetch_plots, name='prefetch_plots'),
+    path('thumbnail/<str:obs_id>', views.thumbnail, name='thumbnail'),
 ]
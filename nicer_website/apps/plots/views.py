@@ -1,199 +1,327 @@
 """
 Main functions for backend functionality of the interactive plot page
 """
+import os
 import re
 import logging as log
-from typing import Any
+from typing import Any, Callable, Iterator
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from urllib.parse import urlencode
 
 import numpy as np
-from numpy import ndarray
 from django.conf import settings
 from django.shortcuts import render
-from django.db.models import QuerySet
-from django.http import HttpRequest, HttpResponse, JsonResponse
-
-from nicer_website.apps.file_mgr.models import Item
-from src.utils.spectrum_preprocessing import spectrum_plot
-from src.utils.light_curve_preprocessing import light_curve_plot
-from src.utils.power_density_processing import get_pds_data_and_plot
+from django.db.models import F, QuerySet
+from django.db.models.expressions import RawSQL
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+    QueryDict,
+    StreamingHttpResponse,
+)
+from django.utils.http import http_date
+from django.utils.module_loading import import_string
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from nicer_website.limiter import Overloaded, client_id
+from nicer_website.prefetch import prefetcher
+from nicer_website.thumbnails import thumbnailer
+from nicer_website.apps.file_mgr.models import Directory, Item
+from nicer_website.apps.plots.models import Observation
+from nicer_website.apps.plots.manifest import Manifest, get_manifest
+from nicer_website.apps.plots.products import (
+    PLOTS,
+    encode_plot,
+    export_columns,
+    gti_products,
+    gti_summaries,
+    plot_query_error,
+    plot_webgl,
+)
+from nicer_website.apps.plots.caching import (
+    cacheable,
+    canonical_query,
+    canonical_redirect,
+    flight_key,
+    plot_validators,
+    render_view,
+)
+from nicer_website.apps.plots.admission import (
+    admitted,
+    admitted_stream,
+    overloaded,
+    plot_data_cost,
+    plot_gti_cost,
+)
+from src.utils import single_flight
+from src.utils.catalog import object_key, unit_vector
+from src.utils.export import CONTENT_TYPES, WRITERS
+from src.utils.thumbnails import default_products, thumbnail_key, thumbnail_path
 
 # Log axis
 # Info field (avg count)
 # Ability to choose grouping binning
 
-# Global variable
-PLOTS: dict[str, dict[str, Any]] = {
-    'spectrum': {
-        'exists': False,
-        'min_value': None,
-        'file_type': '.jsgrp',
-        'function': spectrum_plot,
-    },
-    'light_curve': {
-        'exists': False,
-        'min_value': 100,
-        'file_type': '.lc.gz',
-        'function': light_curve_plot,
-    },
-    'power_density_spectrum': {
-        'exists': False,
-        'min_value': None,
-        'file_type': '-bin.pds',
-        'function': get_pds_data_and_plot,
-    }
-}
-
-
+# Parameters of the GET variants of the plot views, in canonical order
+PLOT_DATA_PARAMETERS: tuple[str, ...] = (
+    'format',
+    'light-curve',
+    'obs_id',
+    'power-density-spectrum',
+    'quality',
+    'spectrum',
+    'webgl',
+)
+PLOT_GTI_PARAMETERS: tuple[str, ...] = (
+    'cumulative',
+    'displayed',
+    'format',
+    'gti-search',
+    'min_value',
+    'obs_id',
+    'plot_type',
+    'quality',
+    'webgl',
+)
+PLOT_EXPORT_PARAMETERS: tuple[str, ...] = (
+    'export',
+    'gti-search',
+    'min_value',
+    'obs_id',
+    'plot_type',
+    'quality',
+)
+
+
+@cacheable(PLOT_GTI_PARAMETERS)
+@admitted(plot_gti_cost)
 def plot_gti(request: HttpRequest) -> JsonResponse:
     """
     Plots multiple GTI observations for a single plot
 
+    If requested, the prefix sums of each GTI are also returned so that the browser can rebin the
+    plot for any minimum value without further requests
+
+    The plot is returned as an HTML div, or with the json format, as the figure with the trace
+    arrays in Plotly's typed array format and the plot type
+
+    In the json format, the GTIs already displayed can be given, in which case only the traces of
+    the GTIs that are not displayed are returned, along with the displayed GTIs to remove
+
     Parameters
     ----------
     request : HttpRequest
-        Http request containing the variables GTI query (gti-search), observation ID (obs_id),
-        pipeline quality (quality) and plot type (plot_type)
+        GET or POST request containing the variables GTI query (gti-search), observation ID
+        (obs_id), pipeline quality (quality), plot type (plot_type), minimum value (min_value),
+        and optionally the output format (format), if the prefix sums should be returned
+        (cumulative), if the plot should use WebGL (webgl), which otherwise depends on the
+        number of points, and the comma separated GTIs already displayed (displayed)
 
     Returns
     -------
     JsonResponse
-        Json response containing the plot as a list of the HTML element (plotDivs)
-    """
-    gti: int | str
-    min_value: int = int(request.POST['min_value'])
-    plot_divs: str
-    obs_id: str = request.POST['obs_id']
-    quality: str = request.POST['quality']
-    plot_type: str = request.POST['plot_type']
-    dir_path: str = f'{obs_id}/jspipe/'
-    gti_query: str | list[str] = request.POST['gti-search']
-    gti_range: list[int]
-    gti_list: list[int | range] = []
-    file_names: list[str] = []
-    files: QuerySet
-    file_name: Item
-
-    # Filter by quality, observation ID, and filter for files
-    files = Item.objects.filter(
-        name__contains=quality,
-        path=dir_path,
-        type=Item.item_type[1][0],
-    ).order_by('name')
-
-    # Filter by the plot type and append relative file location to data path
-    dir_path = f'{settings.DATA_DIR}/{dir_path}'
-    files = files.filter(name__contains=PLOTS[plot_type]['file_type'])
-
-    # Remove characters that are not numbers or dashes, and separate by commas
-    gti_query = re.sub(r'[^\d,-]', '', gti_query).split(',')
-
-    # Convert dashes to a list of integers in the range of the two numbers
-    for gti in gti_query:
-        if re.search(r'\d+-\d+', gti):
-            gti_range = list(map(int, gti.split('-')))
-            gti_range[-1] += 1
-            gti_list.extend(range(*gti_range))
-        elif gti.isdigit():
-            gti_list.append(int(gti))
-
-    # Filter for each GTI
-    for gti in gti_list:
-        file_name = files.filter(name__regex=fr'^\w*GTI{gti}[^\d][-_.\w]*$').first()
-
-        if file_name:
-            file_names.append(dir_path + file_name.name)
-
-    # If not GTI found, use the first available GTI
-    if not file_names:
-        file_name = files.first().name
-        gti_list = re.search(r'GTI(\d+)', file_name).group(1)
-        file_names.append(dir_path + file_name)
+        Json response containing the plot as a list of the HTML element (plotDivs), or for the json
+        format, a list of the plot type (type) and figure (figure) (plots), the GTIs to remove
+        (removed) if the displayed GTIs were given, and the prefix sums of each GTI returned
+        (cumulative) if requested and supported by the plot type, or 400 with the error for an
+        invalid minimum value or plot type
+    """
+    query: QueryDict = request.GET if request.method == 'GET' else request.POST
+    error: str | None = plot_query_error(query)
+    output: str = query.get('format', 'html')
+    webgl: bool | None = plot_webgl(query)
+    plot: str | dict[str, Any]
+    plot_type: str = query.get('plot_type', '')
+    displayed: set[int] | None = None
+    removed: list[int] = []
+    response: dict[str, Any]
+
+    if error is not None:
+        return JsonResponse({'error': error}, status=400)
+
+    file_names, file_gtis = gti_products(query)
+
+    # Only plot the GTIs that are not already displayed, and remove the ones no longer selected
+    if output == 'json' and 'displayed' in query:
+        displayed = {int(gti) for gti in re.findall(r'\d+', query['displayed'])}
+        removed = sorted(displayed.difference(file_gtis))
+        file_names, file_gtis = [
+            list(data) for data in zip(*(
+                (data_path, gti) for data_path, gti in zip(file_names, file_gtis)
+                if gti not in displayed
+            ))
+        ] or ([], [])
 
     # Plot each GTI
-    plot_divs = PLOTS[plot_type]['function'](min_value, file_names, gti_list)
-    return JsonResponse({'plotDivs': [plot_divs]})
+    if file_names:
+        plot = import_string(PLOTS[plot_type]['function'])(
+            int(query['min_value']),
+            file_names,
+            file_gtis,
+            output=output,
+            webgl=webgl,
+        )
+    else:
+        plot = {'data': [], 'layout': {}, 'config': {}}
+
+    if output == 'json':
+        response = {'plots': [encode_plot(plot_type, plot)]}
+
+        if displayed is not None:
+            response['removed'] = removed
+    else:
+        response = {'plotDivs': [plot]}
+
+    if query.get('cumulative') and PLOTS[plot_type]['cumulative']:
+        response['cumulative'] = [
+            import_string(PLOTS[plot_type]['cumulative'])(data_path) | {'gti': gti}
+            for data_path, gti in zip(file_names, file_gtis)
+        ]
+
+    return JsonResponse(response)
+
+
+def export_gti(request: HttpRequest) -> HttpResponse:
+    """
+    Exports the binned data of the selected GTIs of a plot as a file, streamed one GTI at a time so
+    that memory stays flat for large selections
+
+    The file is a CSV with a GTI column, an NPZ with an array named GTI<n>_<column> for each column
+    of each GTI, or a FITS file with a binary table extension named GTI<n> for each GTI, with the
+    columns x, y, x_error, uncertainty and background, of which the PDS only has x, y and
+    uncertainty
+
+    Parameters
+    ----------
+    request : HttpRequest
+        GET request containing the same variables as plot_gti, and the file format (export), csv,
+        npz or fits
+
+    Returns
+    -------
+    HttpResponse
+        Streamed file as an attachment, a permanent redirect to the canonical query, 304 if the
+        ETag or modification time matches, 400 with the error for an unknown file format, an
+        invalid minimum value or plot type, or 429 or 503 with Retry-After if the request is not
+        admitted
+    """
+    query: QueryDict = request.GET
+    export: str = query.get('export', 'csv')
+    error: str | None
+    plot_type: str = query.get('plot_type', '')
+    etag: str
+    last_modified: int
+    chunks: Iterator[bytes]
+    response: HttpResponse | None = canonical_redirect(request, PLOT_EXPORT_PARAMETERS)
+
+    if response is not None:
+        return response
+
+    error = f'Unknown export format {export}' if export not in WRITERS else plot_query_error(query)
+
+    if error is not None:
+        return JsonResponse({'error': error}, status=400)
+
+    # The query is canonical, so equivalent exports share the ETag
+    etag, last_modified = plot_validators(query)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    if response is not None:
+        return response
+
+    file_names, file_gtis = gti_products(query)
+    chunks = admitted_stream(
+        plot_gti_cost(query),
+        client_id(request),
+        WRITERS[export](
+            export_columns(plot_type, int(query['min_value']), file_names, file_gtis),
+            PLOTS[plot_type]['columns'],
+        ),
+    )
+
+    try:
+        next(chunks)
+    except Overloaded as overload:
+        return overloaded(overload)
+
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[export])
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="{query["obs_id"]}_{query["quality"]}_{plot_type}.{export}"'
+    )
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = http_date(last_modified)
+    return response
 
 
+@cacheable(PLOT_DATA_PARAMETERS)
+@admitted(plot_data_cost)
 def plot_data(request: HttpRequest) -> JsonResponse:
     """
     Tries to plot the specified data, matching the correct plot type
 
-    Supports energy spectrum, light curve, and power density
+    Supports energy spectrum, light curve, and power density, returned as HTML divs, or with the
+    json format, as figures with the trace arrays in Plotly's typed array format
 
     Parameters
     ----------
     request : HttpRequest
-        POST request containing the variables observation ID (obs_id),
-        pipeline (quality), and file types to be plotted (.jsgrp, .lc.gz)
+        GET or POST request containing the variables observation ID (obs_id),
+        pipeline (quality), file types to be plotted (.jsgrp, .lc.gz), and optionally the
+        output format (format) and if the plots should use WebGL (webgl)
 
     Returns
     -------
     JsonResponse
-        Json response containing the plots as a list of HTML elements (plotDivs),
+        Json response containing the plots as a list of HTML elements (plotDivs), or for the
+        json format, a list of the plot types (type) and figures (figure) (plots),
         observation ID (obsID), quality (quality), if spectrum is plotted (spectrum),
         and if light curve is plotted (lightCurve)
     """
-    file_name: str
-    obs_id: str = request.POST['obs_id']
-    quality: str = request.POST['quality']
-    dir_path: str = f'{obs_id}/jspipe/'
+    query: QueryDict = request.GET if request.method == 'GET' else request.POST
+    obs_id: str = query['obs_id']
+    quality: str = query['quality']
+    manifest: Manifest = get_manifest(obs_id)
+    dir_path: str = f'{settings.DATA_DIR}/{manifest.dir_path}'
+    output: str = query.get('format', 'html')
+    webgl: bool | None = plot_webgl(query)
     max_gti: list[int] = []
-    plot_divs: list[str] = []
+    plots: list[str | dict[str, Any]] = []
     infos: list[dict[str, Any]] = []
+    name: str
     plot_type: dict[str, Any]
-    logger: log.Logger = log.getLogger(__name__)
-    info: ndarray
-    indices: ndarray
-    file_names: ndarray
-    files: QuerySet
-
-    # Get all files in observation ID
-    files = Item.objects.filter(
-        name__contains=quality,
-        path=dir_path,
-        type=Item.item_type[1][0],
-    ).order_by('name')
-
-    dir_path = f'{settings.DATA_DIR}/{dir_path}'
+    products: dict[int, str]
 
     # Try to get data for specified plots
     try:
-        # Get summary files for each GTI
-        file_names = np.array(
-            files.filter(name__contains='BGDATA.summary').values_list('name', flat=True)
-        )
-
-        # Sort by GTI number
-        indices = np.argsort(
-            [int(re.search(r'GTI(\d+)', file_name).group(1)) for file_name in file_names]
-        )
-
-        # Get GTI info
-        for file_name in file_names[indices]:
-            file_name = dir_path + file_name
-            info = np.char.replace(np.loadtxt(file_name, dtype=str, unpack=True), "'", '')
-            infos.append(dict(zip(*info)) | {'GTI': re.search(r'GTI\d+', file_name).group(0)})
+        # Get GTI info from the summary files of each GTI, sorted by GTI number
+        infos = gti_summaries(manifest, quality)
 
         # Plot depending on the data type
-        for plot_type in PLOTS.values():
-            if plot_type['file_type'] in request.POST.values():
+        for name, plot_type in PLOTS.items():
+            if plot_type['file_type'] in query.values():
                 plot_type['exists'] = True
-                file_names = files.filter(name__contains=plot_type['file_type'])
-                file_names = file_names.exclude(name__regex=r'_BAND\d+')
-                file_name = file_names.first().name
-                max_gti.append(len(file_names))
+                products = manifest.products(quality, plot_type['file_type'])
+                max_gti.append(len(products))
 
-                plot_divs.append(plot_type['function'](
+                plots.append(import_string(plot_type['function'])(
                     plot_type['min_value'],
-                    [dir_path + file_name],
+                    [dir_path + next(iter(products.values()))],
                     [0],
+                    output=output,
+                    webgl=webgl,
                 ))
 
-    except AttributeError as error:
-        logger.error(f'{error}\nNo valid data in {dir_path}')
+                if output == 'json':
+                    plots[-1] = encode_plot(name, plots[-1])
+
+    except StopIteration:
+        log.getLogger(__name__).error(f'No valid data in {dir_path}')
 
     return JsonResponse({
-        'plotDivs': plot_divs,
+        'plots' if output == 'json' else 'plotDivs': plots,
         'obsID': obs_id,
         'quality': quality,
         'spectrum': PLOTS['spectrum']['exists'],
@@ -204,6 +332,110 @@ def plot_data(request: HttpRequest) -> JsonResponse:
     })
 
 
+def prefetch_plots(request: HttpRequest) -> JsonResponse:
+    """
+    Starts rendering the plots of plot_data for an observation in the background, so that they are
+    ready when the form is submitted, cancelling the client's previous prefetch
+
+    The plots are rendered through the limiter like a plot_data request, and if the form is
+    submitted while they are still rendering, the request waits for them through single flight
+
+    Parameters
+    ----------
+    request : HttpRequest
+        GET request containing the variables of a plot_data request
+
+    Returns
+    -------
+    JsonResponse
+        Json response containing if the plots are being prefetched (prefetching), which is false
+        if the observation has no products or every prefetch worker is busy
+    """
+    query: QueryDict = QueryDict(urlencode(canonical_query(request.GET, PLOT_DATA_PARAMETERS)))
+    client: str = client_id(request)
+    view: Callable[[HttpRequest], HttpResponse] = plot_data.__wrapped__
+    prefetch_request: HttpRequest = HttpRequest()
+    key: str
+
+    if not get_manifest(query.get('obs_id', '')).files(query.get('quality', '')):
+        return JsonResponse({'prefetching': False})
+
+    prefetch_request.method = 'GET'
+    prefetch_request.GET = query
+    # Identifies the prefetch as the client's request to the limiter without the proxy header
+    prefetch_request.META = {'REMOTE_ADDR': client}
+    key = flight_key(view, plot_validators(query)[0])
+
+    def prefetch() -> tuple[bytes, int, dict[str, str]] | None:
+        content, status, headers = single_flight.run(
+            key,
+            lambda: render_view(view, prefetch_request),
+        )
+        return (content, status, headers) if status == 200 else None
+
+    return JsonResponse({'prefetching': prefetcher.submit(key, client, prefetch)})
+
+
+def thumbnail(request: HttpRequest, obs_id: str) -> HttpResponse:
+    """
+    Serves the quicklook thumbnail of an observation, rendering it if it is not in the cache
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Request for the thumbnail, optionally containing the pipeline quality (quality)
+    obs_id : str
+        Observation ID
+
+    Returns
+    -------
+    HttpResponse
+        PNG thumbnail, or 503 with Retry-After if the render queue is full or the render takes
+        longer than THUMBNAIL_TIMEOUT
+    """
+    manifest: Manifest = get_manifest(obs_id)
+    dir_path: str = f'{settings.DATA_DIR}/{manifest.dir_path}'
+    products: dict[str, str] = default_products(
+        manifest.names,
+        request.GET.get('quality', 'gold'),
+    )
+    key: str
+    path: str
+    future: Future | None
+    response: HttpResponse | None
+
+    if not products:
+        raise Http404(f'No products for a thumbnail in {manifest.dir_path}')
+
+    key = thumbnail_key(dir_path, products)
+    path = thumbnail_path(key)
+    response = get_conditional_response(request, etag=f'"{key[:32]}"')
+
+    if response is None:
+        if not os.path.exists(path):
+            future = thumbnailer.submit(dir_path, products, key)
+
+            try:
+                if future is not None:
+                    future.result(settings.THUMBNAIL_TIMEOUT)
+            except FutureTimeoutError:
+                future = None
+
+            if future is None:
+                response = HttpResponse('Thumbnail is being rendered', status=503)
+                response.headers['Retry-After'] = str(int(settings.THUMBNAIL_TIMEOUT))
+                return response
+
+        response = FileResponse(
+            open(path, 'rb'),  # pylint: disable=consider-using-with
+            content_type='image/png',
+        )
+
+    response.headers['ETag'] = f'"{key[:32]}"'
+    patch_cache_control(response, public=True, max_age=settings.PLOT_CACHE_MAX_AGE)
+    return response
+
+
 def fetch_observations(request: HttpRequest, count: int = 5) -> JsonResponse:
     """
     Queries the data base with a provided path to return the first 5 items
@@ -221,21 +453,100 @@ def fetch_observations(request: HttpRequest, count: int = 5) -> JsonResponse:
     JsonResponse
         Json response containing a dictionary with 5 items matching the query
     """
-    # Get the queried observation ID from the request and root path
-    root: str = Item._meta.get_field('path').get_default()  # pylint: disable=protected-access
+    # Get the queried observation ID from the request and root directory
+    root: int | None = Directory.get_id(Directory.root)
     obs_id: str = request.GET.get('obs_id')
     suggested_obs: QuerySet
 
     # Query the database for the first 5 observation IDs that match the query
     suggested_obs = Item.objects.filter(
         name__startswith=obs_id,
-        path=root,
+        directory_id=root,
         type=Item.item_type[0][0],
     ).order_by('name')[:count]
 
     return JsonResponse({'dir_suggestions': list(suggested_obs.values_list('name', flat=True))})
 
 
+def observation_search(request: HttpRequest, count: int = 50) -> JsonResponse:
+    """
+    Searches the observation catalog by object name prefix and/or a cone around a sky position
+
+    Cone searches query the R*Tree for the observations within the bounding box of the cone on
+    the unit sphere, then filter by the exact angular separation
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Request containing the optional variables object name (object), right ascension (ra) and
+        declination (dec) in degrees, cone radius in degrees (radius) and number of results
+        (count)
+    count : int, default = 50
+        Default number of observations to return, limited to 500
+
+    Returns
+    -------
+    JsonResponse
+        Json response containing the matching observations (observations), sorted by angular
+        separation in degrees (separation) for cone searches, otherwise by object name
+    """
+    name: str = request.GET.get('object', '')
+    key: str = object_key(name)
+    radius: float
+    center: tuple[float, float, float] | None
+    chord: float
+    observations: QuerySet = Observation.objects.all()
+    results: list[dict[str, Any]]
+
+    try:
+        count = min(int(request.GET.get('count', count)), 500)
+        radius = float(request.GET.get('radius', 0.5))
+        center = unit_vector(float(request.GET['ra']), float(request.GET['dec'])) \
+            if 'ra' in request.GET or 'dec' in request.GET else None
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Invalid count, position or radius'}, status=400)
+
+    if not key and center is None:
+        return JsonResponse({'error': 'Object name or position required'}, status=400)
+
+    if not 0 < radius <= 90:
+        return JsonResponse({'error': 'Radius must be between 0 and 90 degrees'}, status=400)
+
+    # Object names are normalised to upper case letters, digits and signs, so ~ sorts after them
+    if key:
+        observations = observations.filter(object_key__gte=key, object_key__lt=f'{key}~')
+
+    if center is None:
+        observations = observations.order_by('object_key', 'obs_id')
+    else:
+        chord = 2 * np.sin(np.radians(radius) / 2)
+        observations = observations.filter(id__in=RawSQL(
+            'SELECT id FROM plots_observation_rtree WHERE max_x >= %s AND min_x <= %s '
+            'AND max_y >= %s AND min_y <= %s AND max_z >= %s AND min_z <= %s',
+            [bound for axis in center for bound in (axis - chord, axis + chord)],
+        )).annotate(
+            separation=F('x') * center[0] + F('y') * center[1] + F('z') * center[2],
+        ).filter(separation__gte=np.cos(np.radians(radius))).order_by('-separation')
+
+    results = list(observations.values(
+        'obs_id',
+        'object',
+        'ra',
+        'dec',
+        'date_obs',
+        'exposure',
+        'detectors',
+        *(('separation',) if center else ()),
+    )[:count])
+
+    # Convert the dot products of the unit vectors to angles
+    if center:
+        for result in results:
+            result['separation'] = float(np.degrees(np.arccos(min(result['separation'], 1))))
+
+    return JsonResponse({'observations': results})
+
+
 def interactive_plot(request: HttpRequest) -> HttpResponse:
     """
     Loads the interactive plot page
@@ -0,0 +1,189 @@
+"""
+Admission control for expensive requests, which share a budget of estimated cost per process so
+that bursts of wide plot requests queue briefly or are shed instead of occupying every worker
+"""
+import math
+import time
+from threading import Condition
+from contextlib import contextmanager
+from typing import Iterator
+
+from django.conf import settings
+from django.http import HttpRequest
+
+from nicer_website.metrics import metrics
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is not admitted, with the status code and seconds to wait before retrying
+    """
+    def __init__(self, status: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Admits requests while the total estimated cost of the admitted requests is within the budget,
+    queueing up to queue_size requests for at most timeout seconds otherwise
+
+    A request is always admitted if nothing else is running, so requests costing more than the
+    budget run alone. Clients with client_limit requests running or queued are refused with 429,
+    and requests that cannot be queued or time out in the queue are refused with 503
+    """
+    def __init__(self, budget: float, queue_size: int, timeout: float, client_limit: int):
+        self.budget = budget
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.client_limit = client_limit
+        self._condition: Condition = Condition()
+        self._used: float = 0
+        self._waiting: int = 0
+        self._clients: dict[str, int] = {}
+        # Moving average of the time admitted requests take, to suggest when to retry
+        self._duration: float = 1
+
+        for name, value in (
+            ('limiter.budget', budget),
+            ('limiter.queue_size', queue_size),
+            ('limiter.timeout', timeout),
+            ('limiter.client_limit', client_limit),
+        ):
+            metrics.gauge(name, value)
+
+    def _fits(self, cost: float) -> bool:
+        """
+        Checks if a request fits in the remaining budget
+
+        Parameters
+        ----------
+        cost : float
+            Estimated cost of the request
+
+        Returns
+        -------
+        bool
+            If nothing is running or the request fits in the budget
+        """
+        return not self._used or self._used + cost <= self.budget
+
+    def _retry_after(self) -> int:
+        """
+        Estimates the seconds until the queue has room, from the average request time
+
+        Returns
+        -------
+        int
+            Seconds to wait before retrying, at least 1
+        """
+        return max(1, math.ceil(self._duration * (self._waiting + 1)))
+
+    def _release_client(self, client: str):
+        """
+        Removes a running or queued request of a client
+
+        Parameters
+        ----------
+        client : str
+            Client address
+        """
+        self._clients[client] -= 1
+
+        if not self._clients[client]:
+            del self._clients[client]
+
+    @contextmanager
+    def admit(self, cost: float, client: str) -> Iterator[None]:
+        """
+        Waits until a request is admitted and holds its cost from the budget until it finishes
+
+        Parameters
+        ----------
+        cost : float
+            Estimated cost of the request
+        client : str
+            Client address
+
+        Raises
+        ------
+        Overloaded
+            If the client has too many requests, the queue is full or the wait timed out
+        """
+        admitted: bool
+        start: float = time.monotonic()
+
+        with self._condition:
+            if self._clients.get(client, 0) >= self.client_limit:
+                metrics.record('limiter.rejected_client')
+                raise Overloaded(429, self._retry_after(), 'Too many plot requests from client')
+
+            if not self._fits(cost) and self._waiting >= self.queue_size:
+                metrics.record('limiter.rejected_queue_full')
+                raise Overloaded(503, self._retry_after(), 'Plot queue is full')
+
+            self._clients[client] = self._clients.get(client, 0) + 1
+            self._waiting += 1
+            metrics.gauge('limiter.waiting', self._waiting)
+
+            try:
+                admitted = self._condition.wait_for(lambda: self._fits(cost), self.timeout)
+            finally:
+                self._waiting -= 1
+                metrics.gauge('limiter.waiting', self._waiting)
+
+            if not admitted:
+                self._release_client(client)
+                metrics.record('limiter.rejected_timeout')
+                raise Overloaded(503, self._retry_after(), 'Timed out waiting for plot queue')
+
+            self._used += cost
+            metrics.gauge('limiter.used', self._used)
+
+        metrics.record('limiter.queue_seconds', time.monotonic() - start)
+        metrics.record('limiter.cost', cost)
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._used -= cost
+                self._release_client(client)
+                self._duration = 0.8 * self._duration + 0.2 * (time.monotonic() - start)
+                metrics.gauge('limiter.used', self._used)
+                self._condition.notify_all()
+
+
+def client_id(request: HttpRequest) -> str:
+    """
+    Identifies the client of a request for the per-client limit, by the last address of the
+    trusted header set by the reverse proxy in PLOT_CLIENT_HEADER, as every request arrives from
+    the proxy's address, otherwise by the address of the connection
+
+    Only the last address of a header such as X-Forwarded-For is used, as it is appended by the
+    proxy, while earlier addresses are sent by the client
+
+    Parameters
+    ----------
+    request : HttpRequest
+        Request to identify
+
+    Returns
+    -------
+    str
+        Client address
+    """
+    forwarded: str = request.META.get(settings.PLOT_CLIENT_HEADER, '') \
+        if settings.PLOT_CLIENT_HEADER else ''
+
+    return forwarded.split(',')[-1].strip() or request.META.get('REMOTE_ADDR', '')
+
+
+limiter = Limiter(
+    settings.PLOT_COST_BUDGET,
+    settings.PLOT_QUEUE_SIZE,
+    settings.PLOT_QUEUE_TIMEOUT,
+    settings.PLOT_CLIENT_REQUESTS,
+)
@@ -0,0 +1,64 @@
+"""
+In-process instrumentation of the website, counting and summing named values such as response sizes,
+and holding the current values of gauges such as limits
+"""
+from threading import Lock
+
+
+class Metrics:
+    """
+    Thread-safe registry of named metrics, each with the number of values recorded and their total,
+    and of named gauges with their current value
+    """
+    def __init__(self):
+        self._lock: Lock = Lock()
+        self._values: dict[str, list[float]] = {}
+        self._gauges: dict[str, float] = {}
+
+    def record(self, name: str, value: float = 1):
+        """
+        Records a value of a metric
+
+        Parameters
+        ----------
+        name : str
+            Name of the metric
+        value : float, default = 1
+            Value to add to the total of the metric
+        """
+        with self._lock:
+            count, total = self._values.get(name, (0, 0))
+            self._values[name] = [count + 1, total + value]
+
+    def gauge(self, name: str, value: float):
+        """
+        Sets the current value of a gauge
+
+        Parameters
+        ----------
+        name : str
+            Name of the gauge
+        value : float
+            Current value
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        """
+        Gets the current values of every metric and gauge
+
+        Returns
+        -------
+        dict[str, dict[str, float]]
+            Number of values (count) and total (total) of each metric, and value (value) of each
+            gauge, by name
+        """
+        with self._lock:
+            return {
+                name: {'count': count, 'total': total}
+                for name, (count, total) in self._values.items()
+            } | {name: {'value': value} for name, value in self._gauges.items()}
+
+
+metrics = Metrics()
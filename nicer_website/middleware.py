@@ -0,0 +1,84 @@
+"""
+Middleware compressing responses with Brotli or gzip depending on Accept-Encoding
+"""
+import re
+import gzip
+from typing import Callable
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.http import HttpRequest, HttpResponse
+
+from nicer_website.metrics import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses shorter than this are not worth compressing
+MIN_LENGTH = 200
+CONTENT_TYPES = re.compile(r'^(text/|application/(json|javascript))')
+# Encodings in order of preference, Brotli is used if the brotli package is installed
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    **({'br': lambda content: brotli.compress(content, quality=5)} if brotli else {}),
+    'gzip': lambda content: gzip.compress(content, compresslevel=6, mtime=0),
+}
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compresses text and JSON responses with the preferred encoding the client accepts, recording
+    the size of each response before and after compression by view in the metrics
+
+    Streaming responses, such as data files that support range requests, are not compressed
+    """
+    def process_response(self, request: HttpRequest, response: HttpResponse) -> HttpResponse:
+        """
+        Compresses the response if the client accepts a supported encoding
+
+        Parameters
+        ----------
+        request : HttpRequest
+            Request for the response
+        response : HttpResponse
+            Response to compress
+
+        Returns
+        -------
+        HttpResponse
+            Response, compressed if it is worth compressing
+        """
+        view: str
+        content: bytes
+        accept_encoding: str = request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+        if response.streaming or response.has_header('Content-Encoding') or \
+                not CONTENT_TYPES.match(response.get('Content-Type', '')):
+            return response
+
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        metrics.record(f'{view}.bytes', len(response.content))
+
+        if len(response.content) >= MIN_LENGTH:
+            patch_vary_headers(response, ('Accept-Encoding',))
+
+            for encoding, encoder in ENCODERS.items():
+                if not re.search(fr'\b{encoding}\b', accept_encoding):
+                    continue
+
+                content = encoder(response.content)
+
+                if len(content) < len(response.content):
+                    response.content = content
+                    response.headers['Content-Length'] = str(len(content))
+                    response.headers['Content-Encoding'] = encoding
+
+                    # Compressed responses are no longer byte-for-byte identical
+                    if response.get('ETag', '').startswith('"'):
+                        response.headers['ETag'] = f'W/{response["ETag"]}'
+
+                break
+
+        metrics.record(f'{view}.encoded_bytes', len(response.content))
+        return response
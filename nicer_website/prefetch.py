@@ -0,0 +1,168 @@
+"""
+Speculative computation of plots a client is likely to request next, such as the plots of an
+observation picked from the autocomplete suggestions, so that they are ready when the form is
+submitted
+"""
+import time
+from threading import Lock
+from typing import Any, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from nicer_website.metrics import metrics
+
+
+class Prefetcher:
+    """
+    Runs speculative computations in a pool of worker threads and keeps their results for ttl
+    seconds until taken by the request they anticipate
+
+    Each client has at most one pending computation, which is cancelled when the client prefetches
+    something else, and computations are refused while every worker is busy so that speculative
+    work never queues behind itself. Computations that already started cannot be interrupted, so
+    they finish but their results are not kept if they were cancelled
+    """
+    def __init__(self, workers: int, ttl: float, max_results: int = 32):
+        self.workers = workers
+        self.ttl = ttl
+        self.max_results = max_results
+        self._lock: Lock = Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        # Number of computations queued or running, including cancelled running computations
+        self._busy: int = 0
+        # Key and future of the pending computation of each client
+        self._pending: dict[str, tuple[str, Future]] = {}
+        # Expiry time and result of each finished computation
+        self._results: dict[str, tuple[float, Any]] = {}
+
+        metrics.gauge('prefetch.workers', workers)
+
+    def _run(self, key: str, client: str, function: Callable[[], Any]):
+        """
+        Runs a computation in a worker thread and keeps its result if it was not cancelled
+
+        Parameters
+        ----------
+        key : str
+            Key of the computation
+        client : str
+            Client address
+        function : Callable[[], Any]
+            Computation, returning None if its result should not be kept
+        """
+        result: Any = None
+
+        close_old_connections()
+
+        try:
+            result = function()
+        finally:
+            close_old_connections()
+
+            with self._lock:
+                self._busy -= 1
+                metrics.gauge('prefetch.busy', self._busy)
+
+                if self._pending.get(client, ('',))[0] == key:
+                    del self._pending[client]
+
+                    if result is not None:
+                        self._results[key] = (time.monotonic() + self.ttl, result)
+                        metrics.record('prefetch.completed')
+                else:
+                    metrics.record('prefetch.discarded')
+
+    def _expire(self):
+        """
+        Removes expired results, and the oldest results once more than max_results are kept
+
+        Must be called while holding the lock
+        """
+        now: float = time.monotonic()
+
+        for key in [key for key, (expiry, _) in self._results.items() if expiry < now]:
+            del self._results[key]
+
+        while len(self._results) > self.max_results:
+            del self._results[next(iter(self._results))]
+
+    def submit(self, key: str, client: str, function: Callable[[], Any]) -> bool:
+        """
+        Starts a computation for a client in the background, cancelling the client's previous
+        computation if it is for a different key
+
+        Parameters
+        ----------
+        key : str
+            Key of the computation
+        client : str
+            Client address
+        function : Callable[[], Any]
+            Computation, returning None if its result should not be kept
+
+        Returns
+        -------
+        bool
+            If the computation is running or its result is already kept, False if every worker
+            is busy or prefetching is disabled
+        """
+        previous: tuple[str, Future] | None
+
+        with self._lock:
+            self._expire()
+
+            if key in self._results:
+                return True
+
+            previous = self._pending.get(client)
+
+            if previous is not None:
+                if previous[0] == key:
+                    return True
+
+                del self._pending[client]
+                metrics.record('prefetch.cancelled')
+
+                if previous[1].cancel():
+                    self._busy -= 1
+
+            if self._busy >= self.workers:
+                metrics.record('prefetch.rejected')
+                return False
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='prefetch')
+
+            self._busy += 1
+            self._pending[client] = (key, self._executor.submit(self._run, key, client, function))
+            metrics.gauge('prefetch.busy', self._busy)
+            metrics.record('prefetch.submitted')
+            return True
+
+    def take(self, key: str) -> Any | None:
+        """
+        Takes the result of a finished computation
+
+        Parameters
+        ----------
+        key : str
+            Key of the computation
+
+        Returns
+        -------
+        Any | None
+            Result of the computation, or None if it was not prefetched or has expired
+        """
+        with self._lock:
+            self._expire()
+
+            if key not in self._results:
+                return None
+
+            metrics.record('prefetch.hits')
+            return self._results.pop(key)[1]
+
+
+prefetcher = Prefetcher(settings.PLOT_PREFETCH_WORKERS, settings.PLOT_PREFETCH_TTL)
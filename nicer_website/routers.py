@@ -0,0 +1,88 @@
+"""
+Database routers and connection setup for reading the data while db_update writes
+"""
+from typing import Any
+
+from django.db.models import Model
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+
+class ReadOnlyRouter:
+    """
+    Routes reads of the file_mgr and plots models to the read-only connection, which in WAL mode
+    reads the last committed data while db_update writes, and everything else to the default
+    connection
+    """
+    apps = ('file_mgr', 'plots')
+    read_db = 'readonly'
+
+    def db_for_read(self, model: type[Model], **_: Any) -> str | None:
+        """
+        Gets the database to read the model from
+
+        Parameters
+        ----------
+        model : type[Model]
+            Model being read
+
+        Returns
+        -------
+        str | None
+            Read-only database for the data apps, otherwise None for the default database
+        """
+        app_label: str = model._meta.app_label  # pylint: disable=protected-access
+        return self.read_db if app_label in self.apps else None
+
+    def db_for_write(self, *_: Any, **__: Any) -> str:
+        """
+        Gets the database to write models to
+
+        Returns
+        -------
+        str
+            Default database
+        """
+        return 'default'
+
+    def allow_relation(self, *_: Any, **__: Any) -> bool:
+        """
+        Allows relations between objects from either connection, as both use the same database
+
+        Returns
+        -------
+        bool
+            True
+        """
+        return True
+
+    def allow_migrate(self, alias: str, *_: Any, **__: Any) -> bool:
+        """
+        Only migrates the default database
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the database
+
+        Returns
+        -------
+        bool
+            If the database is the default database
+        """
+        return alias == 'default'
+
+
+def set_pragmas(connection: BaseDatabaseWrapper, **_: Any):
+    """
+    Enables WAL journaling for new SQLite connections that can write, which is stored in the
+    database so only the first connection changes it
+
+    Parameters
+    ----------
+    connection : BaseDatabaseWrapper
+        New database connection
+    """
+    if connection.vendor == 'sqlite' and connection.alias != ReadOnlyRouter.read_db:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode = WAL')
+            cursor.execute('PRAGMA synchronous = NORMAL')
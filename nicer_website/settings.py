@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'nicer_website.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -79,13 +80,39 @@ WSGI_APPLICATION = 'nicer_website.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# The database uses WAL journaling, so the website reads through a read-only connection while
+# db_update writes, and connections wait for locks for up to timeout seconds instead of failing,
+# the test database is a file so that tests can write to it from another connection and read it
+# through the read-only connection, which ReadOnlyTestRunner opens in read-only mode
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    'readonly': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{BASE_DIR / "db.sqlite3"}?mode=ro',
+        'CONN_MAX_AGE': config('CONN_MAX_AGE', default=600, cast=int),
+        'OPTIONS': {
+            'timeout': 5,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+DATABASE_ROUTERS = ['nicer_website.routers.ReadOnlyRouter']
+
+TEST_RUNNER = 'nicer_website.test_runner.ReadOnlyTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -127,9 +154,41 @@ with open('config.txt', mode='r', encoding='utf8') as file:
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'nicer_website/static'),
-    ('nicer_data', DATA_DIR),
 ]
 
+# Data files are served by file_mgr:data, set the header to X-Accel-Redirect (nginx) or
+# X-Sendfile (Apache, lighttpd) to let the web server in front of Django send the files,
+# with X-Accel-Redirect, DATA_SENDFILE_PREFIX must be an internal location aliasing DATA_DIR
+DATA_SENDFILE_HEADER = config('DATA_SENDFILE_HEADER', default=None)
+DATA_SENDFILE_PREFIX = config('DATA_SENDFILE_PREFIX', default='/nicer_data/')
+
+# Seconds that browsers and proxies may reuse plots from GET requests before revalidating them
+# with their ETag, which changes when any of the observation's files change
+PLOT_CACHE_MAX_AGE = config('PLOT_CACHE_MAX_AGE', default=60, cast=int)
+# Significant digits kept in the y values and errors of JSON plots, 0 to send them unrounded
+PLOT_SIGNIFICANT_DIGITS = config('PLOT_SIGNIFICANT_DIGITS', default=4, cast=int)
+
+# Admission control of plot requests per process, by the estimated megabytes of products read,
+# which is the number of GTIs times the size of each product type, with a bounded wait queue
+PLOT_COST_BUDGET = config('PLOT_COST_BUDGET', default=50, cast=float)
+PLOT_QUEUE_SIZE = config('PLOT_QUEUE_SIZE', default=8, cast=int)
+PLOT_QUEUE_TIMEOUT = config('PLOT_QUEUE_TIMEOUT', default=10, cast=float)
+PLOT_CLIENT_REQUESTS = config('PLOT_CLIENT_REQUESTS', default=4, cast=int)
+# Request header holding the client address set by the reverse proxy, such as HTTP_X_REAL_IP or
+# HTTP_X_FORWARDED_FOR, to identify clients behind it, empty to use the connection address
+PLOT_CLIENT_HEADER = config('PLOT_CLIENT_HEADER', default='')
+
+# Background threads per process computing the plots of observations picked from the suggestions
+# before the form is submitted, 0 to disable, and seconds their results are kept
+PLOT_PREFETCH_WORKERS = config('PLOT_PREFETCH_WORKERS', default=2, cast=int)
+PLOT_PREFETCH_TTL = config('PLOT_PREFETCH_TTL', default=60, cast=float)
+
+# Processes per web process rendering observation thumbnails for the directory listing, 0 to
+# disable, with the number of thumbnails queued and the seconds a request waits for its thumbnail
+THUMBNAIL_WORKERS = config('THUMBNAIL_WORKERS', default=2, cast=int)
+THUMBNAIL_QUEUE_SIZE = config('THUMBNAIL_QUEUE_SIZE', default=16, cast=int)
+THUMBNAIL_TIMEOUT = config('THUMBNAIL_TIMEOUT', default=10, cast=float)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -1,6 +1,19 @@
-/* global PLOT_GRAPH_URL PLOT_GTI_URL MathJax quality */
-
-import { columnLayout, dropdowns } from '../utils/utils.js';
+/* global EXPORT_GTI_URL PLOT_GRAPH_URL PLOT_GTI_URL PREFETCH_PLOTS_URL */
+/* global MathJax Plotly quality */
+
+import {
+  canonicalQuery,
+  columnLayout,
+  decodeTypedArray,
+  dropdowns,
+} from '../utils/utils.js';
+
+// Prefix sums of each GTI for each plot type, used to rebin without requests
+const CUMULATIVE = {};
+// Plot types showing GTIs from the search field, which are updated by delta
+const GTI_PLOTS = new Set();
+// Query of the last prefetched plots, so that it is only prefetched once
+let prefetchedQuery = '';
 
 /**
  * Updates the quality setting when the user activates a quality button.
@@ -11,6 +24,23 @@ function changeQuality(buttonQuality) {
   document.querySelector('#quality-select').value = buttonQuality;
 }
 
+/**
+ * Asks the server to start computing the plots selected in the form,
+ * so that they are ready when the form is submitted.
+ *
+ * The server cancels the previous prefetch if the query changed.
+ */
+function prefetchPlots() {
+  const QUERY = canonicalQuery(`${$('#plot-graph').serialize()}&format=json`);
+
+  if (!$('#observation-search').val().trim() || QUERY === prefetchedQuery) {
+    return;
+  }
+
+  prefetchedQuery = QUERY;
+  fetch(`${PREFETCH_PLOTS_URL}?${QUERY}`);
+}
+
 /**
  * Generates a button for a suggested observation
  * ID that the user can click to autocomplete.
@@ -26,6 +56,7 @@ function addObservation(obsID) {
   // observation ID of the clicked button
   OPTION.addEventListener('click', () => {
     document.querySelector('#observation-search').value = obsID;
+    prefetchPlots();
   });
 
   document.querySelector('#observation-options').append(OPTION);
@@ -131,45 +162,297 @@ function displayInfo(info) {
   return $CONTAINER;
 }
 
+/**
+ * Calculates the bin edges so that each bin has at least the minimum counts,
+ * matching min_bin in src/utils/utils.py.
+ * @param {Float64Array} counts Counts of each bin
+ * @param {number} minValue Minimum counts per bin
+ * @returns {Array.<number>} Bin edge indices
+ */
+function minBin(counts, minValue) {
+  const BINS = [0];
+  let count = 0;
+
+  for (let i = 0; i < counts.length - 1; i++) {
+    count += counts[i];
+
+    if (count >= minValue) {
+      BINS.push(i + 1);
+      count = 0;
+    }
+  }
+
+  if (counts[counts.length - 1] < minValue) {
+    BINS[BINS.length - 1] = counts.length;
+  } else {
+    BINS.push(counts.length);
+  }
+
+  return BINS;
+}
+
+/**
+ * Linearly interpolates a value, clamped to the ends, matching numpy.interp.
+ * @param {number} value Value to interpolate at
+ * @param {Array.<number>} x Increasing x values
+ * @param {Array.<number>} y Y values
+ * @returns {number} Interpolated y value
+ */
+function interp(value, x, y) {
+  if (value <= x[0]) {
+    return y[0];
+  }
+
+  for (let i = 1; i < x.length; i++) {
+    if (value <= x[i]) {
+      return y[i - 1] + ((y[i] - y[i - 1]) * (value - x[i - 1])) / (x[i] - x[i - 1]);
+    }
+  }
+
+  return y[y.length - 1];
+}
+
+/**
+ * Bins a GTI from its prefix sums, matching the light curve and spectrum
+ * processing in src/utils.
+ * @param {Object} data Prefix sums, plot type (kind), normalisation (scales)
+ * and energy range (cutOff) of the GTI
+ * @param {number} minValue Minimum counts per bin
+ * @returns {Object} Binned x values (x), data (y), x errors (xError),
+ * uncertainties (uncertainty), background x values (bgX) and background (bg)
+ */
+function rebin(data, minValue) {
+  const { weights, counts, background, x } = data.arrays;
+  const SCALES = data.scales;
+  const BIN_COUNTS = counts.slice(1).map((value, i) => value - counts[i]);
+  const BINS = minBin(BIN_COUNTS, minValue);
+  let binned = { x: [], y: [], xError: [], uncertainty: [], bg: [] };
+
+  for (let i = 0; i < BINS.length - 1; i++) {
+    const [START, END] = [BINS[i], BINS[i + 1]];
+    const WIDTH = weights[END] - weights[START];
+    const COUNTS = counts[END] - counts[START];
+    const BACKGROUND = (background[END] - background[START]) / WIDTH;
+
+    binned.x.push((x[END] - x[START]) / WIDTH);
+    binned.y.push((COUNTS / WIDTH) * SCALES.y - BACKGROUND * SCALES.yBackground);
+    binned.bg.push(BACKGROUND * SCALES.background);
+    binned.xError.push((WIDTH * SCALES.xError) / 2);
+    binned.uncertainty.push(
+      (Math.sqrt(Math.max(COUNTS, 1)) / WIDTH) * SCALES.uncertainty,
+    );
+  }
+
+  if (!binned.x.length) {
+    return { ...binned, bgX: [] };
+  }
+
+  if (data.kind === 'spectrum') {
+    // Remove bins outside of the energy range, interpolating the background
+    // to the edges of the first and last bins within the range
+    const [LOW, HIGH] = data.cutOff;
+    const BELOW = binned.x.findLastIndex((value) => value < LOW);
+    const ABOVE = binned.x.findIndex((value) => value > HIGH);
+    const FIRST = BELOW + 1;
+    const LAST = ABOVE > 1 ? ABOVE - 1 : binned.x.length - 1;
+    const EDGES = [
+      interp(binned.x[FIRST] - binned.xError[FIRST], binned.x, binned.bg),
+      interp(binned.x[LAST] + binned.xError[LAST], binned.x, binned.bg),
+    ];
+    const KEEP = binned.x.map((value) => value >= LOW && value <= HIGH);
+
+    binned = Object.fromEntries(
+      Object.entries(binned).map(([KEY, VALUES]) => [
+        KEY,
+        VALUES.filter((_, i) => KEEP[i]),
+      ]),
+    );
+    binned.bg = [EDGES[0], ...binned.bg, EDGES[1]];
+  } else {
+    binned.bg = [binned.bg[0], ...binned.bg, binned.bg[binned.bg.length - 1]];
+  }
+
+  const LAST = binned.x.length - 1;
+
+  binned.bgX = [
+    binned.x[0] - binned.xError[0],
+    ...binned.x,
+    binned.x[LAST] + binned.xError[LAST],
+  ];
+  return binned;
+}
+
+/**
+ * Rebins a plot in the browser using the prefix sums of its GTIs.
+ * @param {String} plotType Plot type
+ * @param {number} minValue Minimum counts per bin
+ */
+function rebinPlot(plotType, minValue) {
+  const GRAPH = document.querySelector(`#${plotType} .plotly-graph-div`);
+  const NAMES = GRAPH.data.map((trace) => trace.name);
+  const BINNED = CUMULATIVE[plotType].map((data) => rebin(data, minValue));
+
+  // Each GTI has a data trace and a background trace, found by name as GTIs
+  // can be added and removed in any order
+  Plotly.restyle(
+    GRAPH,
+    {
+      x: BINNED.map((binned) => binned.x),
+      y: BINNED.map((binned) => binned.y),
+      'error_x.array': BINNED.map((binned) => binned.xError),
+      'error_y.array': BINNED.map((binned) => binned.uncertainty),
+    },
+    CUMULATIVE[plotType].map((data) => NAMES.indexOf(`GTI${data.gti}`)),
+  );
+  Plotly.restyle(
+    GRAPH,
+    {
+      x: BINNED.map((binned) => binned.bgX),
+      y: BINNED.map((binned) => binned.bg),
+    },
+    CUMULATIVE[plotType].map((data) => NAMES.indexOf(`GTI${data.gti} BG`)),
+  );
+}
+
+/**
+ * Draws a figure sent as JSON with typed arrays into a plot container.
+ * @param {jQuery} $container Element to draw the plot in, which is given the
+ * plot type as its ID
+ * @param {Object} plot Plot type (type) and figure (figure) from the server
+ */
+function plotFigure($container, plot) {
+  const $GRAPH = $('<div class="plotly-graph-div">');
+
+  $container.attr('id', plot.type).empty().append($GRAPH);
+  Plotly.newPlot(
+    $GRAPH[0],
+    plot.figure.data,
+    plot.figure.layout,
+    plot.figure.config,
+  );
+}
+
+/**
+ * Decodes the prefix sums of GTIs for rebinning.
+ * @param {Array.<Object>} cumulative Prefix sums of each GTI from the server
+ * @returns {Array.<Object>} Prefix sums with the decoded arrays (arrays)
+ */
+function decodeCumulative(cumulative) {
+  return cumulative.map((data) => ({
+    ...data,
+    arrays: Object.fromEntries(
+      ['weights', 'counts', 'background', 'x'].map((KEY) => [
+        KEY,
+        decodeTypedArray(data[KEY]),
+      ]),
+    ),
+  }));
+}
+
+/**
+ * Applies the GTIs added and removed by a plot_gti delta response to a plot.
+ * @param {String} plotType Plot type
+ * @param {Object} response Response containing the new traces (plots) and
+ * the GTIs to remove (removed)
+ */
+function updateGTIPlot(plotType, response) {
+  const GRAPH = document.querySelector(`#${plotType} .plotly-graph-div`);
+  const REMOVED = response.removed.map(String);
+  const TRACES = response.plots[0].figure.data || [];
+  const INDICES = GRAPH.data
+    .map((trace, i) => (REMOVED.includes(String(trace.legendgroup)) ? i : -1))
+    .filter((i) => i >= 0);
+
+  if (INDICES.length) {
+    Plotly.deleteTraces(GRAPH, INDICES);
+  }
+
+  if (TRACES.length) {
+    Plotly.addTraces(GRAPH, TRACES);
+  }
+
+  if (CUMULATIVE[plotType]) {
+    CUMULATIVE[plotType] = CUMULATIVE[plotType]
+      .filter((data) => !REMOVED.includes(String(data.gti)))
+      .concat(decodeCumulative(response.cumulative || []));
+  }
+}
+
 /**
  * Fetches and plots GTIs from the search field for the given plot type.
+ * Once a plot shows GTIs from the search field, only the GTIs added to or
+ * removed from the search are requested and updated.
  * @param {String} obsID Observation ID
+ * @param {String} plotType Plot type
  */
-function fetchGTIPlot(obsID) {
-  $('.fetch-gti').submit(function (e) {
-    // Constants
-    const REGEX = /"title":\{"text":"(.+?)"\}/;
+function fetchGTIPlot(obsID, plotType) {
+  $(`#${plotType}-gti-form`).submit(function (e) {
+    const GRAPH = document.querySelector(`#${plotType} .plotly-graph-div`);
     let serializedData = $(this).serialize();
 
     // Prevents reloading the page
     e.preventDefault();
 
-    // Adds information and security token to the request
-    serializedData += `&csrfmiddlewaretoken=${$(
-      "input[name='csrfmiddlewaretoken']",
-    ).val()}`;
+    // Adds information to the request
     serializedData += `&quality=${quality}`;
     serializedData += `&obs_id=${obsID}`;
+    serializedData += '&cumulative=true';
+    serializedData += '&format=json';
+
+    if (GTI_PLOTS.has(plotType) && GRAPH) {
+      serializedData += `&displayed=${[
+        ...new Set(GRAPH.data.map((trace) => trace.legendgroup)),
+      ].join(',')}`;
+    }
 
-    // Sends an asynchronous request to generate a plot with multiple GTIs
+    // Sends an asynchronous cacheable request to generate a plot with
+    // multiple GTIs
     $.ajax({
-      type: 'POST',
+      type: 'GET',
       url: PLOT_GTI_URL,
-      data: serializedData,
+      data: canonicalQuery(serializedData),
       success: function (response) {
-        // Gets information on the plot type
-        const NAME = REGEX.exec(response.plotDivs[0])[1]
-          .toLowerCase()
-          .replaceAll(' ', '_');
-        const $PLOT_DIV = $(response.plotDivs[0]).attr('id', NAME);
-
-        // Updates the plot with the GTIs
-        $(`#${NAME}`).replaceWith($PLOT_DIV);
+        if (response.removed) {
+          updateGTIPlot(plotType, response);
+          return;
+        }
+
+        // Replaces the plot with the GTIs
+        plotFigure($(`#${plotType}`), response.plots[0]);
+        GTI_PLOTS.add(plotType);
+
+        // Keeps the prefix sums so the minimum value slider rebins locally
+        if (response.cumulative) {
+          CUMULATIVE[plotType] = decodeCumulative(response.cumulative);
+        } else {
+          delete CUMULATIVE[plotType];
+        }
       },
     });
   });
 }
 
+/**
+ * Downloads the binned data of the GTIs from the search field for the given
+ * plot type in the selected export format.
+ * @param {String} obsID Observation ID
+ * @param {String} plotType Plot type
+ */
+function exportGTIs(obsID, plotType) {
+  $(`#${plotType}-export`).click(function () {
+    let serializedData = $(`#${plotType}-gti-form`).serialize();
+
+    serializedData += `&quality=${quality}`;
+    serializedData += `&obs_id=${obsID}`;
+    serializedData += `&export=${$(`#${plotType}-export-format`).val()}`;
+
+    // The file is streamed as an attachment, so the page is not replaced
+    window.location.href = `${EXPORT_GTI_URL}?${canonicalQuery(
+      serializedData,
+    )}`;
+  });
+}
+
 /**
  * Generates a GTI selection field for a specific plot
  * for the user to select which GTIs to plot.
@@ -181,7 +464,7 @@ function fetchGTIPlot(obsID) {
  */
 function GTISelection(maxGTI, plotType) {
   // Constants
-  const $FORM = $('<form class="fetch-gti">');
+  const $FORM = $(`<form id="${plotType}-gti-form" class="fetch-gti">`);
   const $TYPE = $(`<input name="plot_type" type="hidden" value="${plotType}">`);
   const $SEARCH = $(
     '<input name="gti-search" type="text" ' +
@@ -195,17 +478,33 @@ function GTISelection(maxGTI, plotType) {
   );
   const $MIN_VALUE = $(`<p id="${plotType}-min-value">Value: 1 counts</p>`);
   const $SUBMIT = $('<button type="submit">Submit</button>');
+  // Not named, as the export format is not a parameter of the plot
+  const $EXPORT_FORMAT = $(
+    `<select id="${plotType}-export-format">` +
+      '<option value="csv">CSV</option>' +
+      '<option value="npz">NPZ</option>' +
+      '<option value="fits">FITS</option>' +
+      '</select>',
+  );
+  const $EXPORT = $(
+    `<button id="${plotType}-export" type="button">Export</button>`,
+  );
 
   // Adds elements to the form
   $FORM.append($TYPE);
   $FORM.append(columnLayout([$SEARCH, $SUBMIT]));
   $FORM.append(columnLayout([$MIN_SLIDER, $MIN_VALUE]));
+  $FORM.append(columnLayout([$EXPORT_FORMAT, $EXPORT]));
 
-  // Update slider value on change
+  // Update slider value on change, and rebin the plot if it has prefix sums
   $MIN_SLIDER.on('input', function () {
-    $(`#${plotType}-min-value`).html(
-      `Value: ${$(`#${plotType}-min-slider`).val()} counts`,
-    );
+    const MIN_VALUE = $(`#${plotType}-min-slider`).val();
+
+    $(`#${plotType}-min-value`).html(`Value: ${MIN_VALUE} counts`);
+
+    if (CUMULATIVE[plotType]) {
+      rebinPlot(plotType, +MIN_VALUE);
+    }
   });
 
   return $FORM;
@@ -218,16 +517,15 @@ function GTISelection(maxGTI, plotType) {
 function fetchGraphPlots() {
   $('#plot-graph').submit(function (e) {
     // Constants
-    const SERIALIZED_DATA = $(this).serialize();
-    const TYPE_REGEX = /"title":\{"text":"(.+?)"\}/;
+    const SERIALIZED_DATA = `${$(this).serialize()}&format=json`;
 
     // Prevents reloading the page
     e.preventDefault();
 
     $.ajax({
-      type: 'POST',
+      type: 'GET',
       url: PLOT_GRAPH_URL,
-      data: SERIALIZED_DATA,
+      data: canonicalQuery(SERIALIZED_DATA),
       success: function (response) {
         // Recreate info table
         $('#obs-info').empty();
@@ -236,19 +534,23 @@ function fetchGraphPlots() {
 
         // Clears current plots
         $('#plots').empty();
+        GTI_PLOTS.clear();
+
+        for (const TYPE of Object.keys(CUMULATIVE)) {
+          delete CUMULATIVE[TYPE];
+        }
 
         // Displays each selected plot type
-        for (let i = 0; i < response.plotDivs.length; i++) {
-          // Gets information on the plot type
-          const TYPE = TYPE_REGEX.exec(response.plotDivs[i])[1]
-            .toLowerCase()
-            .replaceAll(' ', '_');
-          const PLOT_DIV = $(response.plotDivs[i]).attr('id', TYPE);
+        for (let i = 0; i < response.plots.length; i++) {
+          const TYPE = response.plots[i].type;
+          const $PLOT_DIV = $('<div>');
 
           // Displays the plot and GTI selection field
-          $('#plots').append(PLOT_DIV);
+          $('#plots').append($PLOT_DIV);
+          plotFigure($PLOT_DIV, response.plots[i]);
           $('#plots').append(GTISelection(response.maxGTI[i], TYPE));
           fetchGTIPlot(response.obsID, TYPE);
+          exportGTIs(response.obsID, TYPE);
         }
       },
     });
@@ -264,6 +566,8 @@ document.addEventListener('DOMContentLoaded', () => {
     fetchOptions(this.value);
   });
 
+  $('#observation-search').blur(prefetchPlots);
+
   $('.change-quality').click(function () {
     changeQuality(this.textContent);
   });
@@ -57,3 +57,37 @@ export function dropdowns() {
     dropdownFocus(DROPDOWN_FIELD, DROPDOWN_CONTENT);
   }
 }
+
+/**
+ * Decodes an array in Plotly's typed array format.
+ * @param {Object} typedArray Data type (dtype) and base64 encoded
+ * little-endian bytes (bdata)
+ * @returns {Float64Array|Float32Array|Int32Array} Decoded array
+ */
+export function decodeTypedArray(typedArray) {
+  const TYPES = { f8: Float64Array, f4: Float32Array, i4: Int32Array };
+  const BYTES = Uint8Array.from(atob(typedArray.bdata), (char) =>
+    char.charCodeAt(0),
+  );
+
+  return new TYPES[typedArray.dtype](BYTES.buffer);
+}
+
+/**
+ * Converts a serialized form to the canonical query of the cacheable plot
+ * requests, without the security token or empty values and sorted by name.
+ * @param {String} serializedData Serialized form
+ * @returns {String} Canonical query string
+ */
+export function canonicalQuery(serializedData) {
+  const PARAMS = new URLSearchParams(serializedData);
+
+  for (const [NAME, VALUE] of [...PARAMS.entries()]) {
+    if (NAME === 'csrfmiddlewaretoken' || !VALUE.trim()) {
+      PARAMS.delete(NAME);
+    }
+  }
+
+  PARAMS.sort();
+  return PARAMS.toString();
+}
@@ -0,0 +1,58 @@
+"""
+Test runner opening the read-only connection to the test database in read-only mode
+"""
+from typing import Any
+
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+from nicer_website.routers import ReadOnlyRouter
+
+
+class ReadOnlyTestRunner(DiscoverRunner):
+    """
+    Runs the tests with the read-only connection, which mirrors the default test database, opened
+    by a read-only URI like in production, so that tests read through it the same way and writes
+    through it fail
+    """
+    def setup_databases(self, **kwargs: Any) -> list:
+        """
+        Creates the test databases, then points the read-only connection at the default test
+        database in read-only mode
+
+        Parameters
+        ----------
+        **kwargs : Any
+            Arguments of DiscoverRunner.setup_databases
+
+        Returns
+        -------
+        list
+            Configuration to restore the original databases
+        """
+        old_config = super().setup_databases(**kwargs)
+        readonly = connections[ReadOnlyRouter.read_db]
+        readonly.close()
+        # The mirror shares the settings of the default connection, so they are copied
+        readonly.settings_dict = {
+            **connections['default'].settings_dict,
+            'NAME': f"file:{connections['default'].settings_dict['NAME']}?mode=ro",
+        }
+        return old_config
+
+    def teardown_databases(self, old_config: list, **kwargs: Any):
+        """
+        Destroys the test databases, after opening the default connection again, so that it is the
+        last connection closed and removes the write-ahead log, which the read-only connection
+        cannot do
+
+        Parameters
+        ----------
+        old_config : list
+            Configuration to restore the original databases
+        **kwargs : Any
+            Arguments of DiscoverRunner.teardown_databases
+        """
+        connections[ReadOnlyRouter.read_db].close()
+        connections['default'].ensure_connection()
+        super().teardown_databases(old_config, **kwargs)
@@ -0,0 +1,284 @@
+"""
+Tests for the website's middleware, metrics, limiter and prefetcher
+"""
+import time
+import gzip
+from threading import Event, Thread
+from unittest import mock
+
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from nicer_website.metrics import Metrics, metrics
+from nicer_website.limiter import Limiter, Overloaded, client_id
+from nicer_website.prefetch import Prefetcher
+
+
+class MetricsTests(TestCase):
+    """
+    Tests recording metrics and reading them from the staff-only endpoint
+    """
+    def test_snapshot(self):
+        """
+        Counts and sums recorded values and keeps the last value of gauges
+        """
+        registry = Metrics()
+        registry.record('requests')
+        registry.record('bytes', 100)
+        registry.record('bytes', 50)
+        registry.gauge('waiting', 3)
+        registry.gauge('waiting', 1)
+
+        self.assertEqual(registry.snapshot(), {
+            'requests': {'count': 1, 'total': 1},
+            'bytes': {'count': 2, 'total': 150},
+            'waiting': {'value': 1},
+        })
+
+    def test_staff_only(self):
+        """
+        Redirects anonymous users and users who are not staff to the admin login
+        """
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        self.client.force_login(User.objects.create_user('user'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+
+    def test_endpoint(self):
+        """
+        Returns the metrics of the process to staff members
+        """
+        metrics.gauge('tests.gauge', 7)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json()['pid'], int)
+        self.assertEqual(response.json()['metrics']['tests.gauge'], {'value': 7})
+
+
+class CompressionTests(TestCase):
+    """
+    Tests compressing responses by Accept-Encoding
+    """
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        # Makes the metrics response long enough to compress
+        for i in range(20):
+            metrics.gauge(f'tests.gauge{i}', i)
+
+    def test_gzip(self):
+        """
+        Compresses JSON responses for clients accepting gzip and records their sizes
+        """
+        before = metrics.snapshot().get('metrics.encoded_bytes', {'count': 0})['count']
+        response = self.client.get(reverse('metrics'), HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertIn(b'tests.gauge19', gzip.decompress(response.content))
+        self.assertEqual(metrics.snapshot()['metrics.encoded_bytes']['count'], before + 1)
+
+    def test_identity(self):
+        """
+        Leaves responses uncompressed for clients without a supported encoding
+        """
+        response = self.client.get(reverse('metrics'), HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'tests.gauge19', response.content)
+
+
+class LimiterTests(SimpleTestCase):
+    """
+    Tests admitting requests by cost, queue and client
+    """
+    def test_budget(self):
+        """
+        Queues requests beyond the budget until the running requests finish, and refuses them with
+        503 once the queue is full or the wait times out
+        """
+        limiter = Limiter(10, 1, 0.3, 4)
+        statuses = []
+
+        def wait():
+            try:
+                with limiter.admit(5, 'b'):
+                    statuses.append(200)
+            except Overloaded as error:
+                statuses.append(error.status)
+
+        with limiter.admit(8, 'a'):
+            with limiter.admit(2, 'b'):
+                pass
+
+            thread = Thread(target=wait)
+            thread.start()
+
+            while not limiter._waiting:  # pylint: disable=protected-access
+                continue
+
+            with self.assertRaisesMessage(Overloaded, 'Plot queue is full') as error:
+                with limiter.admit(5, 'c'):
+                    pass
+
+            self.assertEqual(error.exception.status, 503)
+            self.assertGreaterEqual(error.exception.retry_after, 1)
+            thread.join()
+
+        self.assertEqual(statuses, [503])
+        thread = Thread(target=wait)
+
+        with limiter.admit(8, 'a'):
+            thread.start()
+
+            while not limiter._waiting:  # pylint: disable=protected-access
+                continue
+
+        thread.join()
+        self.assertEqual(statuses, [503, 200])
+
+        # Requests over the budget run alone
+        with limiter.admit(100, 'a'):
+            pass
+
+    def test_client_limit(self):
+        """
+        Refuses requests from a client with too many requests with 429
+        """
+        limiter = Limiter(10, 4, 1, 2)
+
+        with limiter.admit(1, 'a'), limiter.admit(1, 'a'):
+            with self.assertRaises(Overloaded) as error:
+                with limiter.admit(1, 'a'):
+                    pass
+
+            self.assertEqual(error.exception.status, 429)
+
+            with limiter.admit(1, 'b'):
+                pass
+
+        with limiter.admit(1, 'a'):
+            pass
+
+    def test_client_id(self):
+        """
+        Identifies clients by the last address of the trusted header, or the connection address
+        """
+        request = RequestFactory().get(
+            '/',
+            REMOTE_ADDR='10.0.0.1',
+            HTTP_X_FORWARDED_FOR='1.2.3.4, 192.0.2.7',
+        )
+        self.assertEqual(client_id(request), '10.0.0.1')
+
+        with override_settings(PLOT_CLIENT_HEADER='HTTP_X_FORWARDED_FOR'):
+            self.assertEqual(client_id(request), '192.0.2.7')
+            self.assertEqual(client_id(RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')),
+                             '10.0.0.1')
+
+
+class AdmittedTests(TestCase):
+    """
+    Tests refusing plot requests that the limiter does not admit
+    """
+    databases = '__all__'
+
+    def test_refused(self):
+        """
+        Answers plot requests from a client at its limit with 429, counting clients by the
+        trusted header, and requests that cannot be queued with 503
+        """
+        limiter = Limiter(0.5, 0, 1, 1)
+        query = {
+            'gti-search': '0',
+            'min_value': 50,
+            'obs_id': '1234567890',
+            'plot_type': 'light_curve',
+            'quality': 'gold',
+        }
+
+        with mock.patch('nicer_website.apps.plots.admission.limiter', limiter), \
+                override_settings(PLOT_CLIENT_HEADER='HTTP_X_REAL_IP'):
+            with limiter.admit(1, '192.0.2.7'):
+                response = self.client.post(
+                    reverse('plots:plot_gti'),
+                    query,
+                    HTTP_X_REAL_IP='192.0.2.7',
+                )
+                self.assertEqual(response.status_code, 429)
+                self.assertIn('error', response.json())
+                self.assertGreaterEqual(int(response['Retry-After']), 1)
+
+                response = self.client.get(
+                    reverse('plots:plot_gti'),
+                    query,
+                    HTTP_X_REAL_IP='192.0.2.8',
+                    follow=True,
+                )
+                self.assertEqual(response.status_code, 503)
+                self.assertNotIn('ETag', response)
+
+            # Nothing is admitted from the observation without products
+            self.assertEqual(self.client.post(
+                reverse('plots:plot_gti'),
+                query,
+                HTTP_X_REAL_IP='192.0.2.7',
+            ).status_code, 404)
+
+
+class PrefetcherTests(SimpleTestCase):
+    """
+    Tests running speculative computations per client
+    """
+    def setUp(self):
+        self.prefetcher = Prefetcher(2, 60)
+        self.release = Event()
+        self.addCleanup(self.release.set)
+
+    def wait(self):
+        """
+        Waits until no computation is pending
+        """
+        while self.prefetcher._pending:  # pylint: disable=protected-access
+            time.sleep(0.01)
+
+    def test_take(self):
+        """
+        Keeps results until taken once, but not results of None
+        """
+        self.assertTrue(self.prefetcher.submit('a', 'client', lambda: 1))
+        self.assertTrue(self.prefetcher.submit('b', 'other', lambda: None))
+        self.wait()
+
+        self.assertEqual(self.prefetcher.take('a'), 1)
+        self.assertIsNone(self.prefetcher.take('a'))
+        self.assertIsNone(self.prefetcher.take('b'))
+
+    def test_cancel(self):
+        """
+        Discards the result of a client's computation when the client prefetches something else,
+        without affecting other clients
+        """
+        self.assertTrue(self.prefetcher.submit('a', 'client', lambda: self.release.wait(5)))
+        self.assertTrue(self.prefetcher.submit('b', 'other', lambda: self.release.wait(5)))
+        self.assertTrue(self.prefetcher.submit('a', 'client', lambda: False))
+
+        # Every worker is busy until the running computations finish
+        self.assertFalse(self.prefetcher.submit('c', 'client', lambda: 3))
+        self.release.set()
+        self.wait()
+        self.assertTrue(self.prefetcher.submit('c', 'client', lambda: 3))
+        self.wait()
+
+        self.assertIsNone(self.prefetcher.take('a'))
+        self.assertTrue(self.prefetcher.take('b'))
+        self.assertEqual(self.prefetcher.take('c'), 3)
+
+    def test_expiry(self):
+        """
+        Removes results after their time to live
+        """
+        self.prefetcher.ttl = 0
+        self.prefetcher.submit('a', 'client', lambda: 1)
+        self.wait()
+        self.assertIsNone(self.prefetcher.take('a'))
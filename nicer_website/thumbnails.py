@@ -0,0 +1,90 @@
+"""
+Lazy rendering of observation thumbnails in a process pool with a bounded queue, so that a
+directory listing full of observations cannot occupy the web process with plot computations
+"""
+import multiprocessing
+from threading import Lock
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+
+from nicer_website.metrics import metrics
+from src.utils.thumbnails import render
+
+
+class Thumbnailer:
+    """
+    Renders thumbnails in a pool of worker processes, with at most queue_size thumbnails queued
+    or rendering, and shares the render of a thumbnail between the requests waiting for it
+
+    The pool uses spawned processes, as forking a web process with running threads is unsafe, and
+    is only started when the first thumbnail is requested
+    """
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._lock: Lock = Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending: dict[str, Future] = {}
+
+        metrics.gauge('thumbnails.workers', workers)
+        metrics.gauge('thumbnails.queue_size', queue_size)
+
+    def _done(self, key: str, _: Future):
+        """
+        Removes a finished render from the queue
+
+        Parameters
+        ----------
+        key : str
+            Key of the thumbnail
+        """
+        with self._lock:
+            self._pending.pop(key, None)
+            metrics.gauge('thumbnails.pending', len(self._pending))
+
+    def submit(self, dir_path: str, products: dict[str, str], key: str) -> Future | None:
+        """
+        Queues the render of a thumbnail, or joins its render if it is already queued
+
+        Parameters
+        ----------
+        dir_path : str
+            Path to the observation's jspipe directory
+        products : dict[str, str]
+            File name of the product of each type
+        key : str
+            Key of the thumbnail
+
+        Returns
+        -------
+        Future | None
+            Future of the path of the thumbnail, or None if the queue is full or rendering is
+            disabled
+        """
+        future: Future
+
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+
+            if len(self._pending) >= self.queue_size or not self.workers:
+                metrics.record('thumbnails.rejected')
+                return None
+
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+
+            future = self._executor.submit(render, dir_path, products, key)
+            self._pending[key] = future
+            metrics.gauge('thumbnails.pending', len(self._pending))
+            metrics.record('thumbnails.rendered')
+
+        future.add_done_callback(lambda done: self._done(key, done))
+        return future
+
+
+thumbnailer = Thumbnailer(settings.THUMBNAIL_WORKERS, settings.THUMBNAIL_QUEUE_SIZE)
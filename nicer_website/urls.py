@@ -21,6 +21,7 @@ from . import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', views.index, name='index'),
+    path('metrics', views.process_metrics, name='metrics'),
     path('manager/', include('nicer_website.apps.file_mgr.urls')),
     path('plots/', include('nicer_website.apps.plots.urls')),
 ]
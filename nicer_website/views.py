@@ -1,8 +1,13 @@
 """
 Main functions for backend functionality of the website home
 """
+import os
+
 from django.shortcuts import render
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+
+from nicer_website.metrics import metrics
 
 
 def index(request: HttpRequest) -> HttpResponse:
@@ -20,3 +25,23 @@ def index(request: HttpRequest) -> HttpResponse:
         Http response containing the homepage
     """
     return render(request, 'index.html')
+
+
+@staff_member_required
+def process_metrics(_: HttpRequest) -> JsonResponse:
+    """
+    Returns the metrics of the process answering the request, such as response sizes and the
+    state of the plot limiter, to staff members, who are otherwise redirected to the admin login
+
+    Parameters
+    ----------
+    _ : HttpRequest
+        Http request for the metrics
+
+    Returns
+    -------
+    JsonResponse
+        Json response containing the process ID (pid), as each server process has its own
+        metrics, and the count and total of each metric and value of each gauge (metrics)
+    """
+    return JsonResponse({'pid': os.getpid(), 'metrics': metrics.snapshot()})
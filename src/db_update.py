@@ -1,166 +1,676 @@
 """
 Updates the database using Sqlite to match the folder
 structure of the specified directory found in config.txt
+
+By default, only directories modified since the last update are listed,
+use --full to list every directory
 """
 import os
+import sys
 import json
+import time
 import sqlite3
-import subprocess
+import argparse
+from contextlib import closing
+from itertools import islice, repeat
+from typing import Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from src.utils.columns import convert_directory
+from src.utils.thumbnails import thumbnail_directory
+from src.utils.catalog import object_key, observation_header, unit_vector
+
+ROOT = '/'
+EXCLUDED = ('.arf', '.rmf')
+MTIME_MARGIN = 2e9
+SEARCH_TRIGGER = 'file_mgr_item_search_insert'
+OBSERVATION_DIR = '/jspipe/'
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+}
+BUSY_TIMEOUT = 60
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Opens the database for bulk writes, with transactions managed explicitly and the journal and
+    cache tuned by PRAGMAS
+
+    In WAL mode the website keeps reading while the database is written, and writers wait up to
+    BUSY_TIMEOUT seconds for each other instead of failing with database is locked
+
+    Parameters
+    ----------
+    db_path : string
+        Path to the database
+
+    Returns
+    -------
+    Connection
+        Connection to the database
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f'PRAGMA {pragma} = {value}')
 
-import numpy as np
+    return conn
 
 
-def progress_bar(i: int, total: int):
+def child_path(path: str, name: str) -> str:
     """
-    Terminal progress bar
+    Gets the database path of a subdirectory
 
     Parameters
     ----------
-    i : int
-        Current progress
-    total : int
-        Completion number
+    path : string
+        Database path of the parent directory
+    name : string
+        Name of the subdirectory
+
+    Returns
+    -------
+    string
+        Database path of the subdirectory
     """
-    length = 50
-    i += 1
+    return f'{path if path != ROOT else ""}{name}/'
 
-    filled = int(i * length / total)
-    percent = i * 100 / total
-    bar_fill = '█' * filled + '-' * (length - filled)
-    print(f'\rProgress: |{bar_fill}| {int(percent)}%\t', end='')
 
-    if i == total:
-        print()
+def table_insert(
+        conn: sqlite3.Connection,
+        data: Iterable[tuple[str, str, str]],
+        batch_size: int = 10000,
+        commit: bool = False) -> int:
+    """
+    Add folder and file data to the database and optimise the search index
 
+    Data is consumed in batches so memory use does not depend on the size of the tree, each
+    directory path is added to the directory table once and the items reference it by ID,
+    existing entries are ignored rather than replaced, as replacing would delete the row without
+    firing the triggers that keep the search index in sync
 
-def table_insert(data: list[tuple[str, str, str]], batch_size: int = 50):
-    """
-    Add folder and file data to the database
+    The search index insert trigger is replaced by a single insert of the new items of each batch,
+    which is several times faster than a trigger per row, so this should run inside a transaction,
+    which is committed after each batch if commit is True so that other writers wait at most one
+    batch
 
     Parameters
     ----------
-    data : list[tuple[string, string, string]]
-        Data to be inserted into the database
-    batch_size : integer, default = 50
+    conn : Connection
+        Connection to the database
+    data : Iterable[tuple[string, string, string]]
+        Data to be inserted into the database as name, parent directory path and type
+    batch_size : integer, default = 10000
         How many entries to insert into the database per execution
+    commit : boolean, default = False
+        If the transaction should be committed and a new transaction started after each batch
+
+    Returns
+    -------
+    integer
+        Number of entries inserted
     """
-    update = 'INSERT OR REPLACE INTO file_mgr_item (name, path, type) VALUES (?,?,?)'
-    batches = np.array_split(data, len(data) / batch_size)
+    count = 0
+    insert_sql = 'INSERT OR IGNORE INTO file_mgr_item (name, directory_id, type) VALUES (?,?,?)'
+    directory_update = 'INSERT OR IGNORE INTO file_mgr_directory (path, scan) VALUES (?, 0)'
+    optimize = "INSERT INTO file_mgr_item_search (file_mgr_item_search) VALUES ('optimize')"
+    data = iter(data)
+    directory_ids = dict(conn.execute('SELECT path, id FROM file_mgr_directory'))
+    trigger = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+        (SEARCH_TRIGGER,),
+    ).fetchone()[0]
+
+    while batch := list(islice(data, batch_size)):
+        conn.execute(f'DROP TRIGGER {SEARCH_TRIGGER}')
+        # Read once the batch holds the write lock, as other writers may have added indexed items
+        # between batches
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM file_mgr_item').fetchone()[0]
+
+        # Insert new directories into the database and get their IDs
+        for path in {path for _, path, _ in batch} - directory_ids.keys():
+            conn.execute(directory_update, (path,))
+            directory_ids[path] = conn.execute(
+                'SELECT id FROM file_mgr_directory WHERE path = ?',
+                (path,),
+            ).fetchone()[0]
+
+        conn.executemany(insert_sql, [
+            (name, directory_ids[path], item_type) for name, path, item_type in batch
+        ])
+        count += len(batch)
+
+        # Add the new items to the search index
+        conn.execute(
+            'INSERT INTO file_mgr_item_search (rowid, name, path, type) '
+            'SELECT item.id, item.name, directory.path, item.type FROM file_mgr_item AS item '
+            'JOIN file_mgr_directory AS directory ON directory.id = item.directory_id '
+            'WHERE item.id > ?',
+            (last_id,),
+        )
+        conn.execute(trigger)
+
+        if commit:
+            conn.commit()
+            conn.execute('BEGIN')
+
+    # Merge the search index segments for faster queries
+    if count:
+        conn.execute(optimize)
 
-    # Connect to the database
-    with sqlite3.connect('db.sqlite3') as conn:
-        # Insert data into the database
-        for i, batch in enumerate(batches):
-            conn.executemany(update, list(batch))
-            progress_bar(i, len(batches))
+    return count
 
 
-def linux_count(directory: str) -> int:
+def table_delete(conn: sqlite3.Connection, item_ids: list[int], generation: int) -> tuple[int, int]:
     """
-    Count the number of files and folders in the given directory using Linux command line
+    Removes items that no longer exist and directories that were not found by the current scan,
+    together with their items
 
     Parameters
     ----------
-    directory : string
-        Directory to count files and folders
+    conn : Connection
+        Connection to the database
+    item_ids : list[integer]
+        IDs of the items to remove
+    generation : integer
+        Current scan number, directories last found by an earlier scan are removed
 
     Returns
     -------
-    integer
-        Number of files and folders in the given directory
+    tuple[integer, integer]
+        Number of items and directories removed
     """
-    process_output = subprocess.run(
-            ['find', directory, '-printf', '.'],
-            capture_output=True,
-            check=True,
-    )
-    process_output = subprocess.run(
-        ['wc', '-c'],
-        input=process_output.stdout,
-        capture_output=True,
-        check=True,
-    ).stdout
+    removed = conn.executemany('DELETE FROM file_mgr_item WHERE id = ?', [
+        (item_id,) for item_id in item_ids
+    ]).rowcount
+    removed += conn.execute(
+        'DELETE FROM file_mgr_item WHERE directory_id IN '
+        '(SELECT id FROM file_mgr_directory WHERE scan < ?)',
+        (generation,),
+    ).rowcount
+    return removed, conn.execute(
+        'DELETE FROM file_mgr_directory WHERE scan < ?',
+        (generation,),
+    ).rowcount
+
+
+def list_directory(
+        data_dir: str,
+        path: str,
+        mtime: int | None,
+        full: bool = False,
+) -> tuple[str, int | None, set[tuple[str, str]] | None, list[str]] | None:
+    """
+    Lists the files and subdirectories of a directory if it has been modified, treating a
+    directory that is removed before or while it is listed as not found, and a directory that
+    cannot be listed for another reason, such as permissions, as unchanged
 
-    return int(process_output.decode('utf-8').strip())
+    Parameters
+    ----------
+    data_dir : string
+        Path to the data directory
+    path : string
+        Database path of the directory
+    mtime : integer | None
+        Modification time of the directory in the manifest, None if not in the manifest
+    full : boolean, default = False
+        If the directory should be listed even if unchanged
 
+    Returns
+    -------
+    tuple[string, integer | None, set[tuple[string, string]] | None, list[string]] | None
+        Database path and modification time of the directory, name and type of each entry, which
+        is None if the directory is unchanged, and database paths of the subdirectories to walk,
+        or None if the directory no longer exists
+    """
+    abs_path = os.path.join(data_dir, '' if path == ROOT else path)
+    entries = set()
+    subdirs = []
 
-def universal_count(directory: str) -> int:
+    try:
+        # The modification time is read before listing so that changes during the listing are
+        # found by the next scan
+        directory_mtime = os.stat(abs_path).st_mtime_ns
+
+        if directory_mtime == mtime and not full:
+            return path, mtime, None, subdirs
+
+        with os.scandir(abs_path) as directory:
+            for entry in directory:
+                if entry.is_dir():
+                    entries.add((entry.name, 'dir'))
+
+                    if not entry.is_symlink():
+                        subdirs.append(child_path(path, entry.name))
+                elif not any(extension in entry.name for extension in EXCLUDED):
+                    entries.add((entry.name, 'file'))
+    # Temporary directories are often removed between being found and listed
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    # The previous listing is kept, with the subdirectories from the manifest
+    except OSError as error:
+        print(f'\nSkipped {abs_path}: {error}', file=sys.stderr)
+        return path, mtime, None, []
+
+    return path, directory_mtime, entries, subdirs
+
+
+def walk(
+        data_dir: str,
+        manifest: dict[str, int | None],
+        full: bool = False,
+        workers: int = 8,
+        roots: Iterable[str] = (ROOT,),
+        recursive: bool = True) -> Iterator[tuple[str, int | None, set[tuple[str, str]] | None]]:
     """
-    Count the number of files and folders in the given directory using Python for compatibility
+    Walks the data directory in a single pass, listing directories in parallel with a thread pool
+    so that several filesystem requests are in flight, and yields each directory as it is listed
+
+    Directories are yielded in no particular order, subdirectories of unchanged directories are
+    taken from the manifest, and directories removed before they are listed are not yielded
 
     Parameters
     ----------
-    directory : string
-        Directory to count files and folders
+    data_dir : string
+        Path to the data directory
+    manifest : dict[string, integer | None]
+        Modification time of each directory in the database
+    full : boolean, default = False
+        If every directory should be listed
+    workers : integer, default = 8
+        Number of threads listing directories
+    roots : Iterable[string], default = (/,)
+        Database paths of the directories to walk
+    recursive : boolean, default = True
+        If the subdirectories of the roots should be walked
+
+    Yields
+    ------
+    tuple[string, integer | None, set[tuple[string, string]] | None]
+        Database path and modification time of the directory and name and type of each entry,
+        which is None if the directory is unchanged
+    """
+    path: str
+    mtime: int | None
+    entries: set[tuple[str, str]] | None
+    subdirs: list[str]
+    listing: tuple[str, int | None, set[tuple[str, str]] | None, list[str]] | None
+    done: set[Future]
+    pending: set[Future]
+    children = {}
+
+    for path in manifest:
+        if path != ROOT:
+            children.setdefault(
+                '/'.join(path.split('/')[:-2]) + '/' if path.count('/') > 1 else ROOT,
+                [],
+            ).append(path)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {
+            executor.submit(list_directory, data_dir, root, manifest.get(root), full)
+            for root in roots
+        }
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                listing = future.result()
+
+                if listing is None:
+                    continue
+
+                path, mtime, entries, subdirs = listing
+
+                if not recursive:
+                    subdirs = []
+                elif entries is None:
+                    subdirs = children.get(path, [])
+
+                pending.update(executor.submit(
+                    list_directory,
+                    data_dir,
+                    subdir,
+                    manifest.get(subdir),
+                    full,
+                ) for subdir in subdirs)
+                yield path, mtime, entries
+
+
+def scan(
+        conn: sqlite3.Connection,
+        data_dir: str,
+        found: dict[str, int | None],
+        removals: list[int],
+        full: bool = False,
+        workers: int = 8,
+        roots: Iterable[str] = (ROOT,),
+        recursive: bool = True) -> Iterator[tuple[str, str, str]]:
+    """
+    Compares the data directory to the database, only listing directories whose modification time
+    differs from the database unless full is True
 
-    Returns
-    -------
-    integer
-        Number of files and folders in the given directory
+    A directory's modification time only changes when entries are added, removed or renamed, so
+    unchanged directories are skipped and their subdirectories are taken from the database
+
+    Parameters
+    ----------
+    conn : Connection
+        Connection to the database
+    data_dir : string
+        Path to the data directory
+    found : dict[string, integer | None]
+        Filled with the modification times of the directories found, which are None if recently
+        modified or never listed
+    removals : list[integer]
+        Filled with the IDs of the items that no longer exist
+    full : boolean, default = False
+        If every directory should be listed
+    workers : integer, default = 8
+        Number of threads listing directories
+    roots : Iterable[string], default = (/,)
+        Database paths of the directories to compare
+    recursive : boolean, default = True
+        If the subdirectories of the roots should be compared
+
+    Yields
+    ------
+    tuple[string, string, string]
+        New items as name, parent directory path and type
     """
     count = 0
+    skipped = 0
+    start_time = time.time_ns()
+    print_time = 0.
+    existing: dict[tuple[str, str], int]
+    manifest = {
+        path: (directory_id, mtime) for path, directory_id, mtime
+        in conn.execute('SELECT path, id, mtime FROM file_mgr_directory')
+    }
+
+    for path, mtime, entries in walk(
+            data_dir,
+            {path: mtime for path, (_, mtime) in manifest.items()},
+            full=full,
+            workers=workers,
+            roots=roots,
+            recursive=recursive):
+        # Recently modified directories are rescanned next time in case of further changes
+        # within the filesystem's timestamp resolution
+        found[path] = mtime if mtime is not None and start_time - mtime > MTIME_MARGIN else None
+
+        if entries is None:
+            skipped += 1
+        else:
+            existing = {}
+            count += len(entries)
+
+            if path in manifest:
+                existing = {
+                    (name, item_type): item_id for item_id, name, item_type in conn.execute(
+                        'SELECT id, name, type FROM file_mgr_item WHERE directory_id = ?',
+                        (manifest[path][0],),
+                    )
+                }
+
+            removals.extend(existing[key] for key in existing.keys() - entries)
+            yield from ((name, path, item_type) for name, item_type in entries - existing.keys())
+
+        # Report the progress rate at most twice a second
+        if time.perf_counter() - print_time > 0.5:
+            print_time = time.perf_counter()
+            print(f'\rDirectories: {len(found)}, items: {count} '
+                  f'({count * 1e9 / (time.time_ns() - start_time):.0f} items/s)', end='')
+
+    print(f'\rDirectories: {len(found)} found, {skipped} unchanged, items: {count} listed '
+          f'({count * 1e9 / (time.time_ns() - start_time):.0f} items/s)')
+
+
+def manifest_update(conn: sqlite3.Connection, found: dict[str, int | None], generation: int):
+    """
+    Records the directories found by a scan in the manifest
 
-    for _, dirs, files in os.walk(directory):
-        count += len(files) + len(dirs)
-        print(f'\rCount: {count}', end='')
+    Parameters
+    ----------
+    conn : Connection
+        Connection to the database
+    found : dict[string, integer | None]
+        Modification times of the directories found
+    generation : integer
+        Scan number to record for the directories
+    """
+    conn.executemany(
+        'INSERT INTO file_mgr_directory (path, mtime, scan) VALUES (?,?,?) '
+        'ON CONFLICT (path) DO UPDATE SET mtime = excluded.mtime, scan = excluded.scan',
+        [(path, mtime, generation) for path, mtime in found.items()],
+    )
 
-    print()
-    return count
 
+def version_bump(conn: sqlite3.Connection):
+    """
+    Increments the ingest version kept in the database header (user_version), which the website
+    compares to invalidate the observation manifests and directory IDs it caches, so it is bumped
+    in the same transaction as the final changes of an update
 
-def main():
+    Parameters
+    ----------
+    conn : Connection
+        Connection to the database
     """
-    Main function for updating the database
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.execute(f'PRAGMA user_version = {version + 1}')
+
+
+def catalog_update(conn: sqlite3.Connection, data_dir: str, workers: int = 8) -> tuple[int, int]:
     """
-    count = 0
-    data = []
-    os.chdir('../')
+    Updates the observation catalog for observations whose jspipe directory has changed, reading
+    the headers, converting the products for the column store and rendering the thumbnails, if
+    enabled, in parallel with a process pool, and removes observations that no longer exist
 
-    # Get data directory location from config.txt
-    with open('config.txt', mode='r', encoding='utf-8') as config:
-        data_dir = json.load(config)['data_dir']
+    Products are read outside of any transaction, which must not be open on the connection, and
+    the catalog is then written and committed in one short transaction
 
-    # Calculate the total number of folders and files
-    try:
-        total = linux_count(data_dir)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        total = universal_count(data_dir)
+    Parameters
+    ----------
+    conn : Connection
+        Connection to the database
+    data_dir : string
+        Path to the data directory
+    workers : integer, default = 8
+        Number of processes reading headers
 
-    if not total:
-        raise ValueError(f'No files or folders found, check parent directory is correct: '
-                         f'{data_dir}')
+    Returns
+    -------
+    tuple[integer, integer]
+        Number of observations updated and removed
+    """
+    obs_id: str
+    mtime: int | None
+    values: dict[str, str | float | int | None] | None
+    position: tuple[float | None, float | None, float | None]
+    rows = []
+    converted = 0
+    thumbnails = 0
+    obs_path = f"substr(directory.path, 1, length(directory.path) - {len(OBSERVATION_DIR)})"
+
+    # Recently modified directories have no modification time and are always read
+    stale = conn.execute(
+        f'SELECT {obs_path}, directory.mtime FROM file_mgr_directory AS directory '
+        f'LEFT JOIN plots_observation AS observation ON observation.obs_id = {obs_path} '
+        "WHERE directory.path GLOB ? AND directory.path NOT GLOB ? "
+        'AND (observation.id IS NULL OR directory.mtime IS NULL '
+        'OR observation.mtime IS NOT directory.mtime)',
+        (f'*{OBSERVATION_DIR}', f'*/*{OBSERVATION_DIR}'),
+    ).fetchall()
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for (obs_id, mtime), values in zip(stale, executor.map(
+                    observation_header,
+                    repeat(data_dir),
+                    [obs_id for obs_id, _ in stale],
+                    chunksize=16)):
+                values = values or {}
+                position = (None, None, None)
+
+                if values.get('RA_OBJ') is not None and values.get('DEC_OBJ') is not None:
+                    position = unit_vector(values['RA_OBJ'], values['DEC_OBJ'])
+
+                rows.append((
+                    obs_id,
+                    str(values.get('OBJECT') or ''),
+                    object_key(str(values.get('OBJECT') or '')),
+                    values.get('RA_OBJ'),
+                    values.get('DEC_OBJ'),
+                    *position,
+                    str(values.get('DATE-OBS') or ''),
+                    values.get('EXPOSURE'),
+                    values.get('DETECTORS'),
+                    mtime,
+                ))
+
+            converted = sum(executor.map(convert_directory, [
+                os.path.join(data_dir, obs_id, 'jspipe') for obs_id, _ in stale
+            ]))
+            thumbnails = sum(executor.map(thumbnail_directory, [
+                os.path.join(data_dir, obs_id, 'jspipe') for obs_id, _ in stale
+            ]))
+
+    conn.execute('BEGIN')
+    conn.executemany(
+        'INSERT INTO plots_observation (obs_id, object, object_key, ra, dec, x, y, z, date_obs, '
+        'exposure, detectors, mtime) VALUES (?,?,?,?,?,?,?,?,?,?,?,?) '
+        'ON CONFLICT (obs_id) DO UPDATE SET object = excluded.object, '
+        'object_key = excluded.object_key, ra = excluded.ra, dec = excluded.dec, x = excluded.x, '
+        'y = excluded.y, z = excluded.z, date_obs = excluded.date_obs, '
+        'exposure = excluded.exposure, detectors = excluded.detectors, mtime = excluded.mtime',
+        rows,
+    )
+    removed = conn.execute(
+        f'DELETE FROM plots_observation WHERE obs_id NOT IN (SELECT {obs_path} '
+        'FROM file_mgr_directory AS directory WHERE directory.path GLOB ?)',
+        (f'*{OBSERVATION_DIR}',),
+    ).rowcount
+    conn.commit()
+    print(f'Observations: {len(rows)} updated, {removed} removed, '
+          f'{converted} products converted, {thumbnails} thumbnails rendered')
+    return len(rows), removed
+
+
+def update(
+        db_path: str,
+        data_dir: str,
+        full: bool = False,
+        workers: int = 8) -> tuple[int, int, int]:
+    """
+    Updates the database to match the data directory, committing new items in batches so the
+    website's writes are never blocked for long, and removals and the manifest at the end, then
+    updates the observation catalog and checkpoints the write-ahead log into the database
 
-    print(f'Total number of files and folders: {total}')
+    An interrupted update leaves the manifest unchanged, so the next update lists the same
+    directories again and ignores the items already inserted
 
-    # Loop through each folder and file in the data directory
-    for root, _, files in os.walk(data_dir):
-        root = root.replace(data_dir, '')
+    Parameters
+    ----------
+    db_path : string
+        Path to the database
+    data_dir : string
+        Path to the data directory
+    full : boolean, default = False
+        If every directory should be listed, instead of only directories modified since the last
+        update
+    workers : integer, default = 8
+        Number of threads listing directories
 
-        dir_name = root.split('/')[-1]
-        parent_dir = '/'.join(root.split('/')[:-1]) + '/'
-        root += '/'
+    Returns
+    -------
+    tuple[integer, integer, integer]
+        Number of items added, items removed and directories removed
+    """
+    found = {}
+    removals = []
+
+    # Stream new items into the database
+    with closing(connect(db_path)) as conn:
+        conn.execute('BEGIN')
+        generation = conn.execute('SELECT COALESCE(MAX(scan), 0) + 1 FROM file_mgr_directory')\
+            .fetchone()[0]
+        added = table_insert(conn, scan(
+            conn,
+            data_dir,
+            found,
+            removals,
+            full=full,
+            workers=workers,
+        ), commit=True)
+        manifest_update(conn, found, generation)
+
+        # Remove data that no longer exists
+        removed, removed_dirs = table_delete(conn, removals, generation)
+        version_bump(conn)
+        conn.commit()
+
+        # The index is committed first, so reading products never blocks the website's writes
+        catalog_update(conn, data_dir, workers=workers)
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    return added, removed, removed_dirs
+
+
+def main(full: bool = False, workers: int = 8):
+    """
+    Main function for updating the database
 
-        if files:
-            total -= np.count_nonzero(np.char.find(files, '.arf') != -1)
-            total -= np.count_nonzero(np.char.find(files, '.rmf') != -1)
-            files = np.delete(np.array(files), np.char.find(files, '.arf') != -1)
-            files = np.delete(np.array(files), np.char.find(files, '.rmf') != -1)
+    Parameters
+    ----------
+    full : boolean, default = False
+        If every directory should be listed, instead of only directories modified since the last
+        update
+    workers : integer, default = 8
+        Number of threads listing directories
+    """
+    os.chdir('../')
 
-        # If not top level directory, add folder to the database
-        if dir_name:
-            data.append((dir_name, parent_dir, 'dir'))
-            count += 1
-            progress_bar(count, total)
+    # Get data directory location from config.txt
+    with open('config.txt', mode='r', encoding='utf-8') as config:
+        data_dir = json.load(config)['data_dir']
 
-        # Add file to the database
-        for file in files:
-            data.append((file, root, 'file'))
-            count += 1
-            progress_bar(count, total)
+    if not os.path.isdir(data_dir):
+        raise ValueError(f'Data directory not found, check parent directory is correct: '
+                         f'{data_dir}')
 
-    # Insert data into database
-    table_insert(data)
+    start_time = time.perf_counter()
+    added, removed, removed_dirs = update('db.sqlite3', data_dir, full=full, workers=workers)
+    elapsed = time.perf_counter() - start_time
+    print(f'Directories: {removed_dirs} removed\n'
+          f'Items: {added} added, {removed} removed in {elapsed:.1f} s '
+          f'({(added + removed) / elapsed:.0f} rows/s)')
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='list every directory, even if unchanged since the last update',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=8,
+        help='number of threads listing directories, default 8',
+    )
+    main(**vars(parser.parse_args()))
@@ -0,0 +1,531 @@
+"""
+Keeps the database up to date with the data directory found in config.txt by watching it with
+inotify, applying bursts of changes in batches
+
+Falls back to periodic incremental updates if inotify is unavailable or the watch limit
+(fs.inotify.max_user_watches) is reached
+"""
+import os
+import sys
+import json
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import sqlite3
+import argparse
+from typing import Iterable
+from itertools import chain
+from contextlib import closing
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from src import db_update
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT = struct.Struct('iIII')
+
+
+def abs_path(data_dir: str, path: str) -> str:
+    """
+    Gets the filesystem path of a directory
+
+    Parameters
+    ----------
+    data_dir : string
+        Path to the data directory
+    path : string
+        Database path of the directory
+
+    Returns
+    -------
+    string
+        Filesystem path of the directory
+    """
+    return os.path.join(data_dir, '' if path == db_update.ROOT else path)
+
+
+class Inotify:
+    """
+    Minimal inotify binding using ctypes, watching directories by their database path
+    """
+
+    def __init__(self, data_dir: str):
+        """
+        Parameters
+        ----------
+        data_dir : string
+            Path to the data directory
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.data_dir = data_dir
+        self.paths: dict[int, str] = {}
+        self.watches: dict[str, int] = {}
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        self.inotify_fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.inotify_fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+
+    def add(self, path: str):
+        """
+        Watches a directory for entries being created, deleted or moved
+
+        Parameters
+        ----------
+        path : string
+            Database path of the directory
+
+        Raises
+        ------
+        OSError
+            If the directory cannot be watched, with errno ENOSPC if the watch limit is reached,
+            but not if it no longer exists
+        """
+        watch_id = self._add_watch(
+            self.inotify_fd,
+            os.fsencode(abs_path(self.data_dir, path)),
+            WATCH_MASK | IN_ONLYDIR,
+        )
+
+        if watch_id < 0:
+            error = ctypes.get_errno()
+
+            # The directory was removed before it could be watched, so drop any stale watches
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                self.remove(path)
+                return
+
+            raise OSError(error, os.strerror(error), abs_path(self.data_dir, path))
+
+        # A moved directory keeps its watch, so remove the old path
+        self.watches.pop(self.paths.get(watch_id), None)
+        self.paths[watch_id] = path
+        self.watches[path] = watch_id
+
+    def remove(self, prefix: str):
+        """
+        Stops watching a directory and its subdirectories
+
+        Parameters
+        ----------
+        prefix : string
+            Database path of the directory
+        """
+        for path in [path for path in self.watches if path.startswith(prefix)]:
+            watch_id = self.watches.pop(path)
+            del self.paths[watch_id]
+            self._rm_watch(self.inotify_fd, watch_id)
+
+    def read(self, timeout: float | None) -> list[tuple[int, str, str]]:
+        """
+        Reads the pending events
+
+        Parameters
+        ----------
+        timeout : float | None
+            Seconds to wait for an event, or None to wait indefinitely
+
+        Returns
+        -------
+        list[tuple[integer, string, string]]
+            Mask, database path of the watched directory and name of the entry of each event
+        """
+        events = []
+        offset = 0
+
+        if not select.select([self.inotify_fd], [], [], timeout)[0]:
+            return events
+
+        try:
+            buffer = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return events
+
+        while offset < len(buffer):
+            watch_id, mask, _, length = EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0')
+            offset += EVENT.size + length
+
+            if mask & IN_IGNORED:
+                self.watches.pop(self.paths.pop(watch_id, None), None)
+            elif mask & IN_Q_OVERFLOW or watch_id in self.paths:
+                events.append((mask, self.paths.get(watch_id, db_update.ROOT), os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        """
+        Closes the inotify instance
+        """
+        os.close(self.inotify_fd)
+
+
+def glob_escape(path: str) -> str:
+    """
+    Escapes the GLOB wildcards in a path
+
+    Parameters
+    ----------
+    path : string
+        Path to escape
+
+    Returns
+    -------
+    string
+        Path matching itself in a GLOB pattern
+    """
+    return ''.join(f'[{char}]' if char in '*?[' else char for char in path)
+
+
+def subtree_delete(conn: sqlite3.Connection, paths: list[str]) -> tuple[int, int]:
+    """
+    Removes directories and their subdirectories, together with their items
+
+    Parameters
+    ----------
+    conn : Connection
+        Connection to the database
+    paths : list[string]
+        Database paths of the directories to remove
+
+    Returns
+    -------
+    tuple[integer, integer]
+        Number of items and directories removed
+    """
+    removed = 0
+    removed_dirs = 0
+
+    for path in paths:
+        pattern = f'{glob_escape(path)}*'
+        removed += conn.execute(
+            'DELETE FROM file_mgr_item WHERE directory_id IN '
+            '(SELECT id FROM file_mgr_directory WHERE path GLOB ?)',
+            (pattern,),
+        ).rowcount
+        removed_dirs += conn.execute(
+            'DELETE FROM file_mgr_directory WHERE path GLOB ?',
+            (pattern,),
+        ).rowcount
+
+    return removed, removed_dirs
+
+
+def apply(
+        db_path: str,
+        data_dir: str,
+        changed: set[str],
+        created: set[str],
+        workers: int = 8) -> tuple[int, int, list[str]]:
+    """
+    Updates the database for a batch of changed directories
+
+    Parameters
+    ----------
+    db_path : string
+        Path to the database
+    data_dir : string
+        Path to the data directory
+    changed : set[string]
+        Database paths of the directories whose entries changed
+    created : set[string]
+        Database paths of the directories that were created or moved into the data directory,
+        which are compared together with their subdirectories
+    workers : integer, default = 8
+        Number of threads listing directories
+
+    Returns
+    -------
+    tuple[integer, integer, list[string]]
+        Number of items added and removed, and database paths of the directories removed
+    """
+    found = {}
+    removals = []
+
+    with closing(db_update.connect(db_path)) as conn:
+        conn.execute('BEGIN')
+        generation = conn.execute('SELECT COALESCE(MAX(scan), 0) FROM file_mgr_directory')\
+            .fetchone()[0]
+        added = db_update.table_insert(conn, chain(
+            db_update.scan(
+                conn,
+                data_dir,
+                found,
+                removals,
+                full=True,
+                workers=workers,
+                roots=[path for path in changed if os.path.isdir(abs_path(data_dir, path))],
+                recursive=False,
+            ),
+            db_update.scan(
+                conn,
+                data_dir,
+                found,
+                removals,
+                full=True,
+                workers=workers,
+                roots=[path for path in created if os.path.isdir(abs_path(data_dir, path))],
+            ),
+        ))
+        db_update.manifest_update(conn, found, generation)
+
+        # Directories that no longer exist are removed with their subdirectories
+        removed_dirs = [
+            db_update.child_path(path, name) for path, name in conn.execute(
+                'SELECT directory.path, item.name FROM file_mgr_item AS item '
+                'JOIN file_mgr_directory AS directory ON directory.id = item.directory_id '
+                "WHERE item.type = 'dir' AND item.id IN (SELECT value FROM json_each(?))",
+                (json.dumps(removals),),
+            )
+        ]
+        removed = db_update.table_delete(conn, removals, 0)[0]
+        removed += subtree_delete(conn, removed_dirs)[0]
+        db_update.version_bump(conn)
+        conn.commit()
+        db_update.catalog_update(conn, data_dir, workers=workers)
+
+    return added, removed, removed_dirs
+
+
+def observations(paths: set[str]) -> set[str]:
+    """
+    Gets the observations affected by changes to the given directories
+
+    Parameters
+    ----------
+    paths : set[string]
+        Database paths of the changed directories
+
+    Returns
+    -------
+    set[string]
+        Observation IDs
+    """
+    return {path.split('/')[0] for path in paths if path != db_update.ROOT}
+
+
+def poll(db_path: str, data_dir: str, interval: float, workers: int = 8):
+    """
+    Periodically updates the database with incremental rescans
+
+    Parameters
+    ----------
+    db_path : string
+        Path to the database
+    data_dir : string
+        Path to the data directory
+    interval : float
+        Seconds between rescans
+    workers : integer, default = 8
+        Number of threads listing directories
+    """
+    while True:
+        added, removed, removed_dirs = db_update.update(db_path, data_dir, workers=workers)
+        print(f'Items: {added} added, {removed} removed, directories: {removed_dirs} removed')
+        time.sleep(interval)
+
+
+def coalesce(inotify: Inotify, delay: float) -> tuple[set[str], set[str]]:
+    """
+    Waits for events and collects the directories they affect until none have arrived for delay
+    seconds, up to ten times delay after the first event
+
+    Parameters
+    ----------
+    inotify : Inotify
+        Watched directories
+    delay : float
+        Seconds without events before the batch is complete
+
+    Returns
+    -------
+    tuple[set[string], set[string]]
+        Database paths of the directories whose entries changed, and of the directories that were
+        created or moved into the data directory
+    """
+    changed = set()
+    created = set()
+    events = inotify.read(None)
+    start_time = time.perf_counter()
+
+    while events:
+        for mask, path, name in events:
+            if mask & IN_Q_OVERFLOW:
+                changed.add(db_update.ROOT)
+                created.add(db_update.ROOT)
+            else:
+                changed.add(path)
+
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    created.add(db_update.child_path(path, name))
+
+        events = inotify.read(min(delay, max(delay * 10 - time.perf_counter() + start_time, 0)))
+
+    return changed, created
+
+
+def watch_indexed(inotify: Inotify, db_path: str, roots: Iterable[str] = (db_update.ROOT,)):
+    """
+    Watches the indexed subdirectories of the given directories that are not watched yet
+
+    Parameters
+    ----------
+    inotify : Inotify
+        Watched directories
+    db_path : string
+        Path to the database
+    roots : Iterable[string], default = (/,)
+        Database paths of the directories whose subdirectories are watched, the root directory is
+        watched itself
+    """
+    with closing(sqlite3.connect(db_path)) as conn:
+        for root in roots:
+            for (path,) in conn.execute(
+                    'SELECT path FROM file_mgr_directory WHERE path GLOB ?',
+                    ('*' if root == db_update.ROOT else f'{glob_escape(root)}?*',)):
+                if path not in inotify.watches:
+                    inotify.add(path)
+
+
+def watch(
+        db_path: str,
+        data_dir: str,
+        delay: float = 1,
+        interval: float = 600,
+        workers: int = 8):
+    """
+    Watches the data directory and applies changes to the database in batches of coalesced events
+
+    New directories are watched before they are listed, so entries created before the watch are
+    found by the listing and later entries by their events
+
+    Each batch bumps the ingest version, which clears every manifest and directory ID cached by
+    the website rather than those of the affected observations, while plot responses and
+    converted products are keyed by the modification times of the products, so only the plots of
+    changed products are computed again
+
+    Parameters
+    ----------
+    db_path : string
+        Path to the database
+    data_dir : string
+        Path to the data directory
+    delay : float, default = 1
+        Seconds without events before a batch is applied
+    interval : float, default = 600
+        Seconds between rescans if inotify cannot be used
+    workers : integer, default = 8
+        Number of threads listing directories
+    """
+    changed: set[str]
+    created: set[str]
+    removed_dirs: list[str]
+
+    try:
+        inotify = Inotify(data_dir)
+    except (AttributeError, OSError) as error:
+        print(f'inotify unavailable ({error}), rescanning every {interval:.0f} s')
+        poll(db_path, data_dir, interval, workers)
+        return
+
+    with closing(inotify):
+        try:
+            # Watch every directory before the initial update so no change is missed
+            watch_indexed(inotify, db_path)
+            db_update.update(db_path, data_dir, workers=workers)
+            watch_indexed(inotify, db_path)
+            print(f'Watching {len(inotify.watches)} directories')
+
+            while True:
+                changed, created = coalesce(inotify, delay)
+
+                # Removed watches only produce ignored events
+                if not changed:
+                    continue
+
+                for path in created:
+                    inotify.add(path)
+
+                added, removed, removed_dirs = apply(db_path, data_dir, changed, created, workers)
+
+                for path in removed_dirs:
+                    inotify.remove(path)
+
+                # Subdirectories of new directories are watched after being found, so rescan them
+                # in case entries were created in between
+                watch_indexed(inotify, db_path, created)
+                print(f'Items: {added} added, {removed} removed, '
+                      f'observations: {", ".join(sorted(observations(changed | created)))}')
+        except OSError as error:
+            if error.errno != errno.ENOSPC:
+                raise
+
+            print(f'inotify watch limit reached, rescanning every {interval:.0f} s')
+
+    poll(db_path, data_dir, interval, workers)
+
+
+def main(delay: float = 1, interval: float = 600, workers: int = 8):
+    """
+    Main function for watching the data directory
+
+    Parameters
+    ----------
+    delay : float, default = 1
+        Seconds without events before a batch is applied
+    interval : float, default = 600
+        Seconds between rescans if inotify cannot be used
+    workers : integer, default = 8
+        Number of threads listing directories
+    """
+    os.chdir('../')
+
+    # Get data directory location from config.txt
+    with open('config.txt', mode='r', encoding='utf-8') as config:
+        data_dir = json.load(config)['data_dir']
+
+    if not os.path.isdir(data_dir):
+        raise ValueError(f'Data directory not found, check parent directory is correct: '
+                         f'{data_dir}')
+
+    watch('db.sqlite3', data_dir, delay=delay, interval=interval, workers=workers)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--delay',
+        type=float,
+        default=1,
+        help='seconds without events before a batch of changes is applied, default 1',
+    )
+    parser.add_argument(
+        '--interval',
+        type=float,
+        default=600,
+        help='seconds between rescans if inotify cannot be used, default 600',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=8,
+        help='number of threads listing directories, default 8',
+    )
+    main(**vars(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""
+Extracts the header values of observations for the observation catalog
+"""
+import os
+import re
+
+import numpy as np
+
+# Products to read the headers from in order of preference
+PRODUCTS = ('.jsgrp', '.bg', '-bin.pds')
+KEYWORDS = ('OBJECT', 'RA_OBJ', 'DEC_OBJ', 'DATE-OBS', 'EXPOSURE', 'RESPFILE')
+
+
+def object_key(name: str) -> str:
+    """
+    Normalises an object name for lookups, ignoring case, spaces and punctuation
+
+    Parameters
+    ----------
+    name : str
+        Object name
+
+    Returns
+    -------
+    str
+        Normalised object name
+    """
+    return re.sub(r'[^A-Z\d+-]', '', name.upper())
+
+
+def unit_vector(right_ascension: float, declination: float) -> tuple[float, float, float]:
+    """
+    Converts a sky position to a unit vector
+
+    Parameters
+    ----------
+    right_ascension : float
+        Right ascension in degrees
+    declination : float
+        Declination in degrees
+
+    Returns
+    -------
+    tuple[float, float, float]
+        Cartesian x, y and z coordinates
+    """
+    right_ascension = np.radians(right_ascension)
+    declination = np.radians(declination)
+    return (
+        float(np.cos(declination) * np.cos(right_ascension)),
+        float(np.cos(declination) * np.sin(right_ascension)),
+        float(np.sin(declination)),
+    )
+
+
+def observation_header(data_dir: str, obs_id: str) -> dict[str, str | float | int | None] | None:
+    """
+    Reads the header values of an observation from the first product found in its jspipe
+    directory, with the detector count parsed from the response file name
+
+    Parameters
+    ----------
+    data_dir : str
+        Path to the data directory
+    obs_id : str
+        Observation ID
+
+    Returns
+    -------
+    dict[str, str | float | int | None] | None
+        Header values of the observation, or None if no product could be read
+    """
+    # Imported here as the web process only uses the lookup functions of this module
+    from astropy.io import fits  # pylint: disable=import-outside-toplevel
+
+    detectors: re.Match | None
+    header: fits.Header
+    dir_path: str = os.path.join(data_dir, obs_id, 'jspipe')
+    values: dict[str, str | float | int | None]
+
+    try:
+        names = sorted(entry.name for entry in os.scandir(dir_path) if entry.is_file())
+    except OSError:
+        return None
+
+    for product in PRODUCTS:
+        for name in names:
+            if not name.endswith(product):
+                continue
+
+            try:
+                with fits.open(os.path.join(dir_path, name)) as file:
+                    header = file[0].header.copy()
+                    header.update(file[1].header if len(file) > 1 else {})
+            except (OSError, ValueError, TypeError):
+                continue
+
+            values = {keyword: header.get(keyword) for keyword in KEYWORDS}
+            detectors = re.search(r'_d(\d+)', values['RESPFILE'] or '')
+            values['DETECTORS'] = int(detectors.group(1)) if detectors else None
+            return values
+
+    return None
@@ -0,0 +1,332 @@
+"""
+Optional store of products converted to uncompressed little-endian .npy columns, which are
+memory-mapped instead of parsing the gzipped ASCII or FITS source on every request
+
+The store is enabled by setting column_dir in config.txt, and mirrors the data directory with a
+directory per product containing a .npy file per column and meta.json, which holds the store
+version, the source modification time and size, and the header values, so that stale entries are
+rebuilt on the next access
+
+Without column_dir, setting shared_cache_mb keeps the store in shared memory under /dev/shm
+instead, bounded to that size by shared_cache, so server processes share one decoded copy of
+each product
+"""
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import warnings
+from typing import Any, Callable
+from functools import lru_cache
+
+import numpy as np
+from numpy import ndarray
+from astropy.io import fits
+
+from src.utils import shared_cache
+
+# Increment when a reader changes to rebuild every entry
+VERSION = 1
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+META = 'meta.json'
+SHARED_DIR = '/dev/shm/nicer-columns'
+
+
+def light_curve(data_path: str) -> tuple[dict[str, ndarray], dict[str, Any]]:
+    """
+    Reads the time, count rate and detector columns of a light curve
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the light curve
+
+    Returns
+    -------
+    tuple[dict[str, ndarray], dict[str, Any]]
+        Columns and header values of the light curve
+    """
+    time, counts, detectors = np.loadtxt(data_path, usecols=[0, 2, 3], unpack=True)
+    return {'TIME': time, 'COUNTS': counts, 'DETECTORS': detectors}, {}
+
+
+def light_curve_background(data_path: str) -> tuple[dict[str, ndarray], dict[str, Any]]:
+    """
+    Reads the count rate column of a background light curve
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the background light curve
+
+    Returns
+    -------
+    tuple[dict[str, ndarray], dict[str, Any]]
+        Columns and header values of the background light curve
+    """
+    return {'COUNTS': np.loadtxt(data_path, usecols=2)}, {}
+
+
+def fits_table(data_path: str) -> tuple[dict[str, ndarray], dict[str, Any]]:
+    """
+    Reads the columns and header values of the first extension of a FITS file, with no columns
+    if it is not a table
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the FITS file
+
+    Returns
+    -------
+    tuple[dict[str, ndarray], dict[str, Any]]
+        Columns and header values of the table
+    """
+    with fits.open(data_path) as file:
+        data = file[1].data
+        header = {
+            key: value for key, value in file[1].header.items()
+            if isinstance(value, (str, int, float, bool)) and key not in ('COMMENT', 'HISTORY')
+        }
+
+        if data is None or data.dtype.names is None:
+            return {}, header
+
+        return {name: np.array(data[name]) for name in data.dtype.names}, header
+
+
+READERS: dict[str, Callable[[str], tuple[dict[str, ndarray], dict[str, Any]]]] = {
+    '.bg-lc.gz': light_curve_background,
+    '.lc.gz': light_curve,
+    '.jsgrp': fits_table,
+    '.bg': fits_table,
+    '-bin.pds': fits_table,
+    '-fak.rsp': fits_table,
+}
+
+
+@lru_cache(maxsize=1)
+def directories() -> tuple[str, str, int | None] | None:
+    """
+    Gets the data directory, the column store directory and the shared memory cache size from
+    config.txt
+
+    Returns
+    -------
+    tuple[str, str, int | None] | None
+        Real paths of the data and column store directories, and the maximum size in bytes if the
+        store is the shared memory cache, or None if the store is disabled
+    """
+    data_dir: str
+
+    with open(os.path.join(ROOT, 'config.txt'), mode='r', encoding='utf-8') as config:
+        config = json.load(config)
+
+    data_dir = os.path.realpath(os.path.join(ROOT, config['data_dir']))
+
+    if config.get('column_dir'):
+        return data_dir, os.path.realpath(os.path.join(ROOT, config['column_dir'])), None
+
+    if config.get('shared_cache_mb'):
+        # Separates caches of different data directories on the same machine
+        return (
+            data_dir,
+            os.path.join(SHARED_DIR, hashlib.sha256(data_dir.encode()).hexdigest()[:12]),
+            int(float(config['shared_cache_mb']) * 1e6),
+        )
+
+    return None
+
+
+def entry_path(data_path: str) -> str | None:
+    """
+    Gets the directory of a product in the column store
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the product
+
+    Returns
+    -------
+    str | None
+        Path of the product in the column store, or None if the store is disabled or the product is
+        outside the data directory
+    """
+    relative_path: str
+    paths = directories()
+
+    if paths is None:
+        return None
+
+    relative_path = os.path.relpath(os.path.realpath(data_path), paths[0])
+
+    if relative_path.startswith(os.pardir):
+        return None
+
+    return os.path.join(paths[1], relative_path)
+
+
+def reader(data_path: str) -> Callable[[str], tuple[dict[str, ndarray], dict[str, Any]]]:
+    """
+    Gets the reader for a product from its file name
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the product
+
+    Returns
+    -------
+    Callable[[str], tuple[dict[str, ndarray], dict[str, Any]]]
+        Function reading the columns and header values of the product
+    """
+    for suffix, function in READERS.items():
+        if data_path.endswith(suffix):
+            return function
+
+    raise ValueError(f'No column reader for {data_path}')
+
+
+def write(entry: str, source: os.stat_result, columns: dict[str, ndarray], header: dict[str, Any]):
+    """
+    Writes a product to the column store, replacing any existing entry
+
+    Each column is written to a temporary directory that is renamed into place, so readers never
+    see a partial entry
+
+    Parameters
+    ----------
+    entry : str
+        Path of the product in the column store
+    source : stat_result
+        Status of the product when it was read
+    columns : dict[str, ndarray]
+        Columns of the product
+    header : dict[str, Any]
+        Header values of the product
+    """
+    # Variable length columns cannot be memory-mapped
+    if any(column.dtype.hasobject for column in columns.values()):
+        return
+
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    temp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix='.tmp')
+
+    try:
+        for name, column in columns.items():
+            np.save(
+                os.path.join(temp_dir, f'{name}.npy'),
+                np.ascontiguousarray(column, dtype=column.dtype.newbyteorder('<')),
+            )
+
+        with open(os.path.join(temp_dir, META), mode='w', encoding='utf-8') as meta:
+            json.dump({
+                'version': VERSION,
+                'mtime': source.st_mtime_ns,
+                'size': source.st_size,
+                'columns': list(columns),
+                'header': header,
+            }, meta)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        os.rename(temp_dir, entry)
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def load(data_path: str) -> tuple[dict[str, ndarray], dict[str, Any]]:
+    """
+    Gets the columns and header values of a product, memory-mapped from the column store if the
+    entry is fresh, otherwise read from the product and written to the store, recording the use of
+    entries in the index of the shared memory cache
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the product
+
+    Returns
+    -------
+    tuple[dict[str, ndarray], dict[str, Any]]
+        Columns, which are read-only if memory-mapped, and header values of the product
+    """
+    meta: dict[str, Any]
+    columns: dict[str, ndarray]
+    header: dict[str, Any]
+    paths = directories()
+    entry = entry_path(data_path)
+    product_reader = reader(data_path)
+
+    if entry is None:
+        return product_reader(data_path)
+
+    source = os.stat(data_path)
+
+    try:
+        with open(os.path.join(entry, META), mode='r', encoding='utf-8') as file:
+            meta = json.load(file)
+
+        if (meta['version'], meta['mtime'], meta['size']) == \
+                (VERSION, source.st_mtime_ns, source.st_size):
+            columns = {
+                name: np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r')
+                for name in meta['columns']
+            }
+
+            if paths[2] is not None:
+                shared_cache.attach(paths[1], entry, columns.values())
+
+            return columns, meta['header']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    columns, header = product_reader(data_path)
+    write(entry, source, columns, header)
+
+    if paths[2] is not None and os.path.isdir(entry):
+        shared_cache.add(paths[1], entry, paths[2])
+
+    return columns, header
+
+
+def convert_directory(dir_path: str) -> int:
+    """
+    Converts every product with a reader in a directory that is missing or stale in the column
+    store, skipping products that cannot be read, and converting nothing for the shared memory
+    cache, which only holds products that are used
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the directory
+
+    Returns
+    -------
+    int
+        Number of products in the column store
+    """
+    count: int = 0
+    paths = directories()
+
+    if paths is None or paths[2] is not None:
+        return count
+
+    try:
+        names = [entry.name for entry in os.scandir(dir_path) if entry.is_file()]
+    except OSError:
+        return count
+
+    # Empty products are stored with empty columns
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+
+        for name in names:
+            try:
+                load(os.path.join(dir_path, name))
+                count += 1
+            except (OSError, ValueError, IndexError):
+                continue
+
+    return count
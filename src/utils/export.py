@@ -0,0 +1,159 @@
+"""
+Streaming writers of binned products as CSV, NPZ and FITS, which consume the columns of one GTI
+at a time and produce the file in chunks, so that memory stays flat for large selections
+"""
+import io
+import zipfile
+from typing import Iterable, Iterator
+
+import numpy as np
+from numpy import ndarray
+
+CONTENT_TYPES: dict[str, str] = {
+    'csv': 'text/csv',
+    'npz': 'application/octet-stream',
+    'fits': 'application/fits',
+}
+FITS_BLOCK = 2880
+
+
+class ChunkBuffer(io.RawIOBase):
+    """
+    Unseekable file-like object collecting written bytes until they are taken as a chunk
+    """
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        """
+        Takes the bytes written since the last chunk
+
+        Returns
+        -------
+        bytes
+            Written bytes
+        """
+        chunk: bytes = b''.join(self._chunks)
+        self._chunks.clear()
+        return chunk
+
+
+def csv_chunks(
+        gtis: Iterable[tuple[int, dict[str, ndarray]]],
+        names: tuple[str, ...]) -> Iterator[bytes]:
+    """
+    Writes the columns of each GTI as rows of a CSV file with a GTI column, with the header even if
+    no GTI is written
+
+    Parameters
+    ----------
+    gtis : Iterable[tuple[int, dict[str, ndarray]]]
+        GTI number and columns of each GTI
+    names : tuple[str, ...]
+        Names of the columns in the order they are written
+
+    Yields
+    ------
+    bytes
+        Header, then the rows of each GTI
+    """
+    text: io.StringIO
+
+    yield (','.join(('gti', *names)) + '\n').encode()
+
+    for gti, columns in gtis:
+        text = io.StringIO()
+        np.savetxt(
+            text,
+            np.column_stack((np.full(len(columns[names[0]]), gti),
+                             *(columns[name] for name in names))),
+            fmt=['%d'] + ['%.9g'] * len(names),
+            delimiter=',',
+        )
+        yield text.getvalue().encode()
+
+
+def npz_chunks(
+        gtis: Iterable[tuple[int, dict[str, ndarray]]],
+        names: tuple[str, ...]) -> Iterator[bytes]:
+    """
+    Writes the columns of each GTI as arrays named GTI<n>_<column> of an NPZ file, using zip data
+    descriptors so that the archive is written without seeking
+
+    Parameters
+    ----------
+    gtis : Iterable[tuple[int, dict[str, ndarray]]]
+        GTI number and columns of each GTI
+    names : tuple[str, ...]
+        Names of the columns in the order they are written
+
+    Yields
+    ------
+    bytes
+        Arrays of each GTI, then the zip central directory
+    """
+    buffer: ChunkBuffer = ChunkBuffer()
+
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for gti, columns in gtis:
+            for name in names:
+                with archive.open(f'GTI{gti}_{name}.npy', mode='w', force_zip64=True) as file:
+                    np.lib.format.write_array(file, np.ascontiguousarray(columns[name]))
+
+            yield buffer.take()
+
+    yield buffer.take()
+
+
+def fits_chunks(
+        gtis: Iterable[tuple[int, dict[str, ndarray]]],
+        names: tuple[str, ...]) -> Iterator[bytes]:
+    """
+    Writes the columns of each GTI as a binary table extension named GTI<n> of a FITS file, after
+    an empty primary HDU
+
+    Parameters
+    ----------
+    gtis : Iterable[tuple[int, dict[str, ndarray]]]
+        GTI number and columns of each GTI
+    names : tuple[str, ...]
+        Names of the columns in the order they are written
+
+    Yields
+    ------
+    bytes
+        Primary HDU, then the binary table of each GTI
+    """
+    # pylint: disable=import-outside-toplevel
+    from astropy.io import fits
+
+    data: bytes
+    table: fits.BinTableHDU
+
+    yield fits.PrimaryHDU().header.tostring().encode('ascii')
+
+    for gti, columns in gtis:
+        table = fits.BinTableHDU.from_columns(
+            [fits.Column(name=name.upper(), format='D', array=columns[name]) for name in names],
+            name=f'GTI{gti}',
+        )
+        table.header['GTI'] = gti
+        # Rows of big-endian doubles, as the table is in native byte order in memory
+        data = np.column_stack([columns[name] for name in names]).astype('>f8').tobytes()
+        yield table.header.tostring().encode('ascii') + data + \
+            b'\0' * (-len(data) % FITS_BLOCK)
+
+
+WRITERS = {
+    'csv': csv_chunks,
+    'npz': npz_chunks,
+    'fits': fits_chunks,
+}
@@ -1,13 +1,52 @@
 """
 Utility to correct light curve data
 """
+from typing import Any
+
 import numpy as np
 from numpy import ndarray
 
-from src.utils.utils import min_bin, binning
+from src.utils import columns
+from src.utils.utils import min_bin, binning, cumulative
 from src.utils.plots import data_plot
+from src.utils.single_flight import single_flight
+
+
+def light_curve_columns(data_path: str) -> tuple[ndarray, ndarray, ndarray, float, float]:
+    """
+    Fetches the light curve and background before binning
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the light curve
+
+    Returns
+    -------
+    tuple[ndarray, ndarray, ndarray, float, float]
+        Relative time, counts per time bin, background, number of detectors, and time bin width
+    """
+    time_diff: float
+    time: ndarray
+    background: ndarray
+    light_curve: dict[str, ndarray]
+
+    light_curve = columns.load(data_path)[0]
+    time = light_curve['TIME']
+    background = columns.load(data_path.replace('.lc.gz', '.bg-lc.gz'))[0]['COUNTS']
+
+    # Constants, the columns may be read-only
+    time_diff = float(time[1] - time[0])
+    return (
+        time,
+        light_curve['COUNTS'] * time_diff,
+        background,
+        float(light_curve['DETECTORS'][0]),
+        time_diff,
+    )
 
 
+@single_flight
 def light_curve_data(
         min_value: int,
         data_path: str) -> tuple[ndarray, ndarray, ndarray, ndarray, ndarray, ndarray]:
@@ -40,13 +79,7 @@ def light_curve_data(
     background: ndarray
     uncertainty: ndarray
 
-    time, counts, detectors = np.loadtxt(data_path, usecols=[0, 2, 3], unpack=True)
-    background = np.loadtxt(data_path.replace('.lc.gz', '.bg-lc.gz'), usecols=2)
-
-    # Constants
-    detectors = detectors[0]
-    time_diff = float(time[1] - time[0])
-    counts *= time_diff
+    time, counts, background, detectors, time_diff = light_curve_columns(data_path)
 
     # Bin data
     min_bins = min_bin(min_value, counts)
@@ -71,7 +104,69 @@ def light_curve_data(
     return x_bin, y_bin, bg_x_bin, bg_bin, x_error, uncertainty[0]
 
 
-def light_curve_plot(min_value: int, data_paths: list[str], gti_numbers: list[int]) -> str:
+def light_curve_cumulative(data_path: str) -> dict[str, Any]:
+    """
+    Fetches the prefix sums of the light curve for binning with any minimum value in the browser
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the light curve
+
+    Returns
+    -------
+    dict[str, Any]
+        Prefix sums as typed arrays, plot type (kind), and the normalisation of the binned light
+        curve, background, uncertainty and x error (scales)
+    """
+    time, counts, background, detectors, time_diff = light_curve_columns(data_path)
+    length = min(len(time), len(background))
+
+    return cumulative(time[:length], counts[:length], background[:length]) | {
+        'kind': 'light_curve',
+        'scales': {
+            'y': 1 / (detectors * time_diff),
+            'yBackground': 1 / (detectors * time_diff),
+            'background': 1 / detectors,
+            'uncertainty': 1 / (detectors * time_diff),
+            'xError': time_diff,
+        },
+    }
+
+
+def light_curve_export(min_value: int, data_path: str) -> dict[str, ndarray]:
+    """
+    Fetches the binned light curve of a GTI as columns for export
+
+    Parameters
+    ----------
+    min_value : int
+        Minimum value used for binning
+    data_path : str
+        Path to the light curve
+
+    Returns
+    -------
+    dict[str, ndarray]
+        Binned relative time (x), light curve (y), x error, uncertainty and background
+    """
+    x_bin, y_bin, _, bg_bin, x_error, uncertainty = light_curve_data(min_value, data_path)
+
+    return {
+        'x': x_bin,
+        'y': y_bin,
+        'x_error': x_error,
+        'uncertainty': uncertainty,
+        'background': bg_bin[1:-1],
+    }
+
+
+def light_curve_plot(
+        min_value: int,
+        data_paths: list[str],
+        gti_numbers: list[int],
+        output: str = 'html',
+        webgl: bool | None = None) -> str | dict[str, Any]:
     """
     Gets and plots the corrected light curve data
 
@@ -83,11 +178,15 @@ def light_curve_plot(min_value: int, data_paths: list[str], gti_numbers: list[in
         File path to the light curve
     gti_numbers : list[int]
         List of GTI numbers
+    output : str, default = html
+        Output format, html or json
+    webgl : bool, default = None
+        If the plot should use WebGL, if None, WebGL is used for large plots
 
     Returns
     -------
-    str
-        Light curve plot as HTML
+    str | dict[str, Any]
+        Light curve plot as HTML or figure for JSON
     """
     x_data: list[ndarray] = []
     y_data: list[ndarray] = []
@@ -123,4 +222,6 @@ def light_curve_plot(min_value: int, data_paths: list[str], gti_numbers: list[in
         yaxis_title=r'$\text{Photons}\ (s^{-1} det^{-1})$',
         showlegend=True,
         meta=data_paths[0],
+        output=output,
+        webgl=webgl,
     )
@@ -1,14 +1,90 @@
 """
 Functions to plot graphs
 """
+import base64
 import logging
 from typing import Any
 
+import numpy as np
 import plotly.graph_objs as go
 from numpy import ndarray
 from plotly.offline import plot
 from plotly.colors import qualitative
 
+from src.utils.utils import quantize, typed_array
+
+CONFIG: dict[str, Any] = {'displaylogo': False}
+# Total points across GTIs above which WebGL traces are used, as SVG becomes slow to render
+WEBGL_POINTS = 20000
+
+
+def json_figure(fig: go.Figure) -> dict[str, Any]:
+    """
+    Converts a figure to a JSON serialisable dictionary for Plotly.newPlot, with the trace arrays
+    in Plotly's typed array format, keeping float32 arrays as float32
+
+    Parameters
+    ----------
+    fig : Figure
+        Figure to convert
+
+    Returns
+    -------
+    dict[str, Any]
+        Figure traces (data), layout (layout) and config (config)
+    """
+    array: ndarray
+    figure: dict[str, Any] = fig.to_plotly_json()
+
+    # Newer Plotly versions already encode arrays as typed arrays
+    for trace in figure['data']:
+        for parent, key in (
+            (trace, 'x'),
+            (trace, 'y'),
+            (trace.get('error_x') or {}, 'array'),
+            (trace.get('error_y') or {}, 'array'),
+        ):
+            if key in parent and not isinstance(parent[key], dict):
+                array = np.asarray(parent[key])
+                parent[key] = typed_array(array, 'f4' if array.dtype == np.float32 else 'f8')
+
+    return figure | {'config': CONFIG}
+
+
+def quantize_figure(figure: dict[str, Any], digits: int) -> dict[str, Any]:
+    """
+    Quantizes the y values and errors of a JSON figure from json_figure to a number of significant
+    digits, leaving x values, such as times, at full precision
+
+    Parameters
+    ----------
+    figure : dict[str, Any]
+        Figure with the trace arrays as typed arrays
+    digits : int
+        Number of significant digits to keep
+
+    Returns
+    -------
+    dict[str, Any]
+        Figure with the arrays quantized in place
+    """
+    array: ndarray
+
+    for trace in figure['data']:
+        for parent, key in (
+            (trace, 'y'),
+            (trace.get('error_x') or {}, 'array'),
+            (trace.get('error_y') or {}, 'array'),
+        ):
+            if isinstance(parent.get(key), dict) and parent[key]['dtype'] in ('f4', 'f8'):
+                array = np.frombuffer(
+                    base64.b64decode(parent[key]['bdata']),
+                    dtype=f'<{parent[key]["dtype"]}',
+                )
+                parent[key] = typed_array(quantize(array, digits), parent[key]['dtype'])
+
+    return figure
+
 
 def data_plot(
         gti_numbers: list[int],
@@ -19,10 +95,16 @@ def data_plot(
         background_list: list[ndarray] | None = None,
         x_errors: list[ndarray] | None = None,
         y_uncertainties: list[ndarray] | None = None,
-        **kwargs: Any) -> str:
+        output: str = 'html',
+        webgl: bool | None = None,
+        webgl_points: int = WEBGL_POINTS,
+        **kwargs: Any) -> str | dict[str, Any]:
     """
     Plots data with uncertainties if provided
 
+    In JSON output, the y values, errors and background are sent as float32 as their precision is
+    well beyond that of the data, while x values are kept as float64 for long light curves
+
     Parameters
     ----------
     gti_numbers : list[int]
@@ -41,14 +123,20 @@ def data_plot(
         List of x error bars
     y_uncertainties : list[ndarray]
         List of y-axis uncertainties
+    output : str, default = html
+        Output format, html for a div or json for the figure with typed arrays
+    webgl : bool, default = None
+        If the traces should be drawn with WebGL, if None, WebGL is used above webgl_points
+    webgl_points : int, default = WEBGL_POINTS
+        Total number of points across GTIs above which WebGL is used if webgl is None
 
     **kwargs
         Parameters to pass to Plotly layout
 
     Returns
     -------
-    str
-        Plot as HTML
+    str | dict[str, Any]
+        Plot as HTML, or figure as a dictionary for JSON output
     """
     number: int
     color: str
@@ -58,6 +146,7 @@ def data_plot(
     x_data: ndarray
     y_data: ndarray
     x_background: ndarray
+    scatter: type[go.Scatter] | type[go.Scattergl]
     fig: go.Figure = go.Figure()
 
     for name, lst in zip(
@@ -80,8 +169,20 @@ def data_plot(
     if not background_list:
         background_list = [None] * len(x_data_list)
 
-    # Plot each GTI
-    for number, x_data, y_data, x_background, background, x_error, y_uncertainty, color in zip(
+    if output == 'json':
+        y_data_list, background_list, x_errors, y_uncertainties = (
+            [data if data is None else np.asarray(data, dtype=np.float32) for data in lst]
+            for lst in (y_data_list, background_list, x_errors, y_uncertainties)
+        )
+
+    if webgl is None:
+        webgl = sum(len(x_data) for x_data in x_data_list) > webgl_points
+
+    scatter = go.Scattergl if webgl else go.Scatter
+
+    # Plot each GTI, with the colour fixed by the GTI number so that traces keep their colour
+    # when other GTIs are added or removed
+    for number, x_data, y_data, x_background, background, x_error, y_uncertainty in zip(
         gti_numbers,
         x_data_list,
         y_data_list,
@@ -89,8 +190,9 @@ def data_plot(
         background_list,
         x_errors,
         y_uncertainties,
-        qualitative.Plotly,
     ):
+        color = qualitative.Plotly[number % len(qualitative.Plotly)]
+
         if x_error is not None:
             x_error = {
                 'type': 'data',
@@ -106,7 +208,7 @@ def data_plot(
             }
 
         # Plot GTI data
-        fig.add_trace(go.Scatter(
+        fig.add_trace(scatter(
             x=x_data,
             y=y_data,
             error_x=x_error,
@@ -120,7 +222,7 @@ def data_plot(
 
         # Plot background if provided
         if background is not None:
-            fig.add_trace(go.Scatter(
+            fig.add_trace(scatter(
                 x=x_background,
                 y=background,
                 mode='lines',
@@ -132,9 +234,12 @@ def data_plot(
 
     fig.update_layout(**kwargs)
 
+    if output == 'json':
+        return json_figure(fig)
+
     return plot(
         fig,
         output_type='div',
         include_plotlyjs=False,
-        config={'displaylogo': False},
+        config=CONFIG,
     )
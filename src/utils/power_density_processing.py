@@ -2,13 +2,15 @@
 Utilities to correct PDS
 """
 import os
-from typing import List, Tuple, Any
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 from numpy import ndarray
 from astropy.io import fits
 
+from src.utils import columns
 from src.utils.plots import data_plot
+from src.utils.single_flight import single_flight
 
 
 def normalize_path(path: str) -> str:
@@ -28,13 +30,14 @@ def normalize_path(path: str) -> str:
     return os.path.normpath(path)
 
 
-def get_column(data: ndarray, column_name: str) -> ndarray:
+def get_column(data: ndarray | dict[str, ndarray], column_name: str) -> ndarray:
     """
-    Gets the column given by a name for either an array or a structured array for the PDS
+    Gets the column given by a name for either an array, a structured array or the columns from
+    the column store for the PDS
 
     Parameters
     ----------
-    data : ndarray
+    data : ndarray | dict[str, ndarray]
         Data to index the column
     column_name : str
         Name of the column to index
@@ -44,6 +47,10 @@ def get_column(data: ndarray, column_name: str) -> ndarray:
     ndarray
         Indexed array
     """
+    if isinstance(data, dict):
+        # Column store
+        return data[column_name]
+
     if isinstance(data, ndarray) and data.dtype.names is not None:
         # Structured array
         return data[column_name]
@@ -56,9 +63,11 @@ def get_column(data: ndarray, column_name: str) -> ndarray:
     raise ValueError(f'Unexpected data type or shape: {type(data)}, shape: {data.shape}')
 
 
-def read_fits_file(file_path: str, gti_numbers: List[int]) -> Tuple[List[Any], fits.Header]:
+def read_fits_file(
+        file_path: str,
+        gti_numbers: List[int]) -> Tuple[List[Any], fits.Header | Dict[str, Any]]:
     """
-    Reads a FITS file and returns the data and header.
+    Reads a FITS file and returns the data and header, using the column store for tables.
 
     Parameters
     ----------
@@ -69,13 +78,18 @@ def read_fits_file(file_path: str, gti_numbers: List[int]) -> Tuple[List[Any], f
 
     Returns
     -------
-    Tuple[List[Any], fits.Header]
+    Tuple[List[Any], fits.Header | Dict[str, Any]]
         Data arrays for each GTI and header from the FITS file.
     """
     normalized_path = os.path.normpath(file_path)
     if not os.path.exists(normalized_path):
         raise FileNotFoundError(f'File not found: {normalized_path}')
 
+    table, header = columns.load(normalized_path)
+    if table:
+        # Single table for all GTIs
+        return [table for _ in gti_numbers], header
+
     with fits.open(normalized_path) as hdul:
         header = hdul[1].header
         all_data = hdul[1].data
@@ -135,7 +149,41 @@ def process_pds_data(
     return freq_center, power_density, error_density
 
 
-def get_pds_data_and_plot(_, data_paths: List[str], gti_numbers: List[int]) -> str:
+def pds_export(_, data_path: str) -> Dict[str, ndarray]:
+    """
+    Processes the PDS of a GTI as columns for export, which has no x error or background
+
+    Parameters
+    ----------
+    data_path : str
+        Path to the PDS file.
+
+    Returns
+    -------
+    Dict[str, ndarray]
+        Average frequency (x), f x PDS power (y) and uncertainty.
+    """
+    pds_data_list, _ = read_fits_file(data_path, [0])
+    rsp_data_list, _ = read_fits_file(data_path.replace('-bin.pds', '-fak.rsp'), [0])
+
+    if not pds_data_list or not rsp_data_list:
+        raise ValueError(f'No PDS data in {data_path}')
+
+    freq_center, power_density, error_density = process_pds_data(
+        pds_data_list[0],
+        rsp_data_list[0],
+    )
+
+    return {'x': freq_center, 'y': power_density, 'uncertainty': error_density}
+
+
+@single_flight
+def get_pds_data_and_plot(
+        _,
+        data_paths: List[str],
+        gti_numbers: List[int],
+        output: str = 'html',
+        webgl: bool | None = None) -> str | Dict[str, Any]:
     """
     Processes and plots PDS data for multiple files.
 
@@ -145,11 +193,15 @@ def get_pds_data_and_plot(_, data_paths: List[str], gti_numbers: List[int]) -> s
         List of paths to PDS files.
     gti_numbers : List[int]
         List of GTI numbers.
+    output : str, default = html
+        Output format, html or json.
+    webgl : bool, default = None
+        If the plot should use WebGL, if None, WebGL is used for large plots.
 
     Returns
     -------
-    str
-        Plotly figure as HTML string or error message.
+    str | Dict[str, Any]
+        Plotly figure as HTML string or dictionary for JSON, or error message.
     """
     x_data_list: List[ndarray] = []
     y_data_list: List[ndarray] = []
@@ -210,6 +262,8 @@ def get_pds_data_and_plot(_, data_paths: List[str], gti_numbers: List[int]) -> s
         showlegend=True,
         xaxis_range=xaxis_range,
         yaxis_range=yaxis_range,
+        output=output,
+        webgl=webgl,
     )
 
 
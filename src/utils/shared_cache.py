@@ -0,0 +1,243 @@
+"""
+Index of the shared memory column cache, which keeps the column store under /dev/shm when no
+column_dir is configured, so that every server process memory-maps the same decoded arrays
+
+The index is an SQLite database in the cache directory with the size and last use of each entry,
+and the processes that currently have the entry's arrays mapped. Entries are evicted least
+recently used first once the cache exceeds its size, skipping entries mapped by live processes.
+References of processes that no longer exist are removed before evicting, so a crashed worker
+cannot pin entries, and as removed files stay valid for existing mappings, eviction never breaks
+a reader
+"""
+import os
+import time
+import shutil
+import sqlite3
+import weakref
+from threading import Lock
+from typing import Iterable
+
+from numpy import ndarray
+
+INDEX = 'index.sqlite3'
+BUSY_TIMEOUT = 10
+
+_lock: Lock = Lock()
+_connections: dict[str, sqlite3.Connection] = {}
+# Number of live arrays of each entry mapped by this process
+_references: dict[str, int] = {}
+
+
+def connect(cache_dir: str) -> sqlite3.Connection:
+    """
+    Gets this process's connection to the index of a cache, creating the index if needed
+
+    Must be called while holding the module lock, as the connection is shared between threads
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the cache directory
+
+    Returns
+    -------
+    Connection
+        Connection to the index in autocommit mode
+    """
+    conn: sqlite3.Connection
+    key: str = f'{os.getpid()}:{cache_dir}'
+
+    # Connections cannot be used by forked processes
+    if key not in _connections:
+        os.makedirs(cache_dir, exist_ok=True)
+        conn = sqlite3.connect(
+            os.path.join(cache_dir, INDEX),
+            timeout=BUSY_TIMEOUT,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries (path TEXT PRIMARY KEY, size INTEGER, used REAL)'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS refs (path TEXT, pid INTEGER, PRIMARY KEY (path, pid))'
+        )
+        _connections[key] = conn
+
+    return _connections[key]
+
+
+def entry_size(entry: str) -> int:
+    """
+    Gets the total size of the files of an entry
+
+    Parameters
+    ----------
+    entry : str
+        Path of the entry
+
+    Returns
+    -------
+    int
+        Size of the entry in bytes
+    """
+    try:
+        return sum(file.stat().st_size for file in os.scandir(entry) if file.is_file())
+    except OSError:
+        return 0
+
+
+def detach(cache_dir: str, entry: str):
+    """
+    Releases an array of an entry, removing this process's reference once none are left
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the cache directory
+    entry : str
+        Path of the entry
+    """
+    with _lock:
+        _references[entry] -= 1
+
+        if _references[entry]:
+            return
+
+        del _references[entry]
+
+        try:
+            connect(cache_dir).execute(
+                'DELETE FROM refs WHERE path = ? AND pid = ?',
+                (entry, os.getpid()),
+            )
+        except sqlite3.Error:
+            pass
+
+
+def attach(cache_dir: str, entry: str, arrays: Iterable[ndarray]):
+    """
+    Records that this process maps the arrays of an entry until they are garbage collected, and
+    marks the entry as used
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the cache directory
+    entry : str
+        Path of the entry
+    arrays : Iterable[ndarray]
+        Memory-mapped arrays of the entry
+    """
+    conn: sqlite3.Connection
+    arrays = list(arrays)
+
+    with _lock:
+        try:
+            conn = connect(cache_dir)
+
+            if entry not in _references:
+                conn.execute('INSERT OR IGNORE INTO refs VALUES (?, ?)', (entry, os.getpid()))
+
+            # Entries written before a crash may be missing from the index
+            if not conn.execute(
+                'UPDATE entries SET used = ? WHERE path = ?',
+                (time.time(), entry),
+            ).rowcount:
+                conn.execute(
+                    'INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                    (entry, entry_size(entry), time.time()),
+                )
+        except sqlite3.Error:
+            return
+
+        _references[entry] = _references.get(entry, 0) + len(arrays)
+
+    for array in arrays:
+        weakref.finalize(array, detach, cache_dir, entry)
+
+
+def add(cache_dir: str, entry: str, max_size: int):
+    """
+    Adds a new entry to the index and evicts entries until the cache fits its size
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the cache directory
+    entry : str
+        Path of the entry
+    max_size : int
+        Maximum size of the cache in bytes
+    """
+    with _lock:
+        try:
+            connect(cache_dir).execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                (entry, entry_size(entry), time.time()),
+            )
+            evict(cache_dir, max_size)
+        except sqlite3.Error:
+            pass
+
+
+def evict(cache_dir: str, max_size: int):
+    """
+    Removes least recently used entries that no live process maps until the cache fits its size
+
+    Must be called while holding the module lock
+
+    Parameters
+    ----------
+    cache_dir : str
+        Path to the cache directory
+    max_size : int
+        Maximum size of the cache in bytes
+    """
+    pid: int
+    path: str
+    size: int
+    total: int
+    evicted: str
+    conn: sqlite3.Connection = connect(cache_dir)
+
+    conn.execute('BEGIN IMMEDIATE')
+
+    try:
+        # Removes references of processes that exited without releasing them
+        for (pid,) in conn.execute('SELECT DISTINCT pid FROM refs').fetchall():
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                conn.execute('DELETE FROM refs WHERE pid = ?', (pid,))
+            except PermissionError:
+                continue
+
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+        for path, size in conn.execute(
+            'SELECT path, size FROM entries WHERE path NOT IN (SELECT path FROM refs) '
+            'ORDER BY used'
+        ).fetchall():
+            if total <= max_size:
+                break
+
+            # Moves the entry out first so readers never see a partial entry
+            evicted = f'{path}.{os.getpid()}-{time.monotonic_ns()}.evicted'
+
+            try:
+                os.rename(path, evicted)
+                shutil.rmtree(evicted, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+
+            conn.execute('DELETE FROM entries WHERE path = ?', (path,))
+            total -= size
+
+        conn.execute('COMMIT')
+    except sqlite3.Error:
+        conn.execute('ROLLBACK')
+        raise
@@ -0,0 +1,299 @@
+"""
+Single-flight execution of identical concurrent computations, so that when many requests for the
+same plot arrive at once, one computation runs and the others wait for and share its result
+
+Within a process, callers with the same key wait on the future of the first caller. Across
+processes, the first caller holds an exclusive lock on a lock file of its key, and callers from
+other processes mark that they are waiting, then poll the lock for up to LOCK_TIMEOUT seconds.
+The holder only writes its result to a pickle if a caller is waiting, which the waiting callers
+read if it was written after they started waiting. Results are only shared between overlapping
+calls, so nothing needs to be invalidated when the data changes
+
+Calls made while a computation holds a lock, such as the processors called by a view render, run
+without locking, so that a thread holds at most one lock and processes cannot wait on each other
+
+The lock directory is only used if it is owned by the user of the process and not accessible by
+other users, as the results read from it are unpickled
+"""
+import os
+import stat
+import time
+import errno
+import fcntl
+import pickle
+import hashlib
+import tempfile
+from threading import Lock, local
+from functools import wraps
+from concurrent.futures import Future
+from typing import Any, BinaryIO, Callable, TypeVar
+
+T = TypeVar('T')
+
+LOCK_DIR = os.path.join(tempfile.gettempdir(), f'nicer-single-flight-{os.getuid()}')
+# Seconds to wait for another process's computation before running it anyway
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+# Seconds after which results that no caller read are removed
+RESULT_TTL = 60
+
+_lock: Lock = Lock()
+_flights: dict[str, Future] = {}
+_local: local = local()
+
+
+def private_directory(path: str):
+    """
+    Creates a directory only accessible by the user of the process, or checks that an existing
+    directory is, so that other users cannot plant or read results
+
+    Parameters
+    ----------
+    path : str
+        Path to the directory
+
+    Raises
+    ------
+    PermissionError
+        If the path is not a directory owned by the user, or is accessible by other users
+    """
+    status: os.stat_result
+
+    try:
+        os.mkdir(path, mode=0o700)
+    except FileExistsError:
+        pass
+
+    status = os.lstat(path)
+
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid() or \
+            status.st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise PermissionError(errno.EACCES, 'Lock directory is not private', path)
+
+
+def acquire(lock_path: str, wait_path: str, deadline: float) -> tuple[BinaryIO | None, bool]:
+    """
+    Locks the lock file of a key, marking that a caller is waiting if it is locked by another
+    process
+
+    Lock files are removed by their holder, so the lock is only kept if the file is still at its
+    path once locked, otherwise the new file is locked instead
+
+    Parameters
+    ----------
+    lock_path : str
+        Path to the lock file
+    wait_path : str
+        Path to the file marking that a caller is waiting
+    deadline : float
+        Monotonic time after which to stop waiting
+
+    Returns
+    -------
+    tuple[BinaryIO | None, bool]
+        Locked file, or None if the lock was not acquired before the deadline, and if the caller
+        waited for another process
+    """
+    waited: bool = False
+
+    while True:
+        lock_file = open(lock_path, mode='a+b')  # pylint: disable=consider-using-with
+
+        try:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > deadline:
+                        lock_file.close()
+                        return None, waited
+
+                    if not waited:
+                        open(wait_path, mode='ab').close()  # pylint: disable=consider-using-with
+                        waited = True
+
+                    time.sleep(POLL_INTERVAL)
+
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(lock_path).st_ino:
+                return lock_file, waited
+        except FileNotFoundError:
+            pass
+        except OSError:
+            lock_file.close()
+            raise
+
+        lock_file.close()
+
+
+def share_result(result_path: str, wait_path: str, result: Any):
+    """
+    Writes a result atomically for the callers waiting for it, removes the mark of the waiting
+    callers, and removes results that were not read
+
+    Parameters
+    ----------
+    result_path : str
+        Path to the pickle of the result
+    wait_path : str
+        Path to the file marking that a caller is waiting
+    result : Any
+        Result of the computation
+    """
+    temp_path: str
+
+    try:
+        with tempfile.NamedTemporaryFile(dir=LOCK_DIR, prefix='.tmp', delete=False) as file:
+            temp_path = file.name
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_path, result_path)
+        os.remove(wait_path)
+    except (OSError, pickle.PicklingError):
+        pass
+
+    for entry in os.scandir(LOCK_DIR):
+        try:
+            if entry.name.endswith('.pickle') and \
+                    entry.stat().st_mtime < time.time() - RESULT_TTL:
+                os.remove(entry.path)
+        except OSError:
+            continue
+
+
+def run_locked(key: str, function: Callable[[], T]) -> T:
+    """
+    Runs a computation while holding the lock file of its key, or reads its result if another
+    process finished it while this call waited for the lock
+
+    The computation runs without the lock if the lock directory is not private, if the lock file
+    cannot be created, if another process holds it for longer than LOCK_TIMEOUT, or if this thread
+    already holds a lock
+
+    Parameters
+    ----------
+    key : str
+        Hashed key of the computation
+    function : Callable[[], T]
+        Computation to run
+
+    Returns
+    -------
+    T
+        Result of the computation
+    """
+    result: T
+    waited: bool
+    lock_file: BinaryIO | None
+    start: float = time.time()
+    lock_path: str = os.path.join(LOCK_DIR, f'{key}.lock')
+    wait_path: str = os.path.join(LOCK_DIR, f'{key}.wait')
+    result_path: str = os.path.join(LOCK_DIR, f'{key}.pickle')
+
+    if getattr(_local, 'locked', False):
+        return function()
+
+    try:
+        private_directory(LOCK_DIR)
+        lock_file, waited = acquire(lock_path, wait_path, time.monotonic() + LOCK_TIMEOUT)
+    except OSError:
+        return function()
+
+    if lock_file is None:
+        return function()
+
+    with lock_file:
+        _local.locked = True
+
+        try:
+            if waited:
+                try:
+                    if os.stat(result_path).st_mtime >= start:
+                        with open(result_path, mode='rb') as file:
+                            return pickle.load(file)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    pass
+
+            result = function()
+
+            if os.path.exists(wait_path):
+                share_result(result_path, wait_path, result)
+
+            return result
+        finally:
+            _local.locked = False
+
+            # Callers polling the removed file lock the next file at the path instead
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+
+
+def run(key: str, function: Callable[[], T]) -> T:
+    """
+    Runs a computation, or waits for the result of an identical computation already running in
+    this or another process
+
+    Parameters
+    ----------
+    key : str
+        Key identifying the computation
+    function : Callable[[], T]
+        Computation to run
+
+    Returns
+    -------
+    T
+        Result of the computation, raising its exception if it failed in this process, which
+        includes exceptions that do not inherit from Exception such as KeyboardInterrupt
+    """
+    leader: bool
+    future: Future
+    key = hashlib.sha256(key.encode()).hexdigest()
+
+    with _lock:
+        leader = key not in _flights
+
+        if leader:
+            _flights[key] = Future()
+
+        future = _flights[key]
+
+    if not leader:
+        return future.result()
+
+    # The callers waiting in this process are released however the computation ends
+    try:
+        future.set_result(run_locked(key, function))
+    except BaseException as error:  # pylint: disable=broad-exception-caught
+        future.set_exception(error)
+    finally:
+        with _lock:
+            del _flights[key]
+
+    return future.result()
+
+
+def single_flight(function: Callable[..., T]) -> Callable[..., T]:
+    """
+    Makes concurrent calls of a function with the same arguments share one computation
+
+    Parameters
+    ----------
+    function : Callable[..., T]
+        Function with arguments that have a stable repr, such as paths and numbers
+
+    Returns
+    -------
+    Callable[..., T]
+        Function sharing the results of concurrent identical calls
+    """
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        return run(
+            repr((function.__module__, function.__qualname__, args, sorted(kwargs.items()))),
+            lambda: function(*args, **kwargs),
+        )
+
+    return wrapper
@@ -2,14 +2,16 @@
 Utilities to normalise and bin spectra
 """
 import re
+from typing import Any
 
 import numpy as np
 import pandas as pd
 from numpy import ndarray
-from astropy.io import fits
 
+from src.utils import columns
 from src.utils.plots import data_plot
-from src.utils.utils import min_bin, binning
+from src.utils.utils import min_bin, binning, cumulative
+from src.utils.single_flight import single_flight
 
 
 def channel_kev(channel: ndarray) -> ndarray:
@@ -29,69 +31,54 @@ def channel_kev(channel: ndarray) -> ndarray:
     return (channel * 10 + 5) / 1e3
 
 
-def spectrum_data(
-        min_value: int,
-        data_path: str,
-        cut_off: tuple[float, float] | None = None) -> tuple[
-    ndarray,
+def spectrum_grouped(data_path: str) -> tuple[
     ndarray,
     ndarray,
     ndarray,
     ndarray,
     ndarray,
+    int,
+    float,
+    float,
+    float,
 ]:
     """
-    Fetches and corrects binned data from spectrum
+    Fetches spectrum and background data binned by the spectrum groupings
 
     Parameters
     ----------
-    min_value : int
-        Minimum value for each bin, if None, groupings will be used
     data_path : str
         File path to the spectrum
-    cut_off : tuple[float, float], default = (0.3, 10)
-        Range of accepted data in keV
 
     Returns
     -------
-    tuple[ndarray, ndarray, ndarray, ndarray, ndarray, ndarray]
-        Binned energies, spectrum data, background energies, background, x error, & uncertainties
+    tuple[ndarray, ndarray, ndarray, ndarray, ndarray, int, float, float, float]
+        Grouped energies, spectrum counts and background counts per channel, channels per group,
+        uncertainties, number of detectors, channel width in keV, and spectrum and background
+        exposures
     """
     detectors: int
     energy: float
     response: str
-    bg_interp_indices: tuple[ndarray, ndarray]
     bins: ndarray
     x_bin: ndarray
     y_bin: ndarray
     bg_bin: ndarray
     x_data: ndarray
-    x_width: ndarray
-    x_error: ndarray
-    min_bins: ndarray
-    bg_x_bin: ndarray
     groupings: ndarray
-    bg_bin_cut: ndarray
     uncertainty: ndarray
-    cut_indices: ndarray
     background: pd.DataFrame
-    bg_info: fits.Header
-    spectrum_info: fits.Header
-    spectrum: fits.FITS_rec
-
-    if not cut_off:
-        cut_off = (0.3, 12)
+    bg_info: dict[str, Any]
+    spectrum_info: dict[str, Any]
+    spectrum: dict[str, ndarray]
 
     # Fetch spectrum & background fits files
-    with fits.open(data_path) as file:
-        spectrum_info = file[1].header
-        spectrum = file[1].data
-        response = spectrum_info['RESPFILE']
-        detectors = int(re.search(r'_d(\d+)', response).group(1))
+    spectrum, spectrum_info = columns.load(data_path)
+    response = spectrum_info['RESPFILE']
+    detectors = int(re.search(r'_d(\d+)', response).group(1))
 
-    with fits.open(data_path.replace('.jsgrp', '.bg')) as file:
-        bg_info = file[1].header
-        background = pd.DataFrame(file[1].data)
+    background, bg_info = columns.load(data_path.replace('.jsgrp', '.bg'))
+    background = pd.DataFrame(background)
 
     if 'RATE' in background:
         background['COUNTS'] = background['RATE'] * bg_info['EXPOSURE']
@@ -108,7 +95,70 @@ def spectrum_data(
         bins,
         np.stack((spectrum['COUNTS'], background['COUNTS'], x_data)),
     )
-    x_width = np.diff(bins)
+
+    return (
+        x_bin,
+        y_bin,
+        bg_bin,
+        np.diff(bins),
+        uncertainty,
+        detectors,
+        energy,
+        spectrum_info['EXPOSURE'],
+        bg_info['EXPOSURE'],
+    )
+
+
+@single_flight
+def spectrum_data(
+        min_value: int,
+        data_path: str,
+        cut_off: tuple[float, float] | None = None) -> tuple[
+    ndarray,
+    ndarray,
+    ndarray,
+    ndarray,
+    ndarray,
+    ndarray,
+]:
+    """
+    Fetches and corrects binned data from spectrum
+
+    Parameters
+    ----------
+    min_value : int
+        Minimum value for each bin, if None, groupings will be used
+    data_path : str
+        File path to the spectrum
+    cut_off : tuple[float, float], default = (0.3, 10)
+        Range of accepted data in keV
+
+    Returns
+    -------
+    tuple[ndarray, ndarray, ndarray, ndarray, ndarray, ndarray]
+        Binned energies, spectrum data, background energies, background, x error, & uncertainties
+    """
+    detectors: int
+    energy: float
+    exposure: float
+    bg_exposure: float
+    bg_interp_indices: tuple[ndarray, ndarray]
+    x_bin: ndarray
+    y_bin: ndarray
+    bg_bin: ndarray
+    x_width: ndarray
+    x_error: ndarray
+    min_bins: ndarray
+    bg_x_bin: ndarray
+    bg_bin_cut: ndarray
+    uncertainty: ndarray
+    cut_indices: ndarray
+
+    if not cut_off:
+        cut_off = (0.3, 12)
+
+    x_bin, y_bin, bg_bin, x_width, uncertainty, detectors, energy, exposure, bg_exposure = \
+        spectrum_grouped(data_path)
 
     # If data should be binned to maintain minimum counts per bin
     if min_value:
@@ -120,12 +170,10 @@ def spectrum_data(
         )
 
     # Normalization
-    y_bin = (
-        y_bin / spectrum_info['EXPOSURE'] - bg_bin / bg_info['EXPOSURE']
-    ) / (detectors * energy)
-    bg_bin /= bg_info['EXPOSURE'] * detectors * energy
+    y_bin = (y_bin / exposure - bg_bin / bg_exposure) / (detectors * energy)
+    bg_bin /= bg_exposure * detectors * energy
     x_error = x_width * energy / 2
-    uncertainty /= spectrum_info['EXPOSURE'] * detectors * energy
+    uncertainty /= exposure * detectors * energy
 
     # Energy range cut-off
     cut_indices = np.argwhere((x_bin < cut_off[0]) | (x_bin > cut_off[1]))
@@ -156,11 +204,76 @@ def spectrum_data(
     return x_bin, y_bin, bg_x_bin, bg_bin, x_error, uncertainty[0]
 
 
+def spectrum_cumulative(
+        data_path: str,
+        cut_off: tuple[float, float] | None = None) -> dict[str, Any]:
+    """
+    Fetches the prefix sums of the grouped spectrum for binning with any minimum value in the
+    browser
+
+    Parameters
+    ----------
+    data_path : str
+        File path to the spectrum
+    cut_off : tuple[float, float], default = (0.3, 12)
+        Range of accepted data in keV
+
+    Returns
+    -------
+    dict[str, Any]
+        Prefix sums as typed arrays, plot type (kind), energy range (cutOff), and the
+        normalisation of the binned spectrum, background, uncertainty and x error (scales)
+    """
+    x_bin, y_bin, bg_bin, x_width, _, detectors, energy, exposure, bg_exposure = \
+        spectrum_grouped(data_path)
+
+    return cumulative(x_bin, y_bin, bg_bin, weights=x_width) | {
+        'kind': 'spectrum',
+        'cutOff': cut_off or (0.3, 12),
+        'scales': {
+            'y': 1 / (exposure * detectors * energy),
+            'yBackground': 1 / (bg_exposure * detectors * energy),
+            'background': 1 / (bg_exposure * detectors * energy),
+            'uncertainty': 1 / (exposure * detectors * energy),
+            'xError': energy,
+        },
+    }
+
+
+def spectrum_export(min_value: int, data_path: str) -> dict[str, ndarray]:
+    """
+    Fetches the binned spectrum of a GTI as columns for export
+
+    Parameters
+    ----------
+    min_value : int
+        Minimum value for each bin, if None, groupings will be used
+    data_path : str
+        File path to the spectrum
+
+    Returns
+    -------
+    dict[str, ndarray]
+        Binned energies (x), spectrum (y), x error, uncertainty and background
+    """
+    x_bin, y_bin, _, bg_bin, x_error, uncertainty = spectrum_data(min_value, data_path)
+
+    return {
+        'x': x_bin,
+        'y': y_bin,
+        'x_error': x_error,
+        'uncertainty': uncertainty,
+        'background': bg_bin[1:-1],
+    }
+
+
 def spectrum_plot(
         min_value: int,
         data_paths: list[str],
         gti_numbers: list[int],
-        cut_off: list = None) -> str:
+        cut_off: list = None,
+        output: str = 'html',
+        webgl: bool | None = None) -> str | dict[str, Any]:
     """
     Gets and plots the binned and corrected spectra
 
@@ -174,11 +287,15 @@ def spectrum_plot(
         List of GTI numbers
     cut_off : list, default = [0.3, 10]
         Range of accepted data in keV
+    output : str, default = html
+        Output format, html or json
+    webgl : bool, default = None
+        If the plot should use WebGL, if None, WebGL is used for large plots
 
     Returns
     -------
-    str
-        Spectrum plot as HTML
+    str | dict[str, Any]
+        Spectrum plot as HTML or figure for JSON
     """
     x_data: list[ndarray] = []
     y_data: list[ndarray] = []
@@ -214,4 +331,6 @@ def spectrum_plot(
         xaxis_type='log',
         yaxis_type='log',
         showlegend=True,
+        output=output,
+        webgl=webgl,
     )
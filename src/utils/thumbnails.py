@@ -0,0 +1,239 @@
+"""
+Quicklook thumbnails of observations, small static PNGs of the default light curve and spectrum
+rendered with Matplotlib's non-interactive Agg backend
+
+Thumbnails are stored in a content-addressed cache, named by a hash of the modification times and
+sizes of the products they are rendered from, so a thumbnail is rendered again when its products
+change and stale thumbnails are never served. The cache is in thumbnail_dir from config.txt, or a
+temporary directory, and thumbnails are also rendered by db_update if thumbnail_ingest is set
+"""
+import os
+import re
+import json
+import hashlib
+import tempfile
+import warnings
+from functools import lru_cache
+
+# Increment when the rendering changes to render every thumbnail again
+VERSION = 1
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+QUALITY = 'gold'
+# Product types of the panels, with the background products they are rendered with
+PRODUCTS: dict[str, tuple[str, str]] = {
+    '.lc.gz': ('.lc.gz', '.bg-lc.gz'),
+    '.jsgrp': ('.jsgrp', '.bg'),
+}
+MIN_COUNTS = 100
+SIZE = (3.2, 1.2)
+DPI = 100
+
+
+@lru_cache(maxsize=1)
+def config() -> tuple[str, bool]:
+    """
+    Gets the thumbnail cache directory and if thumbnails are rendered at ingest from config.txt
+
+    Returns
+    -------
+    tuple[str, bool]
+        Path to the thumbnail cache, and if db_update renders thumbnails
+    """
+    with open(os.path.join(ROOT, 'config.txt'), mode='r', encoding='utf-8') as file:
+        values = json.load(file)
+
+    if values.get('thumbnail_dir'):
+        return os.path.realpath(os.path.join(ROOT, values['thumbnail_dir'])), \
+            bool(values.get('thumbnail_ingest'))
+
+    return os.path.join(tempfile.gettempdir(), 'nicer-thumbnails'), \
+        bool(values.get('thumbnail_ingest'))
+
+
+def default_products(names: list[str], quality: str = QUALITY) -> dict[str, str]:
+    """
+    Gets the products shown in a thumbnail, which are the first product of each type by name, as
+    shown by default on the interactive plot page
+
+    Parameters
+    ----------
+    names : list[str]
+        File names of the observation's jspipe directory
+    quality : str, default = gold
+        Pipeline quality
+
+    Returns
+    -------
+    dict[str, str]
+        File name of the product of each type found
+    """
+    products: dict[str, str] = {}
+
+    for name in sorted(names):
+        for file_type in PRODUCTS:
+            if quality in name and file_type in name and re.search(r'GTI\d+', name) and \
+                    not re.search(r'_BAND\d+', name):
+                products.setdefault(file_type, name)
+
+    return products
+
+
+def thumbnail_key(dir_path: str, products: dict[str, str]) -> str:
+    """
+    Gets the key of a thumbnail from the modification times and sizes of its products and their
+    backgrounds, without reading them
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the observation's jspipe directory
+    products : dict[str, str]
+        File name of the product of each type
+
+    Returns
+    -------
+    str
+        Hexadecimal key of the thumbnail
+    """
+    name: str
+    status: os.stat_result
+    digest = hashlib.sha256(f'{VERSION}'.encode())
+
+    for file_type, product in sorted(products.items()):
+        for suffix in PRODUCTS[file_type]:
+            name = product.replace(file_type, suffix)
+
+            try:
+                status = os.stat(os.path.join(dir_path, name))
+                digest.update(f'\0{name}\0{status.st_mtime_ns}\0{status.st_size}'.encode())
+            except OSError:
+                digest.update(f'\0{name}\0'.encode())
+
+    return digest.hexdigest()
+
+
+def thumbnail_path(key: str) -> str:
+    """
+    Gets the path of a thumbnail in the cache
+
+    Parameters
+    ----------
+    key : str
+        Key of the thumbnail
+
+    Returns
+    -------
+    str
+        Path of the thumbnail
+    """
+    return os.path.join(config()[0], key[:2], f'{key}.png')
+
+
+def render(dir_path: str, products: dict[str, str], key: str) -> str:
+    """
+    Renders a thumbnail with a panel for each product type, showing no data for products that
+    cannot be read, and writes it to the cache atomically
+
+    Matplotlib and the processing modules are imported here, as this runs in worker processes
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the observation's jspipe directory
+    products : dict[str, str]
+        File name of the product of each type
+    key : str
+        Key of the thumbnail
+
+    Returns
+    -------
+    str
+        Path of the thumbnail
+    """
+    # pylint: disable=import-outside-toplevel
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    from src.utils.spectrum_preprocessing import spectrum_data
+    from src.utils.light_curve_preprocessing import light_curve_data
+
+    path: str = thumbnail_path(key)
+    data_path: str
+    temp_path: str
+    figure: Figure = Figure(figsize=SIZE, dpi=DPI)
+    axes = figure.subplots(1, len(PRODUCTS))
+
+    for axis, file_type in zip(axes, PRODUCTS):
+        axis.tick_params(which='both', bottom=False, left=False, labelbottom=False, labelleft=False)
+
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+
+                data_path = os.path.join(dir_path, products[file_type])
+
+                if file_type == '.lc.gz':
+                    x, y = light_curve_data(MIN_COUNTS, data_path)[:2]
+                else:
+                    x, y = spectrum_data(None, data_path)[:2]
+                    axis.set_xscale('log')
+                    axis.set_yscale('log', nonpositive='mask')
+        except (KeyError, OSError, ValueError, IndexError):
+            axis.text(0.5, 0.5, 'No data', ha='center', va='center', transform=axis.transAxes)
+            continue
+
+        axis.plot(x, y, linewidth=0.8, color='#1f77b4')
+
+    figure.subplots_adjust(left=0.02, right=0.98, bottom=0.04, top=0.96, wspace=0.06)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix='.', delete=False) as file:
+        temp_path = file.name
+
+        try:
+            FigureCanvasAgg(figure).print_png(file)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+    os.replace(temp_path, path)
+    return path
+
+
+def thumbnail_directory(dir_path: str) -> bool:
+    """
+    Renders the thumbnail of an observation at ingest if thumbnail_ingest is set and it is not
+    already in the cache
+
+    Parameters
+    ----------
+    dir_path : str
+        Path to the observation's jspipe directory
+
+    Returns
+    -------
+    bool
+        If a thumbnail was rendered
+    """
+    key: str
+    products: dict[str, str]
+
+    if not config()[1]:
+        return False
+
+    try:
+        products = default_products([entry.name for entry in os.scandir(dir_path)])
+    except OSError:
+        return False
+
+    key = thumbnail_key(dir_path, products)
+
+    if not products or os.path.exists(thumbnail_path(key)):
+        return False
+
+    try:
+        render(dir_path, products, key)
+    except OSError:
+        return False
+
+    return True
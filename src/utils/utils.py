@@ -1,6 +1,8 @@
 """
 Misc functions used elsewhere
 """
+import base64
+
 import numpy as np
 from numpy import ndarray
 
@@ -101,3 +103,99 @@ def binning(
         uncertainty = uncertainty[:, 0]
 
     return data_bin, bin_widths, uncertainty
+
+
+def typed_array(data: ndarray, dtype: str = 'f8') -> dict[str, str]:
+    """
+    Encodes an array in Plotly's typed array format, as base64 little-endian bytes
+
+    Parameters
+    ----------
+    data : ndarray
+        Array to encode
+    dtype : string, default = f8
+        Plotly data type, such as f8, f4 or i4
+
+    Returns
+    -------
+    dict[string, string]
+        Data type (dtype) and base64 encoded bytes (bdata)
+    """
+    return {
+        'dtype': dtype,
+        'bdata': base64.b64encode(
+            np.ascontiguousarray(data, dtype=f'<{dtype}').tobytes(),
+        ).decode('ascii'),
+    }
+
+
+def cumulative(
+        x_data: ndarray,
+        counts: ndarray,
+        background: ndarray,
+        weights: ndarray | None = None) -> dict[str, dict[str, str]]:
+    """
+    Calculates the prefix sums needed to bin data with any minimum value, so that the sums over
+    any range of bins are the difference of two elements
+
+    Parameters
+    ----------
+    x_data : ndarray
+        Bin x values
+    counts : ndarray
+        Mean counts per unit weight of each bin, which determines the binning
+    background : ndarray
+        Mean background per unit weight of each bin
+    weights : ndarray, default = None
+        Widths of the bins in x-units, if None, each bin has a width of 1
+
+    Returns
+    -------
+    dict[string, dict[string, string]]
+        Prefix sums starting at 0 of the weights (weights), weighted counts (counts), background
+        (background) and x values (x) as typed arrays
+    """
+    if weights is None:
+        weights = np.ones(len(x_data))
+
+    return {
+        name: typed_array(np.concatenate(([0], np.cumsum(data))))
+        for name, data in (
+            ('weights', weights),
+            ('counts', counts * weights),
+            ('background', background * weights),
+            ('x', x_data * weights),
+        )
+    }
+
+
+def quantize(data: ndarray, digits: int) -> ndarray:
+    """
+    Rounds the mantissa of a float32 or float64 array to the bits needed for the number of
+    significant digits, keeping the data type, so that the zeroed low bits compress well
+
+    Parameters
+    ----------
+    data : ndarray
+        Array to quantize
+    digits : integer
+        Number of significant decimal digits to keep
+
+    Returns
+    -------
+    ndarray
+        Quantized array, with non-finite values unchanged
+    """
+    bits: ndarray
+    drop: int
+    integer_type, mantissa = {4: (np.uint32, 23), 8: (np.uint64, 52)}[data.dtype.itemsize]
+
+    drop = mantissa - min(int(np.ceil(digits * np.log2(10))), mantissa)
+
+    if drop <= 0:
+        return data
+
+    # Rounds to nearest by adding half of the dropped bits, which can carry into the exponent
+    bits = np.ascontiguousarray(data).view(integer_type)
+    bits = (bits + integer_type(1 << (drop - 1))) & ~integer_type((1 << drop) - 1)
+    return np.where(np.isfinite(data), bits.view(data.dtype), data)